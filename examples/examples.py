@@ -6,9 +6,8 @@ sys.path.insert(0, './vstp')  # nopep8
 from pathfinder import Pathfinder
 import bplan_import as f_import
 
-# import the NWK and LOC files - needed only once
-f_import.import_location()
-f_import.import_network_links()
+# import the NWK and LOC files (or their snapshot) - needed only once
+f_import.import_network()
 
 # Define the path criteria
 #PATH = Pathfinder('CREWE', 'DRBY')
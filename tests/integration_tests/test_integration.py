@@ -22,8 +22,7 @@ class TestFiles:
 
 class TestApplication:
 
-    f_import.import_location()
-    f_import.import_network_links()
+    f_import.import_network()
 
     def test_file_missing(self):
         with pytest.raises(MissingPartFile) as err:
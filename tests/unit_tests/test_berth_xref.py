@@ -0,0 +1,89 @@
+"""Unit tests for berth_xref"""
+import json
+import sys
+sys.path.insert(0, './vstp')  # nopep8
+import pytest
+import berth_xref as BX
+from location_record import LocationRecord
+
+LOC = [
+    'LOC\tA\tWANBRO\tWanborough\t\t\t493100\t150300\tO\t3\t87016\tN\t',
+    'LOC\tA\tDONCSJJ\tSt. James Jn.\t\t\t456400\t402300\tO\t7\t23444\tN\t',
+    'LOC\tA\tNOSTANX\tNo Stanox\t\t\t456400\t402300\tO\t7\t00000\tN\t',
+]
+
+
+def berth(td, from_berth, to_berth, stanox, platform='', to_line=''):
+    return {
+        'TD': td, 'FROMBERTH': from_berth, 'TOBERTH': to_berth, 'FROMLINE': '',
+        'TOLINE': to_line, 'BERTHOFFSET': '+5', 'PLATFORM': platform, 'EVENT': 'A',
+        'ROUTE': '', 'STANOX': stanox, 'STANME': '', 'STEPTYPE': 'B', 'COMMENT': ''
+    }
+
+
+RECORDS = [
+    berth('AW', '0251', '0253', '87016', platform='1', to_line='M'),
+    berth('AW', '0254', '0252', '87016', platform='2', to_line='R'),
+    berth('D3', '0100', '0102', '23444'),
+    berth('D3', '0200', '0202', '99999'),
+]
+
+
+@pytest.fixture
+def locations(monkeypatch):
+    monkeypatch.setattr(LocationRecord, '_instances', {})
+    monkeypatch.setattr(LocationRecord, '_search', None)
+    for record in LOC:
+        LocationRecord(*record.split('\t'))
+
+
+@pytest.fixture
+def extract(tmp_path):
+    f_name = tmp_path / 'SMARTExtract.json'
+    f_name.write_text(json.dumps({'BERTHDATA': RECORDS}), encoding='utf-8')
+    return str(f_name)
+
+
+class TestBerthXref:
+    """Tests for the TIPLOC to SMART cross-reference"""
+
+    def test_stanox_codes(self, locations):
+        assert BX.stanox_codes() == {'WANBRO': '87016', 'DONCSJJ': '23444'}
+
+    def test_annotate(self, locations, extract, tmp_path):
+        xref = BX.BerthXref.load(str(tmp_path / 'berths.xref'), extract)
+        assert len(xref) == 2
+
+        route = xref.annotate(['WANBRO', 'NOSTANX', 'DONCSJJ'])
+
+        assert [(item.tiploc, item.stanox) for item in route] == [
+            ('WANBRO', '87016'), ('NOSTANX', None), ('DONCSJJ', '23444')
+        ]
+        assert [(step.td, step.from_berth, step.to_berth) for step in route[0].steps] == [
+            ('AW', '0251', '0253'), ('AW', '0254', '0252')
+        ]
+        assert route[0].platforms == {'1', '2'}
+        assert route[0].lines == {'M', 'R'}
+        assert route[0].steps[0].berth_offset == '+5'
+        assert route[1].steps == ()
+
+    def test_cache(self, locations, extract, tmp_path):
+        f_name = str(tmp_path / 'berths.xref')
+        built = BX.BerthXref.load(f_name, extract)
+        key = BX.source_key(BX.stanox_codes(), extract)
+
+        cached = BX.BerthXref.read(f_name, key)
+        assert cached is not None
+        assert cached.steps == built.steps
+        assert cached.annotate(['WANBRO']) == built.annotate(['WANBRO'])
+
+        # A change to the LOC STANOX codes...
+        LocationRecord(*LOC[0].replace('87016', '99999').split('\t'))
+        assert BX.BerthXref.read(f_name, BX.source_key(BX.stanox_codes(), extract)) is None
+        xref = BX.BerthXref.load(f_name, extract)
+        assert [step.td for step in xref.annotate(['WANBRO'])[0].steps] == ['D3']
+
+        # ...or to the SMART extract, rebuilds
+        with open(extract, 'w', encoding='utf-8') as file:
+            json.dump({'BERTHDATA': RECORDS[:2]}, file)
+        assert BX.BerthXref.load(f_name, extract).annotate(['WANBRO'])[0].steps == ()
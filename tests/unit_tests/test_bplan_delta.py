@@ -0,0 +1,145 @@
+"""Unit tests for bplan_delta"""
+import sys
+sys.path.insert(0, './vstp')  # nopep8
+import json
+import pytest
+import bplan_delta
+from network_links import NetworkLink
+from location_record import LocationRecord
+from spatial_index import SpatialIndex
+import edge_weights as EW
+from edge_weights import EdgeWeight
+
+LOC = [
+    'LOC\tA\tKIDSGRV\tKidsgrove\t\t\t383700\t354300\tM\t5\t43031\tN\t',
+    'LOC\tA\tALSAGER\tAlsager\t\t\t379800\t355100\tM\t5\t43030\tN\t',
+    'LOC\tA\tHARCAST\tHarecastle\t\t\t385000\t352000\tM\t5\t43032\tN\t',
+]
+NWK = [
+    'NWK\tA\tKIDSGRV\tALSAGER\tML\t\t01-01-1995 00:00:00\t\tD\tD\t03882\tN\tY\tN\t5\tN\t\t0\t0',
+    'NWK\tA\tKIDSGRV\tALSAGER\tSL\t\t01-01-1995 00:00:00\t\tD\tD\t03900\tN\tY\tN\t5\tN\t\t0\t0',
+    'NWK\tA\tALSAGER\tKIDSGRV\tML\t\t01-01-1995 00:00:00\t\tU\tU\t03882\tN\tY\tN\t5\tN\t\t0\t0',
+    'NWK\tA\tKIDSGRV\tHARCAST\tML\t\t01-01-1995 00:00:00\t\tU\tU\t0\tN\tY\tN\t5\tN\t\t0\t0',
+]
+
+
+@pytest.fixture
+def network(monkeypatch):
+    monkeypatch.setattr(NetworkLink, '_instances', {})
+    monkeypatch.setattr(NetworkLink, '_origins', {})
+    monkeypatch.setattr(LocationRecord, '_instances', {})
+    monkeypatch.setattr(LocationRecord, '_search', None)
+    monkeypatch.setattr(EdgeWeight, '_instances', {})
+    monkeypatch.setattr(SpatialIndex, '_default', None)
+
+    for record in LOC:
+        LocationRecord(*record.split('\t'))
+    for record in NWK:
+        NetworkLink(*record.split('\t')).append_to_instance()
+    LocationRecord.convert_coordinates()
+    EdgeWeight.build()
+    LocationRecord.search_index()
+    SpatialIndex.default()
+    NetworkLink.clear_cache()
+    yield
+    NetworkLink.clear_cache()
+
+
+def change(record: str, action: str, **fields) -> str:
+    """The record with its action code and any fields (by index) changed"""
+    record = record.split('\t')
+    record[1] = action
+    for index, value in fields.items():
+        record[int(index[1:])] = value
+    return '\t'.join(record)
+
+
+def apply(tmp_path, records: list) -> dict:
+    f_name = tmp_path / 'BPLAN_DELTA'
+    f_name.write_text('\n'.join(records) + '\n')
+    return bplan_delta.apply_delta(str(f_name), reject_file=str(tmp_path / 'rejects.jsonl'))
+
+
+class TestBplanDelta:
+    def test_network_links(self, network, tmp_path):
+        """Links are replaced in place, added and deleted by natural key"""
+        assert NetworkLink.get_all_lines('KIDSGRV', 'ALSAGER') == ['ML', 'SL']
+
+        report = apply(tmp_path, [
+            change(NWK[0], 'C', f10='03000'),
+            change(NWK[1], 'D'),
+            change(NWK[1], 'D'),
+            change(NWK[2], 'D'),
+            change(NWK[0], 'A', f2='HARCAST', f3='KIDSGRV'),
+            change(NWK[0], 'X'),
+        ])
+
+        assert report['applied']['NWK'] == {'A': 1, 'C': 1, 'D': 2}
+        assert report['not_found']['NWK'] == 1
+        assert report['ignored']['NWK'] == 1
+
+        # The caches were cleared, and the edge weights re-resolved
+        assert NetworkLink.get_all_lines('KIDSGRV', 'ALSAGER') == ['ML']
+        assert NetworkLink.get_link('KIDSGRV', 'ALSAGER')[0].distance == '03000'
+        assert EdgeWeight.weight_of('KIDSGRV', 'ALSAGER') == 3000
+        assert not NetworkLink.is_valid_tiploc('ALSAGER')
+        assert EdgeWeight.weight_of('ALSAGER', 'KIDSGRV') is None
+        assert NetworkLink.get_neighbours('HARCAST') == ['KIDSGRV']
+        assert NetworkLink.get_origins('KIDSGRV') == ['HARCAST']
+        assert NetworkLink.get_origins('ALSAGER') == ['KIDSGRV']
+        assert EdgeWeight.provenance_of('HARCAST', 'KIDSGRV') == EW.MEASURED
+        assert '3 edge weights re-resolved' in bplan_delta.format_report(report)
+
+    def test_malformed(self, network, tmp_path):
+        """A malformed record is rejected, and the rest still applied"""
+        report = apply(tmp_path, [
+            change(NWK[0], 'C', f10='03000'),
+            'NWK\tD\tKIDSGRV\tALSAGER',
+            change(LOC[1], 'C', f6='east'),
+            change(NWK[2], 'D'),
+        ])
+
+        assert report['rejected'] == {'LOC': 1, 'NWK': 1}
+        assert report['applied']['NWK'] == {'A': 0, 'C': 1, 'D': 1}
+        assert report['metrics']['records']['NWK'] == {'read': 3, 'accepted': 2, 'rejected': 1}
+        assert LocationRecord.return_instance('ALSAGER').os_easting == 379800
+        rejects = [json.loads(line) for line in (tmp_path / 'rejects.jsonl').read_text().splitlines()]
+        assert rejects[0]['reason'] == 'expected 19 fields, found 4'
+        assert rejects[1]['reason'].startswith('ValueError')
+
+        # The caches were cleared and the weights re-resolved
+        assert NetworkLink.get_all_lines('KIDSGRV', 'ALSAGER') == ['ML', 'SL']
+        assert EdgeWeight.weight_of('KIDSGRV', 'ALSAGER') == 3000
+        assert EdgeWeight.weight_of('ALSAGER', 'KIDSGRV') is None
+        assert 'NWK: A: 0, C: 1, D: 1, 1 rejected' in bplan_delta.format_report(report)
+
+    def test_bus_link(self, network, tmp_path):
+        """A change to a BUS link takes it off the network"""
+        apply(tmp_path, [change(NWK[1], 'C', f5='BUS')])
+        assert NetworkLink.get_all_lines('KIDSGRV', 'ALSAGER') == ['ML']
+
+    def test_locations(self, network, tmp_path):
+        """Locations are replaced or deleted, with their index entries and the
+        geographic weights that depend on them"""
+        before = EdgeWeight.weight_of('KIDSGRV', 'HARCAST')
+        assert EdgeWeight.provenance_of('KIDSGRV', 'HARCAST') == EW.GEOGRAPHIC
+
+        report = apply(tmp_path, [
+            change(LOC[2], 'C', f3='Harecastle Tunnel', f6='390000'),
+            change(LOC[1], 'D'),
+            change(LOC[0], 'A', f2='NEWTIP', f3='New Place'),
+        ])
+
+        assert report['applied']['LOC'] == {'A': 1, 'C': 1, 'D': 1}
+        assert report['edge_weights'] == 3  # Only the links to and from HARCAST and ALSAGER
+        assert LocationRecord.return_instance('ALSAGER') is None
+        assert LocationRecord.return_instance('HARCAST').location_name == 'Harecastle Tunnel'
+        assert LocationRecord.return_instance('HARCAST').wgs_coordinates
+
+        assert [loc.location_code for loc in LocationRecord.match_locations('Alsager')] == []
+        assert LocationRecord.match_locations('Harecastle T')[0].location_code == 'HARCAST'
+        assert LocationRecord.match_locations('NEWTIP')[0].location_name == 'New Place'
+        assert 'ALSAGER' not in SpatialIndex.default().points
+        assert SpatialIndex.default().points['HARCAST'] == (390000, 352000)
+
+        assert EdgeWeight.weight_of('KIDSGRV', 'HARCAST') > before
@@ -1,6 +1,8 @@
 """Tests for bplan_import.py"""
 import sys
 import builtins
+import json
+import sqlite3
 sys.path.insert(0, './vstp')  # nopep8
 import os
 from unittest import mock
@@ -10,6 +12,8 @@ from network_links import NetworkLink
 from timing_links import TimingLink
 from timing_links import Tiploc
 from location_record import LocationRecord
+from edge_weights import EdgeWeight
+import edge_weights as EW
 
 
 @pytest.fixture
@@ -78,13 +82,33 @@ class TestBplanImport:
                     ['line', 'two\n']
                 ]
 
+    def test_iter_records(self, tmp_path):
+
+        f_name = tmp_path / 'PLT'
+        f_name.write_text('PLT\tA\tCREWE\t1\tfoo\n' * 5 + 'PLT\tA\tCREWE\n')
+
+        records = f_import.iter_records(str(f_name))
+        assert next(records) == ['PLT', 'A', 'CREWE', '1', 'foo\n']
+        assert len(list(records)) == 5
+
+        records = list(f_import.iter_records(str(f_name), fields=(2, 3)))
+        assert records[0] == ['CREWE', '1']
+        assert records[-1] == ['CREWE\n', '']
+
+        batches = list(f_import.iter_records(str(f_name), batch_size=4, fields=[3]))
+        assert [len(batch) for batch in batches] == [4, 2]
+        assert batches[0][0] == ['1']
+
+        with pytest.raises(f_import.MissingPartFile):
+            f_import.iter_records(str(tmp_path / 'missing'))
+
     def test_import_location(self, monkeypatch, loc_records):
 
         with monkeypatch.context() as monkey:
 
             monkey.setattr(
-                'bplan_import.import_from_file',
-                lambda f_name: [loc_records]
+                'bplan_import.iter_records',
+                lambda f_name, **kwargs: iter([loc_records])
             )
 
             locs = f_import.import_location()
@@ -99,8 +123,8 @@ class TestBplanImport:
         with monkeypatch.context() as monkey:
 
             monkey.setattr(
-                'bplan_import.import_from_file',
-                lambda f_name: nwk_records
+                'bplan_import.iter_records',
+                lambda f_name, **kwargs: iter(nwk_records)
             )
 
             nwks = f_import.import_network_links()
@@ -114,8 +138,10 @@ class TestBplanImport:
 
         with monkeypatch.context() as monkey:
             monkey.setattr(
-                'bplan_import.import_from_file',
-                lambda f_name: tlk_records
+                'bplan_import.iter_records',
+                lambda f_name, **kwargs: iter(
+                    [record.split('\t') for record in tlk_records]
+                )
             )
 
             tlks = f_import.import_timing_links()
@@ -123,3 +149,213 @@ class TestBplanImport:
             assert tlks[0].__class__.__name__ == 'TimingLink'
             assert tlks[0].start_tiploc.__class__.__name__ == "Tiploc"
             assert tlks[0].end_tiploc.__class__.__name__ == "Tiploc"
+
+    def test_import_bplan(self, monkeypatch, tmp_path):
+
+        monkeypatch.setattr(NetworkLink, '_instances', {})
+        monkeypatch.setattr(LocationRecord, '_instances', {})
+
+        bplan = tmp_path / 'BPLAN'
+        with open(bplan, 'w', encoding='utf-8') as file:
+            for f_name in ['bplan_location.raw', 'bplan_nwk.raw', 'bplan_tld.raw']:
+                with open(f'./tests/files/{f_name}', 'r', encoding='utf-8') as part:
+                    file.write(part.read())
+
+        counts = f_import.import_bplan(str(bplan), ('LOC', 'NWK'))
+
+        assert counts == {'LOC': 50, 'NWK': 50, 'TLD': 50}
+        assert LocationRecord.return_instance('WANBRO')
+        assert 'FLKLNDS' in NetworkLink._instances['FLKLJN']
+
+    def test_import_bplan_rejects(self, monkeypatch, tmp_path):
+
+        monkeypatch.setattr(NetworkLink, '_instances', {})
+        monkeypatch.setattr(LocationRecord, '_instances', {})
+
+        bus = 'NWK\tA\tFLKLJN\tFLKLNDS\tBUS\t\t\t\tD\tD\t01000\tN\tN\tN\t5\tN\t\t0\t\n'
+        bplan = tmp_path / 'BPLAN'
+        with open(bplan, 'w', encoding='utf-8') as file:
+            with open('./tests/files/bplan_nwk.raw', 'r', encoding='utf-8') as part:
+                file.write(part.read())
+            file.write(bus)
+            file.write('NWK\tA\tSHORT\n')
+
+        metrics = f_import.ImportMetrics()
+        reject_file = tmp_path / 'rejects.jsonl'
+        counts = f_import.import_bplan(str(bplan), ('NWK',), metrics, str(reject_file))
+
+        assert counts == {'NWK': 52}
+        assert metrics.report()['records'] == {'NWK': {'read': 52, 'accepted': 33, 'rejected': 19}}
+        rejects = [json.loads(line) for line in reject_file.read_text().splitlines()]
+        assert [reject['reason'] for reject in rejects[-2:]] == [
+            'BUS link, not used for routing', 'expected 19 fields, found 3'
+        ]
+        assert rejects[-1]['record'] == 'NWK\tA\tSHORT'
+
+        metrics = f_import.ImportMetrics()
+        assert f_import.network_link_from_record(bus.split('\t'), metrics) is None
+        assert metrics.rejected == {'NWK': 1}
+
+    def test_import_network(self, monkeypatch, tmp_path):
+
+        monkeypatch.setattr(NetworkLink, '_instances', {})
+        monkeypatch.setattr(LocationRecord, '_instances', {})
+        monkeypatch.setattr(EdgeWeight, '_instances', {})
+
+        bplan = tmp_path / 'BPLAN'
+        with open(bplan, 'w', encoding='utf-8') as file:
+            for f_name in ['bplan_location.raw', 'bplan_nwk.raw']:
+                with open(f'./tests/files/{f_name}', 'r', encoding='utf-8') as part:
+                    file.write(part.read())
+
+        monkeypatch.setattr(f_import, 'BPLAN_FILE', str(bplan))
+        snap = str(tmp_path / 'vstp.snap')
+
+        assert not f_import.import_network(snap)
+        assert os.path.isfile(snap)
+
+        NetworkLink._instances.clear()
+        LocationRecord._instances.clear()
+        EdgeWeight._instances.clear()
+
+        assert f_import.import_network(snap)
+        assert LocationRecord.return_instance('WANBRO')
+        assert 'FLKLNDS' in NetworkLink._instances['FLKLJN']
+
+    def test_import_network_timed(self, monkeypatch, tmp_path):
+
+        monkeypatch.setattr(NetworkLink, '_instances', {})
+        monkeypatch.setattr(LocationRecord, '_instances', {})
+        monkeypatch.setattr(EdgeWeight, '_instances', {})
+
+        # No NWK distance and no LOC coordinates, only the TLK timing
+        bplan = tmp_path / 'BPLAN'
+        with open(bplan, 'w', encoding='utf-8') as file:
+            with open('./tests/files/bplan_location.raw', 'r', encoding='utf-8') as part:
+                file.write(part.read())
+            file.write('NWK\tA\tTIMEDA\tTIMEDB\tML\t\t\t\tD\tD\t00000\tN\tN\tN\t5\tN\t\t0\t0\n')
+            file.write("TLK\tA\tTIMEDA\tTIMEDB\tML\t92\t1600 \t60\t \t-1\t-1\t14-12-2008 00:00:00\t\t+02'00\t\n")
+
+        monkeypatch.setattr(f_import, 'BPLAN_FILE', str(bplan))
+        snap = str(tmp_path / 'vstp.snap')
+
+        assert not f_import.import_network(snap)
+        assert EdgeWeight.provenance_of('TIMEDA', 'TIMEDB') == EW.TIMED
+        assert EdgeWeight.weight_of('TIMEDA', 'TIMEDB') == 3219
+
+        EdgeWeight._instances.clear()
+        assert f_import.import_network(snap)
+        assert EdgeWeight.provenance_of('TIMEDA', 'TIMEDB') == EW.TIMED
+
+    def test_import_network_image(self, monkeypatch, tmp_path):
+
+        monkeypatch.setattr(NetworkLink, '_instances', {})
+        monkeypatch.setattr(LocationRecord, '_instances', {})
+        monkeypatch.setattr(EdgeWeight, '_instances', {})
+
+        bplan = tmp_path / 'BPLAN'
+        with open(bplan, 'w', encoding='utf-8') as file:
+            for f_name in ['bplan_location.raw', 'bplan_nwk.raw']:
+                with open(f'./tests/files/{f_name}', 'r', encoding='utf-8') as part:
+                    file.write(part.read())
+
+        monkeypatch.setattr(f_import, 'BPLAN_FILE', str(bplan))
+        image_file = str(tmp_path / 'vstp.img')
+
+        try:
+            image = f_import.import_network_image(image_file, str(tmp_path / 'vstp.snap'))
+            assert os.path.isfile(image_file)
+            assert NetworkLink._image is image
+            assert 'FLKLNDS' in NetworkLink.get_neighbours('FLKLJN')
+        finally:
+            f_import.network_image.detach()
+
+    def test_ensure_loaded(self, monkeypatch, tmp_path):
+
+        monkeypatch.setattr(NetworkLink, '_instances', {})
+        monkeypatch.setattr(LocationRecord, '_instances', {})
+        monkeypatch.setattr(EdgeWeight, '_instances', {})
+        monkeypatch.setattr(f_import, '_LOADED', set())
+
+        bplan = tmp_path / 'BPLAN'
+        with open(bplan, 'w', encoding='utf-8') as file:
+            for f_name in ['bplan_location.raw', 'bplan_nwk.raw']:
+                with open(f'./tests/files/{f_name}', 'r', encoding='utf-8') as part:
+                    file.write(part.read())
+
+        monkeypatch.setattr(f_import, 'BPLAN_FILE', str(bplan))
+        snap = str(tmp_path / 'vstp.snap')
+
+        assert f_import.ensure_loaded('LOC', snapshot_file=snap) == {'LOC'}
+        assert LocationRecord.return_instance('WANBRO')
+        assert not NetworkLink._instances
+
+        assert f_import.ensure_loaded('LOC', 'NWK', snapshot_file=snap) == {'LOC', 'NWK'}
+        links = len(NetworkLink._instances['FLKLJN']['FLKLNDS'])
+
+        f_import.ensure_loaded('NWK', snapshot_file=snap)
+        assert len(NetworkLink._instances['FLKLJN']['FLKLNDS']) == links
+
+    def test_ensure_loaded_loc_only(self, monkeypatch, tmp_path):
+
+        monkeypatch.setattr(NetworkLink, '_instances', {})
+        monkeypatch.setattr(LocationRecord, '_instances', {})
+        monkeypatch.setattr(EdgeWeight, '_instances', {})
+        monkeypatch.setattr(f_import, '_LOADED', set())
+        monkeypatch.setattr(f_import, 'BPLAN_FILE', str(tmp_path / 'BPLAN'))
+
+        with open('./tests/files/bplan_location.raw', 'r', encoding='utf-8') as part:
+            (tmp_path / 'LOC').write_text(part.read(), encoding='utf-8')
+        monkeypatch.chdir(tmp_path)
+
+        assert f_import.ensure_loaded('LOC', snapshot_file=str(tmp_path / 'vstp.snap')) == {'LOC'}
+        assert LocationRecord.return_instance('WANBRO')
+        assert not NetworkLink._instances
+
+    def test_ensure_loaded_from_db(self, monkeypatch, tmp_path):
+
+        monkeypatch.setattr(NetworkLink, '_instances', {})
+        monkeypatch.setattr(LocationRecord, '_instances', {})
+        monkeypatch.setattr(EdgeWeight, '_instances', {})
+        monkeypatch.setattr(f_import, '_LOADED', set())
+        monkeypatch.setattr(f_import, 'BPLAN_FILE', str(tmp_path / 'BPLAN'))
+
+        db_file = tmp_path / 'vstp.db'
+        with sqlite3.connect(db_file) as connection:
+            connection.execute(
+                'CREATE TABLE location (id INTEGER PRIMARY KEY, tiploc, name, easting, '
+                'northing, tp_type, zone, stanox, off_network, lpb)'
+            )
+            connection.execute(
+                'CREATE TABLE networklink (id INTEGER PRIMARY KEY, origin, destination, '
+                'line, line_desc, initial_dir, final_dir, distance, doop, doof, retb, '
+                'zone, reversable, power, route_avail, max_len)'
+            )
+            with open('./tests/files/bplan_location.raw', 'r', encoding='utf-8') as file:
+                for line in file:
+                    values = line.rstrip('\n').split('\t')
+                    connection.execute(
+                        'INSERT INTO location VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        [values[index] for index in (2, 3, 6, 7, 8, 9, 10, 11, 12)]
+                    )
+            with open('./tests/files/bplan_nwk.raw', 'r', encoding='utf-8') as file:
+                for line in file:
+                    values = line.rstrip('\n').split('\t')
+                    connection.execute(
+                        'INSERT INTO networklink VALUES '
+                        '(NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        values[2:6] + values[8:19]
+                    )
+
+        monkeypatch.setattr(f_import.db_import, 'NETWORK_DB', f'sqlite:///{db_file}')
+
+        try:
+            assert f_import.ensure_loaded('LOC') == {'LOC'}
+            assert LocationRecord.return_instance('WANBRO')
+            assert not NetworkLink._instances
+
+            assert not f_import.import_network()
+            assert 'FLKLNDS' in NetworkLink._instances['FLKLJN']
+            assert EdgeWeight.weight_of('FLKLJN', 'FLKLNDS') == 1448
+        finally:
+            NetworkLink.clear_cache()
@@ -0,0 +1,67 @@
+"""Tests for bplan_reader.py"""
+import sys
+sys.path.insert(0, './vstp')  # nopep8
+import gzip
+import zipfile
+import pytest
+import bplan_reader as READER
+from err import MissingPartFile
+
+BPLAN = [
+    './tests/files/bplan_location.raw',
+    './tests/files/bplan_nwk.raw',
+    './tests/files/bplan_tld.raw'
+]
+
+
+@pytest.fixture
+def content():
+    text = ''
+    for f_name in BPLAN:
+        with open(f_name, 'r', encoding='utf-8') as file:
+            text += file.read()
+    return text
+
+
+@pytest.fixture
+def plain(tmp_path, content):
+    f_name = tmp_path / 'BPLAN'
+    f_name.write_text(content, encoding='utf-8')
+    return str(f_name)
+
+
+@pytest.fixture
+def gzipped(tmp_path, content):
+    f_name = tmp_path / 'BPLAN.gz'
+    with gzip.open(f_name, 'wt', encoding='utf-8') as file:
+        file.write(content)
+    return str(f_name)
+
+
+@pytest.fixture
+def zipped(tmp_path, content):
+    f_name = tmp_path / 'BPLAN.zip'
+    with zipfile.ZipFile(f_name, 'w') as archive:
+        archive.writestr('BPLAN.txt', content)
+    return str(f_name)
+
+
+class TestBplanReader:
+
+    @pytest.mark.parametrize('source', ['plain', 'gzipped', 'zipped'])
+    def test_read_bplan(self, source, request):
+        f_name = request.getfixturevalue(source)
+        locs = []
+        nwks = []
+
+        counts = READER.read_bplan(f_name, {'LOC': locs.append, 'NWK': nwks.append})
+
+        assert counts == {'LOC': 50, 'NWK': 50, 'TLD': 50}
+        assert len(locs) == 50
+        assert len(nwks) == 50
+        assert locs[0][2] == 'WANBRO'
+        assert nwks[0][0] == 'NWK'
+
+    def test_missing(self):
+        with pytest.raises(MissingPartFile):
+            READER.read_bplan('missing.bplan.file', {})
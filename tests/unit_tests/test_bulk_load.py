@@ -0,0 +1,80 @@
+"""Unit tests for bulk_load"""
+
+# pylint: disable=C0301, E0401, C0413, W0621
+
+import sys
+sys.path.insert(0, './vstp/models') # nopep8
+import pytest
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+import timing_load as TLD
+import bulk_load as BL
+
+TEST_FILE = './tests/files/bplan_tld.raw'
+
+
+@pytest.fixture
+def engine():
+    """An empty in memory database"""
+    engine = create_engine('sqlite://')
+    SQLModel.metadata.create_all(engine, tables=[TLD.TimingLoad.__table__])
+    return engine
+
+
+def row_count(engine) -> int:
+    with engine.connect() as connection:
+        return connection.execute(
+            select(func.count()).select_from(TLD.TimingLoad.__table__)
+        ).scalar()
+
+
+class TestBulkLoad:
+    """Tests for bulk_load"""
+
+    def test_bulk_load(self, engine):
+        """Load the TLD test file, in several chunks"""
+        with open(TEST_FILE, 'r', encoding='utf-8') as file:
+            report = BL.bulk_load(
+                engine,
+                TLD.TimingLoad,
+                (TLD.TimingLoad.bplan_factory(line) for line in file),
+                chunk_size=7
+            )
+
+        assert report['table'] == 'timingload'
+        assert report['rows'] == row_count(engine) == 50
+        assert report['rows_per_second'] > 0
+        assert '50 rows' in BL.format_report(report)
+
+        with engine.connect() as connection:
+            row = connection.execute(select(TLD.TimingLoad.__table__)).first()
+        assert row.id == 1
+        assert row.traction_type
+
+    def test_skipped(self, engine):
+        """None and rows missing a NOT NULL value are skipped"""
+        rows = [
+            None,
+            {'traction_type': '37', 'trailing_load': '350', 'max_speed': '50',
+             'ra_guage': None, 'description': 'foo', 'power_type': 'D',
+             'load': '350', 'limiting_speed': '50'}
+        ]
+        report = BL.bulk_load(engine, TLD.TimingLoad.__table__, rows)
+        assert report['rows'] == 1
+        assert report['skipped'] == 1
+        assert 'skipped' in BL.format_report(report)
+
+    def test_pragmas_restored(self, tmp_path):
+        """A pooled connection keeps its durability pragmas after a load"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'tld.db'}", poolclass=StaticPool)
+        SQLModel.metadata.create_all(engine, tables=[TLD.TimingLoad.__table__])
+        with engine.connect() as connection:
+            connection.exec_driver_sql('PRAGMA journal_mode = WAL')
+
+        with open(TEST_FILE, 'r', encoding='utf-8') as file:
+            BL.bulk_load(engine, TLD.TimingLoad, (TLD.TimingLoad.bplan_factory(line) for line in file))
+
+        with engine.connect() as connection:
+            assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+            assert connection.exec_driver_sql('PRAGMA synchronous').scalar() == 2
@@ -0,0 +1,60 @@
+"""Unit tests for coordinates.py"""
+
+# pylint: disable=import-error, wrong-import-position
+
+import sys
+
+sys.path.insert(0, './vstp/models')  # nopep8
+import coordinates as COORD
+from bng_latlon import OSGB36toWGS84 as conv
+from haversine import haversine, Unit
+import pytest
+
+POINTS = [
+    (383700, 354300),
+    (260700, 296000),
+    (311300, 967900),
+    (147600, 30600),
+    (538890, 177320)
+]
+
+
+class TestCoordinates:
+    """Unit tests for the vectorised coordinate conversion"""
+    def test_bng_to_wgs(self):
+        """Test the raw arrays are returned"""
+        lats, lons = COORD.bng_to_wgs(
+            [point[0] for point in POINTS],
+            [point[1] for point in POINTS]
+        )
+        assert len(lats) == len(POINTS)
+        assert len(lons) == len(POINTS)
+
+    def test_bng_to_wgs_pairs(self):
+        """Test the results match the scalar conversion"""
+        pairs = COORD.bng_to_wgs_pairs(
+            [point[0] for point in POINTS],
+            [point[1] for point in POINTS]
+        )
+        assert pairs == [conv(*point) for point in POINTS]
+
+    def test_empty(self):
+        """Test nothing in, nothing out"""
+        assert COORD.bng_to_wgs_pairs([], []) == []
+
+    def test_haversine_metres(self):
+        """Test the distances match the scalar haversine"""
+        pairs = [conv(*point) for point in POINTS]
+        distances = COORD.haversine_metres(
+            [pair[0] for pair in pairs[:-1]], [pair[1] for pair in pairs[:-1]],
+            [pair[0] for pair in pairs[1:]], [pair[1] for pair in pairs[1:]]
+        )
+        expected = [
+            haversine(pair_1, pair_2, unit=Unit.METERS)
+            for pair_1, pair_2 in zip(pairs[:-1], pairs[1:])
+        ]
+        assert distances.tolist() == pytest.approx(expected)
+
+    def test_planar_metres(self):
+        """Test the straight line distances"""
+        assert COORD.planar_metres([0, 100], [0, 100], [300, 100], [400, 100]).tolist() == [500, 0]
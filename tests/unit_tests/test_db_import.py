@@ -0,0 +1,134 @@
+"""Unit tests for db_import"""
+import sys
+sys.path.insert(0, './vstp')  # nopep8
+sys.path.insert(0, './vstp/models')  # nopep8
+import pytest
+from sqlalchemy import create_engine, text
+from sqlmodel import SQLModel
+import fast_validate as FV
+from location import Location
+from network_link import NetworkLink as NetworkLinkTable
+from timing_link import TimingLink as TimingLinkTable
+import db_import
+import edge_weights as EW
+from network_links import NetworkLink
+from location_record import LocationRecord
+from edge_weights import EdgeWeight
+
+LOC_FILE = './tests/files/bplan_location.raw'
+NWK_FILE = './tests/files/bplan_nwk.raw'
+
+
+@pytest.fixture
+def registries(monkeypatch):
+    monkeypatch.setattr(NetworkLink, '_instances', {})
+    monkeypatch.setattr(NetworkLink, '_origins', {})
+    monkeypatch.setattr(LocationRecord, '_instances', {})
+    monkeypatch.setattr(LocationRecord, '_search', None)
+    monkeypatch.setattr(EdgeWeight, '_instances', {})
+    yield
+    NetworkLink.clear_cache()
+
+
+@pytest.fixture
+def database(tmp_path):
+    db_con_string = f"sqlite:///{tmp_path / 'vstp.db'}"
+    engine = create_engine(db_con_string)
+    SQLModel.metadata.create_all(
+        engine, tables=[Location.__table__, NetworkLinkTable.__table__]
+    )
+    FV.load_bplan(engine, Location, LOC_FILE)
+    FV.load_bplan(engine, NetworkLinkTable, NWK_FILE)
+    engine.dispose()
+    return db_con_string
+
+
+def network_state() -> tuple:
+    return (
+        {
+            code: (obj.location_name, obj.bng_coordinates, obj.wgs_coordinates)
+            for code, obj in LocationRecord._instances.items()
+        },
+        {
+            origin: {
+                dest: [(lnk.running_line_code, lnk.distance) for lnk in lnks]
+                for dest, lnks in dests.items()
+            }
+            for origin, dests in NetworkLink._instances.items()
+        },
+        {
+            origin: {dest: (obj.weight, obj.provenance) for dest, obj in dests.items()}
+            for origin, dests in EdgeWeight._instances.items()
+        }
+    )
+
+
+class TestDbImport:
+    def test_matches_text_import(self, registries, database):
+        """The registries built from the database match those from the files"""
+        with open(LOC_FILE, 'r', encoding='utf-8') as file:
+            for line in file:
+                LocationRecord(*line.split('\t'))
+        with open(NWK_FILE, 'r', encoding='utf-8') as file:
+            for line in file:
+                lnk = NetworkLink(*line.split('\t'))
+                if not lnk.is_bus:
+                    lnk.append_to_instance()
+        LocationRecord.convert_coordinates()
+        EdgeWeight.build()
+        expected = network_state()
+
+        LocationRecord._instances.clear()
+        NetworkLink._instances.clear()
+        EdgeWeight._instances.clear()
+
+        report = db_import.load_network(database, batch_size=7)
+
+        assert report['counts'] == {'LOC': 50, 'NWK': 33}
+        assert network_state() == expected
+
+    def test_replaces_loaded(self, registries, database):
+        """Loading again replaces the registries, rather than adding to them"""
+        db_import.load_network(database)
+        expected = network_state()
+        LocationRecord(*'LOC\tA\tCREWE\tCrewe\t\t\t370900\t354800\tM\t5\t\tN\t'.split('\t'))
+
+        report = db_import.load_network(database)
+
+        assert report['counts'] == {'LOC': 50, 'NWK': 33}
+        assert network_state() == expected
+        assert LocationRecord.return_instance('CREWE') is None
+        assert len(NetworkLink._instances['FLKLJN']['FLKLNDS']) == 1
+        assert NetworkLink.get_origins('FLKLNDS') == ['FLKLJN']
+
+    def test_cleaned_values_used(self, registries, database):
+        """Distances and coordinates come from the (cleaned) database"""
+        engine = create_engine(database)
+        with engine.begin() as connection:
+            connection.execute(text(
+                "UPDATE networklink SET distance = '02000' "
+                "WHERE origin = 'FLKLJN' AND destination = 'FLKLNDS'"
+            ))
+        engine.dispose()
+
+        db_import.load_network(database)
+
+        assert NetworkLink.get_link('FLKLJN', 'FLKLNDS')[0].distance == '02000'
+        assert EdgeWeight.weight_of('FLKLJN', 'FLKLNDS') == 2000
+
+    def test_timed_weights(self, registries, database, tmp_path):
+        """The TLK estimates come from the timinglink table, where loaded"""
+        nwk = tmp_path / 'NWK'
+        nwk.write_text('NWK\tA\tTIMEDA\tTIMEDB\tML\t\t\t\tD\tD\t00000\tN\tN\tN\t5\tN\t\t0\t0\n')
+        tlk = tmp_path / 'TLK'
+        tlk.write_text("TLK\tA\tTIMEDA\tTIMEDB\tML\t92\t1600 \t60\t \t-1\t-1\t14-12-2008 00:00:00\t\t+02'00\t\n")
+        engine = create_engine(database)
+        SQLModel.metadata.create_all(engine, tables=[TimingLinkTable.__table__])
+        assert FV.load_bplan(engine, NetworkLinkTable, str(nwk))['rows'] == 1
+        assert FV.load_bplan(engine, TimingLinkTable, str(tlk))['rows'] == 1
+        engine.dispose()
+
+        db_import.load_network(database)
+
+        assert EdgeWeight.provenance_of('TIMEDA', 'TIMEDB') == EW.TIMED
+        assert EdgeWeight.weight_of('TIMEDA', 'TIMEDB') == 3219
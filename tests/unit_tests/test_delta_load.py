@@ -0,0 +1,71 @@
+"""Unit tests for delta_load"""
+
+# pylint: disable=C0301, E0401, C0413, W0621
+
+import sys
+sys.path.insert(0, './vstp/models') # nopep8
+import pytest
+from sqlalchemy import create_engine, select
+from sqlmodel import SQLModel
+import bulk_load as BL
+import fast_validate as FV
+import delta_load as DL
+
+NWK_FILE = './tests/files/bplan_nwk.raw'
+
+
+@pytest.fixture
+def engine():
+    """A database holding the first 5 NWK test records"""
+    engine = create_engine('sqlite://')
+    SQLModel.metadata.create_all(engine, tables=[DL.NetworkLink.__table__])
+    with open(NWK_FILE, 'r', encoding='utf-8') as file:
+        lines = file.readlines()[:5]
+    BL.bulk_load(engine, DL.NetworkLink, FV.validate_lines(DL.NetworkLink, lines))
+    return engine
+
+
+def nwk_record(line: int, action: str, **fields) -> str:
+    """A test NWK record with its action code and any fields (by index) changed"""
+    with open(NWK_FILE, 'r', encoding='utf-8') as file:
+        record = file.readlines()[line].rstrip('\n').split('\t')
+    record[1] = action
+    for index, value in fields.items():
+        record[int(index[1:])] = value
+    return '\t'.join(record)
+
+
+def links(engine) -> list:
+    table = DL.NetworkLink.__table__
+    with engine.connect() as connection:
+        return connection.execute(
+            select(table.c.origin, table.c.destination, table.c.line, table.c.distance).order_by(table.c.id)
+        ).all()
+
+
+class TestDeltaLoad:
+    """Tests for applying an update file to the tables"""
+
+    def test_apply_delta(self, engine, tmp_path):
+        """Changes update in place, adds insert, deletes delete"""
+        delta = tmp_path / 'BPLAN_DELTA'
+        delta.write_text('\n'.join([
+            nwk_record(0, 'C', f10='01500'),  # FLKLJN -> FLKLNDS, no line code
+            nwk_record(2, 'D'),  # SOTON -> MBRKDE FL
+            nwk_record(2, 'D'),
+            nwk_record(8, 'A'),
+            nwk_record(1, 'C', f10='X'),
+            'NWK\tR\tFOO'
+        ]) + '\n')
+
+        before = links(engine)
+        report = DL.apply_delta(engine, str(delta), ('NWK',))
+        after = links(engine)
+
+        assert report['counts']['NWK'] == {'inserted': 1, 'updated': 1, 'deleted': 1, 'not_found': 1}
+        assert [reject['line'] for reject in report['rejected']] == [5, 6]
+        assert after[0] == ('FLKLJN', 'FLKLNDS', None, '01500')
+        assert before[2] not in after
+        assert after[1] == before[1]
+        assert len(after) == len(before)
+        assert '1 inserted, 1 updated, 1 deleted, 1 not found' in DL.format_report(report)
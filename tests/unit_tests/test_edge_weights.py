@@ -0,0 +1,102 @@
+"""Unit tests for edge_weights"""
+import sys
+sys.path.insert(0, './vstp')  # nopep8
+import pytest
+import edge_weights as EW
+from network_links import NetworkLink
+from location_record import LocationRecord
+
+
+class DummyTiploc:
+    def __init__(self, tiploc):
+        self.tiploc = tiploc
+
+
+class DummyTimingLink:
+    def __init__(self, start, end, speed, srt):
+        self.start_tiploc = DummyTiploc(start)
+        self.end_tiploc = DummyTiploc(end)
+        self.speed = speed
+        self.srt = srt
+
+
+def nwk(origin, destination, distance, line='ML'):
+    record = f'NWK\tA\t{origin}\t{destination}\t{line}\t\t01-01-1995 00:00:00\t\tD\tD\t{distance}\tN\tY\tN\t5\tN\t\t0\t0'
+    link = NetworkLink(*record.split('\t'))
+    link.append_to_instance()
+    return link
+
+
+@pytest.fixture
+def network(monkeypatch):
+    monkeypatch.setattr(NetworkLink, '_instances', {})
+    monkeypatch.setattr(LocationRecord, '_instances', {})
+    monkeypatch.setattr(EW.EdgeWeight, '_instances', {})
+
+    for record in [
+        'LOC\tA\tKIDSGRV\tKidsgrove\t\t\t383700\t354300\tM\t5\t43031\tN\t',
+        'LOC\tA\tALSAGER\tAlsager\t\t\t379800\t355100\tM\t5\t43030\tN\t',
+        'LOC\tA\tNOWHERE\tNowhere\t\t\t999999\t999999\tM\t5\t43032\tN\t',
+    ]:
+        LocationRecord(*record.split('\t'))
+
+    nwk('KIDSGRV', 'ALSAGER', '03882')
+    nwk('KIDSGRV', 'ALSAGER', '03700', line='SL')
+    nwk('ALSAGER', 'KIDSGRV', '00000')
+    nwk('ALSAGER', 'NOWHERE', '00001')
+    nwk('NOWHERE', 'ALSAGER', '00000')
+
+
+class TestEdgeWeight:
+    def test_measured_distance(self, network):
+        links = NetworkLink.get_link('KIDSGRV', 'ALSAGER')
+        assert EW.EdgeWeight.measured_distance(links) == 3700
+        links = NetworkLink.get_link('ALSAGER', 'KIDSGRV')
+        assert EW.EdgeWeight.measured_distance(links) is None
+
+    def test_timed_distance(self):
+        assert EW.EdgeWeight.timed_distance('60', "+02'00") == 3219
+        assert EW.EdgeWeight.timed_distance(' ', "+02'00") is None
+        assert EW.EdgeWeight.timed_distance('60', 'foo') is None
+
+    def test_build(self, network):
+        timing = [DummyTimingLink('NOWHERE', 'ALSAGER', '60', "+01'00")]
+        EW.EdgeWeight.build(timing)
+
+        assert EW.EdgeWeight.weight_of('KIDSGRV', 'ALSAGER') == 3700
+        assert EW.EdgeWeight.provenance_of('KIDSGRV', 'ALSAGER') == EW.MEASURED
+
+        assert EW.EdgeWeight.provenance_of('ALSAGER', 'KIDSGRV') == EW.GEOGRAPHIC
+        assert 3800 < EW.EdgeWeight.weight_of('ALSAGER', 'KIDSGRV') < 4100
+
+        assert EW.EdgeWeight.provenance_of('NOWHERE', 'ALSAGER') == EW.TIMED
+        assert EW.EdgeWeight.weight_of('NOWHERE', 'ALSAGER') == 1609
+
+        assert EW.EdgeWeight.provenance_of('ALSAGER', 'NOWHERE') == EW.DEFAULT
+        assert EW.EdgeWeight.weight_of('ALSAGER', 'NOWHERE') == EW.DEFAULT_WEIGHT
+
+        assert EW.EdgeWeight.weight_of('KIDSGRV', 'NOWHERE') is None
+
+    def test_planar_ratio(self, network):
+        EW.EdgeWeight.build()
+        assert EW.EdgeWeight.planar_ratio() == pytest.approx(3700 / (3900 ** 2 + 800 ** 2) ** 0.5 / 0.999)
+
+        EW.EdgeWeight.resolve('KIDSGRV', 'ALSAGER', NetworkLink.get_link('KIDSGRV', 'ALSAGER')[:1])
+        assert EW.EdgeWeight.planar_ratio() == pytest.approx(3882 / (3900 ** 2 + 800 ** 2) ** 0.5 / 0.999)
+
+    def test_planar_outlier(self, network):
+        """One pair far shorter than its straight line cannot pull the ratio
+        under the floor"""
+        EW.EdgeWeight.build()
+        EW.EdgeWeight.resolve('KIDSGRV', 'ALSAGER', [nwk('KIDSGRV', 'ALSAGER', '00400', line='FL')])
+        with pytest.warns(RuntimeWarning, match='1 TIPLOC pairs'):
+            ratio = EW.EdgeWeight.planar_ratio()
+
+        # Set by the GEOGRAPHIC weight of ALSAGER to KIDSGRV, not the outlier
+        distance = LocationRecord.planar_distance((379800, 355100), (383700, 354300))
+        assert ratio == pytest.approx(EW.EdgeWeight.weight_of('ALSAGER', 'KIDSGRV') / distance)
+        assert ratio >= EW.PLANAR_RATIO_FLOOR
+
+    def test_lazy_build(self, network):
+        with pytest.warns(RuntimeWarning, match='without TLK'):
+            assert EW.EdgeWeight.weight_of('KIDSGRV', 'ALSAGER') == 3700
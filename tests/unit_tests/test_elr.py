@@ -0,0 +1,52 @@
+"""Unit tests for elr"""
+
+# pylint: disable=C0301, E0401, C0413, W0621
+
+import sys
+sys.path.insert(0, './vstp/models') # nopep8
+from sqlalchemy import create_engine
+from sqlmodel import Session, select
+import elr as ELR
+
+
+class TestUpdateLOR:
+    """Tests for the ELR/LOR enrichment"""
+
+    def test_update_lor(self, tmp_path, monkeypatch):
+        mapping = tmp_path / 'mapping.csv'
+        mapping.write_text(
+            'AAV\t29m 04ch\t40m 57ch\tSW260\n'
+            'ABD\t16m 20ch\t22m 01ch\tGW834\n'
+            'ABE\t0m 00ch\t4m 08ch\tLN185\n',
+            encoding='utf-8'
+        )
+        lor = tmp_path / 'lor.csv'
+        lor.write_text(
+            'SW260\tThe "Alton" line\t7\n'
+            'GW834\tO\'Neill\'s branch\t4✖RA3 beyond\n'
+            'GW834\tDuplicate\t1\n',
+            encoding='utf-8'
+        )
+        monkeypatch.setattr(ELR, 'ELR_MAPPING', str(mapping))
+        monkeypatch.setattr(ELR, 'PRIDE_LOR_CODES', str(lor))
+
+        engine = create_engine('sqlite://')
+        ELR.create_schema(engine, [ELR.EngineersLineRef])
+        ELR.bulk_load(engine, ELR.EngineersLineRef, [
+            {'elr': elr, 'name': elr} for elr in ('AAV', 'ABD', 'ABE')
+        ])
+
+        with Session(engine) as session:
+            report = ELR.update_lor(session)
+            rows = {
+                row.elr: (row.lor_reference, row.lor_name, row.ra_value)
+                for row in session.exec(select(ELR.EngineersLineRef))
+            }
+
+        assert report['applied'] == 2
+        assert report['missing'] == ['LN185']
+        assert rows == {
+            'AAV': ('SW260', 'The "Alton" line', 7),
+            'ABD': ('GW834', "O'Neill's branch", 4),
+            'ABE': (None, None, None),
+        }
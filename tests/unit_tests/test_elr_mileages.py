@@ -0,0 +1,119 @@
+"""Unit tests for elr_mileages"""
+import sqlite3
+import sys
+sys.path.insert(0, './vstp')  # nopep8
+import pytest
+import elr_mileages as EM
+from location_record import LocationRecord
+from mileages import MileageIndex
+from sched_models import Schedule
+
+MILEAGE_FILES = {
+    'AAV': (
+        '  28.66\tdown line junction with RDG1\n'
+        '  28.79\tASCOT formerly A.; A. & SUNNINGHILL\n'
+        '  29.04\tjunction with RDG1\n'
+        '  32.08\tBAGSHOT\n'
+        '  40.57\tAsh Vale Junction with PAA1 (32.30)\n'
+    ),
+    'PAA1': (
+        '  32.30\tAsh Vale Junction with AAV (40.57)\n'
+        '  33.10\tASH VALE\n'
+    ),
+    'XXX': (
+        '   1.00\tBAGSHOT\n'
+        '  99.00\tASH VALE\n'
+    ),
+}
+
+LOCATIONS = [
+    ('ASCOT', 'Ascot (Berks)'),
+    ('ASCTSIG', 'Ascot Signal 12'),
+    ('BAGSHOT', 'Bagshot'),
+    ('ASHVJN', 'Ash Vale Jn'),
+    ('ASHV', 'Ash Vale'),
+]
+
+
+@pytest.fixture
+def mileages(tmp_path):
+    directory = tmp_path / 'mileage_files'
+    directory.mkdir()
+    for elr, content in MILEAGE_FILES.items():
+        (directory / f'{elr}.txt').write_text(content, encoding='utf-8')
+    return MileageIndex.build(str(directory))
+
+
+@pytest.fixture
+def locations(monkeypatch):
+    monkeypatch.setattr(LocationRecord, '_instances', {})
+    monkeypatch.setattr(LocationRecord, '_search', None)
+    for tiploc, name in LOCATIONS:
+        LocationRecord('LOC', 'A', tiploc, name, '', '', 0, 0, 'O', '0', '', 'N', '')
+
+
+def schedule(route: list) -> Schedule:
+    sched = Schedule.factory([[ind, tiploc, ''] for ind, (tiploc, _) in enumerate(route)])
+    for row, (_, miles) in zip(sched.rows, route):
+        row.mileage = str(miles)
+    return sched
+
+
+class TestELRMileages:
+    """Tests for tagging schedule rows with ELR mileages"""
+
+    def test_location_keys(self):
+        assert EM.location_keys('Ascot (Berks)') == ['ASCOT BERKS', 'ASCOT']
+        assert EM.location_keys('Ash Vale Jn') == ['ASH VALE JUNCTION']
+        assert EM.location_keys('Leeds W Jn') == ['LEEDS WEST JUNCTION']
+
+    def test_from_locations(self, mileages, locations):
+        index = EM.ELRIndex.from_locations(mileages=mileages)
+
+        assert len(index) == 4
+        assert [(place.elr, place.miles) for place in index.places('ASCOT')] == [('AAV', '28.79')]
+        assert {place.elr for place in index.places('ASHVJN')} == {'AAV', 'PAA1'}
+        assert index.places('ASCTSIG') == ()
+
+    def test_annotate(self, mileages, locations):
+        index = EM.ELRIndex.from_locations(mileages=mileages)
+        sched = schedule([
+            ('ASCOT', 0), ('ASCTSIG', 1.5), ('BAGSHOT', 3.29), ('ASHVJN', 11.84), ('ASHV', 12.5),
+        ])
+
+        assert sched.update_elr_mileages(index) == 5
+        assert [(row.elr, row.elr_mileage) for row in sched.rows] == [
+            ('AAV', '28.79'),
+            ('AAV', '≈30.33'),  # interpolated, by route distance
+            ('AAV', '32.08'),  # the ELR of the previous row, not XXX
+            ('AAV', '40.57'),
+            ('PAA1', '33.10'),
+        ]
+
+    def test_following_row(self, mileages, locations):
+        index = EM.ELRIndex.from_locations(mileages=mileages)
+        sched = schedule([('ASHVJN', 0), ('ASHV', 0.5)])
+
+        index.annotate(sched.rows)
+
+        assert [row.elr for row in sched.rows] == ['PAA1', 'PAA1']
+
+    def test_read_lines(self, mileages, locations, tmp_path):
+        f_name = str(tmp_path / 'elr.db')
+        with sqlite3.connect(f_name) as connection:
+            connection.execute(
+                'CREATE TABLE engineerslineref (elr, name, start_mileage, end_mileage, lor_reference)'
+            )
+            connection.executemany('INSERT INTO engineerslineref VALUES (?, ?, ?, ?, ?)', [
+                ('XXX', 'Test line', 0.0, 10.0, None),
+                ('XXX', 'Test line', 10.0, 20.4, 'SW100'),
+                ('AAV', 'Ascot - Ash Vale', None, None, None),
+            ])
+
+        lines = EM.read_lines(f'sqlite:///{f_name}')
+        assert lines['XXX'] == ('Test line', 'SW100', 0, 20 * 80 + 40)
+        assert lines['AAV'] == ('Ascot - Ash Vale', None, None, None)
+
+        index = EM.ELRIndex.from_locations(mileages=mileages, lines=lines)
+        assert {place.elr for place in index.places('BAGSHOT')} == {'AAV', 'XXX'}
+        assert [place.elr for place in index.places('ASHV')] == ['PAA1']
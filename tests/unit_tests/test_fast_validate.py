@@ -0,0 +1,128 @@
+"""Unit tests for fast_validate"""
+
+# pylint: disable=C0301, E0401, C0413, W0621
+
+import json
+import sys
+sys.path.insert(0, './vstp/models') # nopep8
+import pytest
+import pydantic
+from sqlalchemy import create_engine, select, func
+from sqlmodel import SQLModel
+import location as LOC
+import network_link as NWK
+import timing_link as TLK
+import timing_load as TLD
+import fast_validate as FV
+
+MODELS = [
+    (LOC.Location, './tests/files/bplan_location.raw'),
+    (NWK.NetworkLink, './tests/files/bplan_nwk.raw'),
+    (TLK.TimingLink, './tests/files/bplan_tlk.raw'),
+    (TLD.TimingLoad, './tests/files/bplan_tld.raw')
+]
+
+
+def read_lines(f_name: str) -> list:
+    with open(f_name, 'r', encoding='utf-8') as file:
+        return file.readlines()
+
+
+def factory_values(model, line: str):
+    """The values bplan_factory validates a line to, None if it fails"""
+    try:
+        obj = model.bplan_factory(line)
+    except pydantic.ValidationError:
+        return None
+    return {name: getattr(obj, name) for name in model.BPLAN_FIELDS}
+
+
+class TestFastValidate:
+    """Tests for the chunked validation"""
+
+    @pytest.mark.parametrize('model, f_name', MODELS)
+    def test_matches_factory(self, model, f_name):
+        """Valid rows come out exactly as bplan_factory would leave them"""
+        lines = read_lines(f_name)
+        rejects = []
+        rows = list(FV.validate_lines(model, lines, chunk_size=7, rejects=rejects))
+        assert not rejects
+        assert rows == [factory_values(model, line) for line in lines]
+
+    @pytest.mark.parametrize('model, f_name', MODELS)
+    def test_without_field_rules(self, monkeypatch, model, f_name):
+        """Without pydantic v1, rows are validated by building the model"""
+        monkeypatch.setattr(FV, 'PYDANTIC_V1', False)
+        lines = read_lines(f_name)
+        bad_line = lines[0].split('\t')
+        bad_line[2] = 'X' * 200  # Far too long for any first field
+        rejects = []
+
+        rows = list(FV.validate_lines(model, lines + ['\t'.join(bad_line)], rejects=rejects))
+
+        assert rows == [factory_values(model, line) for line in lines]
+        assert [reject['line'] for reject in rejects] == [len(lines) + 1]
+        assert list(rejects[0]['errors']) == [list(model.BPLAN_FIELDS)[0]]
+
+    def test_rejects(self):
+        """Invalid rows are reported, not raised, and match the factory"""
+        lines = read_lines('./tests/files/bplan_nwk.raw')[:5]
+        bad_line = lines[1].split('\t')
+        bad_line[9] = 'X'  # final direction
+        bad_line[18] = '123456'  # max length
+        lines[1] = '\t'.join(bad_line)
+        lines[3] = 'NWK\tA\tSHORT\n'
+        lines.insert(2, '\n')
+
+        rejects = []
+        rows = list(FV.validate_lines(NWK.NetworkLink, lines, rejects=rejects))
+
+        assert len(rows) == 3
+        assert [reject['line'] for reject in rejects] == [2, 5]
+        assert set(rejects[0]['errors']) == {'final_dir', 'max_len'}
+        assert rejects[1]['errors'] == {'*': 'expected 19 fields'}
+        assert factory_values(NWK.NetworkLink, lines[1]) is None
+
+        report = FV.format_rejects(rejects)
+        assert report.startswith('2 rows rejected')
+        assert 'line 2: final_dir' in report
+        assert FV.format_rejects([]) == 'No rows rejected'
+
+    def test_pre_validators(self):
+        """The model's own pre validators still apply"""
+        line = read_lines('./tests/files/bplan_location.raw')[0].split('\t')
+        line[10] = '123'  # stanox, too short
+        rows = list(FV.validate_lines(LOC.Location, ['\t'.join(line)]))
+        assert rows[0]['stanox'] is None
+        assert rows[0] == factory_values(LOC.Location, '\t'.join(line))
+
+    def test_load_bplan(self):
+        """The valid rows are bulk loaded as dicts"""
+        engine = create_engine('sqlite://')
+        SQLModel.metadata.create_all(engine, tables=[TLK.TimingLink.__table__])
+
+        report = FV.load_bplan(engine, TLK.TimingLink, './tests/files/bplan_tlk.raw')
+
+        with engine.connect() as connection:
+            count = connection.execute(
+                select(func.count()).select_from(TLK.TimingLink.__table__)
+            ).scalar()
+
+        assert report['rows'] == count == 50
+        assert report['rejected'] == []
+
+    def test_write_rejects(self, tmp_path):
+        """Rejected rows are written out as the vstp imports write them"""
+        engine = create_engine('sqlite://')
+        SQLModel.metadata.create_all(engine, tables=[NWK.NetworkLink.__table__])
+        lines = read_lines('./tests/files/bplan_nwk.raw')[:3] + ['NWK\tA\tSHORT\n']
+        f_name = tmp_path / 'nwk.raw'
+        f_name.write_text(''.join(lines), encoding='utf-8')
+        reject_file = tmp_path / 'rejects.jsonl'
+
+        report = FV.load_bplan(engine, NWK.NetworkLink, str(f_name), reject_file=str(reject_file))
+
+        assert report['rows'] == 3
+        assert [json.loads(line) for line in reject_file.read_text().splitlines()] == [
+            {'record_type': 'NWK', 'reason': '*: expected 19 fields', 'record': 'NWK\tA\tSHORT'}
+        ]
@@ -0,0 +1,39 @@
+"""Unit tests for import_metrics"""
+import sys
+sys.path.insert(0, './vstp')  # nopep8
+import json
+import import_metrics as IM
+
+
+def chunk_metrics(rejected: int) -> IM.ImportMetrics:
+    metrics = IM.ImportMetrics()
+    for ind in range(10):
+        metrics.count_read('NWK')
+        if ind < rejected:
+            metrics.reject('NWK', 'BUS link', ['NWK', 'A', f'TIP{ind}\n'])
+        else:
+            metrics.accept('NWK')
+    metrics.add_stage('parse', 0.5, 10)
+    metrics.sample_memory()
+    return metrics
+
+
+class TestImportMetrics:
+    def test_merge(self):
+        metrics = IM.ImportMetrics()
+        metrics.merge(chunk_metrics(2))
+        metrics.merge(chunk_metrics(3))
+
+        report = metrics.report()
+        assert report['records'] == {'NWK': {'read': 20, 'accepted': 15, 'rejected': 5}}
+        assert report['stages']['parse'] == {'seconds': 1.0, 'rows': 20, 'rows_per_second': 20.0}
+        assert 0 < report['peak_memory_kb'] <= IM.peak_memory()
+        assert 'NWK: 20 read, 15 accepted, 5 rejected' in IM.format_report(report)
+        assert 'parse: 1.00s, 20 rows/s' in IM.format_report(report)
+
+    def test_write_rejects(self, tmp_path):
+        f_name = tmp_path / 'rejects.jsonl'
+        assert chunk_metrics(2).write_rejects(str(f_name)) == 2
+
+        rejects = [json.loads(line) for line in f_name.read_text().splitlines()]
+        assert rejects[1] == {'record_type': 'NWK', 'reason': 'BUS link', 'record': 'NWK\tA\tTIP1'}
@@ -27,7 +27,7 @@ class TestImport:
 
         with monkeypatch.context() as monkey:
             monkey.setattr(
-                'import_timing_load.import_from_file',
+                'import_timing_load.iter_records',
                 lambda filename: [
                     ['foo' for _ in range(10)]
                 ]
@@ -0,0 +1,77 @@
+"""Unit tests for link_distances"""
+
+# pylint: disable=C0301, E0401, C0413, W0621
+
+import sys
+sys.path.insert(0, './vstp/models') # nopep8
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, text
+import fast_validate as FV
+import link_distances as LD
+import queries as Q
+
+TEMPLATE = 'NWK\tA\t{}\t{}\t   \t\t11-12-2011 00:00:00\t\tD\tD\t{}\tN\tN\tN\t9\tN\t \t0\t\n'
+
+# WANBRO to MHERON is 18651m on the grid
+LINKS = [
+    ('WANBRO', 'MHERON', '19500'),  # Longer than the straight line, fine
+    ('MHERON', 'WANBRO', '00050'),  # Far too short
+    ('WANBRO', 'GLGH141', '00010'),  # No coordinates at GLGH141
+    ('WANBRO', 'HWKRJN', '00100'),  # Over 99999m, too long to record
+    ('MHERON', 'WANBRO', '18000'),  # Within the tolerance
+    ('WANBRO', 'MHERON', '16000'),  # Outside the tolerance
+    ('NOSUCH', 'WANBRO', '00001'),  # No location
+]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A database loaded with the LOC test records and the test links"""
+    engine = create_engine('sqlite://')
+    Q.create_schema(engine, [Q.Location, Q.NetworkLink])
+    FV.load_bplan(engine, Q.Location, './tests/files/bplan_location.raw')
+    f_name = tmp_path / 'nwk.raw'
+    f_name.write_text(''.join(TEMPLATE.format(*link) for link in LINKS), encoding='utf-8')
+    assert FV.load_bplan(engine, Q.NetworkLink, str(f_name))['rows'] == len(LINKS)
+    return engine
+
+
+def recorded(engine) -> list:
+    with engine.connect() as connection:
+        return [row[0] for row in connection.execute(text('SELECT distance FROM networklink ORDER BY id'))]
+
+
+class TestLinkDistances:
+    """Tests for the column-wise distance recomputation"""
+
+    def test_outliers(self):
+        computed = np.array([1000.0, 1000.0, 10000.0, 10000.0])
+        result = LD.outliers(np.array([np.nan, 700.0, 9100.0, 8900.0]), computed, 200, 0.1)
+        assert result.tolist() == [True, True, False, True]
+
+    @pytest.mark.parametrize('method', ['geodesic', 'planar'])
+    def test_recompute(self, engine, method):
+        report = LD.recompute(engine, method, slack=200, tolerance=0.1)
+
+        assert (report['links'], report['checked'], report['invalid']) == (6, 5, 1)
+        assert (report['outliers'], report['corrected']) == (3, 2)
+        assert [link[:3] for link in report['unwritable']] == [('WANBRO', 'HWKRJN', '00100')]
+        assert report['largest'][0][:3] == ('MHERON', 'WANBRO', '00050')
+
+        distances = recorded(engine)
+        assert distances[0] == '19500'
+        assert abs(int(distances[1]) - 18651) < 100
+        assert distances[1] == distances[5]
+        assert distances[2:5] == ['00010', '00100', '18000']
+        assert 'too long to record' in LD.format_report(report)
+
+    def test_no_apply(self, engine):
+        before = recorded(engine)
+        report = LD.recompute(engine, apply=False)
+        assert (report['outliers'], report['corrected']) == (3, 0)
+        assert recorded(engine) == before
+
+    def test_unknown_method(self, engine):
+        with pytest.raises(ValueError):
+            LD.recompute(engine, 'manhattan')
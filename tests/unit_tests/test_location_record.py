@@ -75,6 +75,29 @@ class TestLocationRecord:
         assert isinstance(matches, list)
         assert len(matches) > 0
 
+    def test_search_index_current(self, monkeypatch):
+        monkeypatch.setattr(LOC.LocationRecord, '_instances', {})
+        monkeypatch.setattr(LOC.LocationRecord, '_search', None)
+        record = 'LOC\tA\tSRCHTST\t{}\t\t\t383700\t354300\tM\t5\t43031\tN\t'
+
+        LOC.LocationRecord(*record.format('Searchington').split('\t'))
+        index = LOC.LocationRecord.search_index()
+
+        # Replaced, so the number of locations is unchanged
+        LOC.LocationRecord(*record.format('Findlater').split('\t'))
+        assert LOC.LocationRecord.search_index() is index
+        assert LOC.LocationRecord.match_locations('Findlater')[0].location_code == 'SRCHTST'
+        assert LOC.LocationRecord.match_locations('Searchington') == []
+
+        # Removed; and an index out of date is rebuilt
+        assert LOC.LocationRecord.unregister('SRCHTST').location_name == 'Findlater'
+        assert LOC.LocationRecord.unregister('SRCHTST') is None
+        assert LOC.LocationRecord.match_locations('Findlater') == []
+        LOC.LocationRecord._search_version = None
+        LOC.LocationRecord(*record.format('Seekham').split('\t'))
+        assert LOC.LocationRecord.search_index() is not index
+        assert LOC.LocationRecord.match_locations('Seekham')[0].location_code == 'SRCHTST'
+
     def test_return_instance(self):
 
         assert LOC.LocationRecord.return_instance('KIDSGRV').__class__.__name__ == 'LocationRecord'
@@ -108,3 +131,18 @@ class TestLocationRecord:
     def test_wgs_coordinates(self, record_from_file):
 
         assert record_from_file.wgs_coordinates == (53.085665, -2.244811)
+
+    def test_convert_coordinates(self, record_from_file):
+
+        record = 'LOC\tA\tNOWHERE\tNowhere\t\t\t999999\t999999\tM\t5\t43032\tN\t'
+        invalid = LOC.LocationRecord(*record.split('\t'))
+
+        assert LOC.LocationRecord.convert_coordinates() > 0
+        assert record_from_file._wgs == (53.085665, -2.244811)
+        assert record_from_file.wgs_coordinates == (53.085665, -2.244811)
+        assert invalid.wgs_coordinates is None
+
+    def test_planar_distance(self):
+
+        assert LOC.LocationRecord.planar_distance((0, 0), (3000, 4000)) == 5000 * LOC.PLANAR_SCALE
+        assert LOC.LocationRecord.planar_distance(None, (3000, 4000)) is None
@@ -0,0 +1,71 @@
+"""Unit tests for location_search"""
+import sys
+sys.path.insert(0, './vstp')  # nopep8
+import pytest
+import location_search as SRCH
+
+
+class Record:
+    def __init__(self, location_code, location_name):
+        self.location_code = location_code
+        self.location_name = location_name
+
+
+@pytest.fixture
+def index():
+    return SRCH.LocationSearch([
+        Record('KIDSGRV', 'Kidsgrove'),
+        Record('KIDSGCS', 'Kidsgrove Central Sidings'),
+        Record('STOKEOT', 'Stoke-on-Trent'),
+        Record('STOKOTJ', 'Stoke-on-Trent North Junction'),
+        Record('CREWE', 'Crewe'),
+        Record('CREWSJN', 'Crewe South Junction'),
+        Record('ALSAGER', 'Alsager')
+    ])
+
+
+def codes(results):
+    return [result.location_code for result in results]
+
+
+class TestHelpers:
+    def test_normalise(self):
+        assert SRCH.normalise(' Stoke-on-Trent ') == 'STOKE ON TRENT'
+
+    def test_trigrams(self):
+        assert SRCH.trigrams('CREWE') == {'CRE', 'REW', 'EWE'}
+        assert SRCH.trigrams('CR') == set()
+
+
+class TestLocationSearch:
+    def test_exact_first(self, index):
+        assert codes(index.search('CREWE'))[:2] == ['CREWE', 'CREWSJN']
+
+    def test_name(self, index):
+        assert codes(index.search('kidsgrove')) == ['KIDSGRV', 'KIDSGCS']
+
+    def test_short_prefix(self, index):
+        assert codes(index.search('ST')) == ['STOKEOT', 'STOKOTJ']
+        assert codes(index.search('j')) == ['CREWSJN', 'STOKOTJ']
+
+    def test_word_prefix(self, index):
+        assert codes(index.search('Junction')) == ['CREWSJN', 'STOKOTJ']
+
+    def test_fuzzy(self, index):
+        assert codes(index.search('Alsagre'))[0] == 'ALSAGER'
+
+    def test_limit(self, index):
+        assert len(index.search('Stoke', limit=1)) == 1
+        assert index.search('') == []
+
+    def test_incremental(self, index):
+        assert codes(index.search('kid')) == ['KIDSGRV', 'KIDSGCS']
+        assert codes(index.search('kidsgrove c')) == ['KIDSGCS', 'KIDSGRV']
+        assert codes(index.search('kidsgrove central', limit=1)) == ['KIDSGCS']
+
+    def test_add_remove(self, index):
+        index.add(Record('CREWE', 'Crewe Station'))
+        assert codes(index.search('Crewe Station', limit=1)) == ['CREWE']
+        index.remove('CREWE')
+        assert 'CREWE' not in codes(index.search('CREWE'))
+        assert len(index) == 6
@@ -0,0 +1,91 @@
+"""Unit tests for mileages"""
+import sys
+sys.path.insert(0, './vstp')  # nopep8
+import pytest
+import mileages as M
+
+AAV = (
+    '  28.66\tdown line junction with RDG1\n'
+    '  28.79\tASCOT formerly A.; A. & SUNNINGHILL\n'
+    '  29.04\tjunction with RDG1\n'
+    ' (28.70)\tAscot goods yard\n'
+    '\n'
+    'Note that the branch was singled in 1990\n'
+    '\tjunction with nowhere\n'
+)
+
+FJS = (
+    ' 200.091km\tFawkham Junction with VIR (22.51)\n'
+    '≈203.602km\tdivergence with END (≈24.70)\n'
+    '   1.33?\tASCOT WEST [1]\n'
+)
+
+
+@pytest.fixture
+def directory(tmp_path):
+    (tmp_path / 'AAV.txt').write_text(AAV, encoding='utf-8')
+    (tmp_path / 'FJS.txt').write_text(FJS, encoding='utf-8')
+    (tmp_path / 'EMPTY.txt').write_text('Note only\n', encoding='utf-8')
+    return tmp_path
+
+
+class TestMileages:
+    """Tests for parsing and looking up the mileage files"""
+
+    def test_chains(self):
+        assert M.to_chains('24.57') == 24 * 80 + 57
+        assert M.to_chains(24.57) == 24 * 80 + 57
+        assert M.to_chains('-0.03') == -3
+        assert M.from_chains(1977) == '24.57'
+        assert M.from_chains(-3) == '-0.03'
+
+    def test_parse_mileage(self):
+        assert M.parse_mileage('  28.66') == (2306, False)
+        assert M.parse_mileage('≈145.11') == (145 * 80 + 11, True)
+        assert M.parse_mileage(' (16.46)') == (16 * 80 + 46, True)
+        assert M.parse_mileage(" ('21.08')") == (21 * 80 + 8, True)
+        assert M.parse_mileage(' 233,55') == (233 * 80 + 55, False)
+        assert M.parse_mileage(' 200.091km') == (9946, False)
+        assert M.parse_mileage('  12.30/19.908km') == (12 * 80 + 30, False)
+        assert M.parse_mileage('') is None
+
+    def test_build(self, directory):
+        index = M.MileageIndex.build(str(directory))
+        assert sorted(index.elrs) == ['AAV', 'FJS']
+        assert len(index) == 7
+        assert [entry.miles for entry in index.between('AAV', '0', '99')] == [
+            '28.66', '28.70', '28.79', '29.04'
+        ]
+
+    def test_lookups(self, directory):
+        index = M.MileageIndex.build(str(directory))
+
+        assert [entry.description for entry in index.at('AAV', '28.79')] == [
+            'ASCOT formerly A.; A. & SUNNINGHILL'
+        ]
+        assert [entry.miles for entry in index.at('AAV', 28.68, tolerance=2)] == ['28.66', '28.70']
+        assert index.at('NOSUCH', '1.00') == []
+        assert index.nearest('AAV', '28.77').miles == '28.79'
+        assert index.nearest('AAV', '99.00').miles == '29.04'
+        assert index.nearest('NOSUCH', '1.00') is None
+
+        ascot = index.locate('Ascot')
+        assert [(entry.elr, entry.miles) for entry in ascot] == [('AAV', '28.79')]
+        assert index.locate('Ascot West')[0].approximate
+        assert {entry.elr for entry in index.prefixed('ASC')} == {'AAV', 'FJS'}
+        assert len(index.prefixed('ASC', limit=1)) == 1
+        assert index.locate('') == []
+
+    def test_cache(self, directory, tmp_path):
+        cache = str(tmp_path / 'mileages.bin')
+        built = M.MileageIndex.load(str(directory), cache)
+        cached = M.MileageIndex.read(cache, M.MileageIndex.sources(str(directory)))
+
+        assert cached is not None
+        assert cached.elrs == built.elrs
+        assert cached.names == built.names
+        assert cached.locate('ascot') == built.locate('ascot')
+
+        (directory / 'AAV.txt').write_text(AAV + '  30.00\tNEW STATION\n', encoding='utf-8')
+        assert M.MileageIndex.read(cache, M.MileageIndex.sources(str(directory))) is None
+        assert M.MileageIndex.load(str(directory), cache).locate('New Station')
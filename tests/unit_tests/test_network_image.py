@@ -0,0 +1,155 @@
+"""Unit tests for network_image"""
+import sys
+sys.path.insert(0, './vstp')  # nopep8
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+import network_image as NI
+from err import BadNetworkImage, NotInNetworkImage
+from pathfinder import Pathfinder
+from network_links import NetworkLink
+from location_record import LocationRecord
+from edge_weights import EdgeWeight
+
+
+@pytest.fixture
+def network(monkeypatch):
+    monkeypatch.setattr(NetworkLink, '_instances', {})
+    monkeypatch.setattr(LocationRecord, '_instances', {})
+    monkeypatch.setattr(EdgeWeight, '_instances', {})
+    NetworkLink.clear_cache()
+
+    for tiploc, east, north in [
+        ('IMGTSTA', 400000, 300000),
+        ('IMGTSTB', 405000, 305000),
+        ('IMGTSTC', 405000, 300500),
+        ('IMGTSTD', 410000, 300000)
+    ]:
+        record = f'LOC\tA\t{tiploc}\tImage {tiploc[-1]}\t\t\t{east}\t{north}\tM\t5\t4303{tiploc[-1]}\tN\t'
+        LocationRecord(*record.split('\t'))
+
+    for origin, destination, line, distance in [
+        ('IMGTSTA', 'IMGTSTC', 'ML', '05100'),
+        ('IMGTSTA', 'IMGTSTB', 'ML', '08000'),
+        ('IMGTSTA', 'IMGTSTB', 'SL', '08100'),
+        ('IMGTSTB', 'IMGTSTD', '', '08000'),
+        ('IMGTSTC', 'IMGTSTD', 'ML', '05100'),
+        ('IMGTSTC', 'IMGTSTB', 'ML', '03000'),
+        ('IMGTSTD', 'IMGTSTA', 'ML', '10000')
+    ]:
+        record = f'NWK\tA\t{origin}\t{destination}\t{line}\t\t\t\tD\tD\t{distance}\tY\tN\tN\t5\tN\t\t0\t0'
+        NetworkLink(*record.split('\t')).append_to_instance()
+
+    yield
+
+    NI.detach()
+
+
+@pytest.fixture
+def image_file(network, tmp_path):
+    f_name = str(tmp_path / 'vstp.img')
+    NI.build(f_name)
+    return f_name
+
+
+def route(start, end):
+    path = Pathfinder(start, end)
+    path.search(std_out=False)
+    return path.route_locations
+
+
+class TestNetworkImage:
+    def test_build(self, image_file):
+        image = NI.NetworkImage(image_file)
+        assert len(image) == 4
+        assert image.index('IMGTSTC') == 2
+        assert image.index('NOWHERE') is None
+        assert image.index('TOOLONGTIPLOC') is None
+        image.close()
+
+    def test_queries(self, image_file):
+        expected = {
+            'neighbours': NetworkLink.get_neighbours('IMGTSTA'),
+            'reversable': NetworkLink.reversable_data('IMGTSTA', 'IMGTSTB'),
+            'lines': NetworkLink.get_all_lines('IMGTSTA', 'IMGTSTB'),
+            'unnamed': NetworkLink.get_all_lines('IMGTSTB', 'IMGTSTD'),
+            'weight': EdgeWeight.weight_of('IMGTSTA', 'IMGTSTB'),
+            'provenance': EdgeWeight.provenance_of('IMGTSTA', 'IMGTSTB'),
+            'location': LocationRecord.return_instance('IMGTSTB').as_dict,
+            'distance': NetworkLink.distance('IMGTSTA', 'IMGTSTB'),
+        }
+        with pytest.warns(RuntimeWarning, match='1 TIPLOC pairs'):
+            expected['planar_ratio'] = EdgeWeight.planar_ratio()
+
+        LocationRecord._instances.clear()
+        NetworkLink._instances.clear()
+        EdgeWeight._instances.clear()
+        NI.attach(NI.NetworkImage(image_file))
+
+        assert NetworkLink.get_neighbours('IMGTSTA') == ['IMGTSTC', 'IMGTSTB']
+        assert NetworkLink.get_neighbours('IMGTSTA') == expected['neighbours']
+        assert NetworkLink.reversable_data('IMGTSTA', 'IMGTSTB') == expected['reversable']
+        assert NetworkLink.reversable_data('IMGTSTB', 'IMGTSTA') is None
+        assert NetworkLink.get_all_lines('IMGTSTA', 'IMGTSTB') == ['ML', 'SL']
+        assert NetworkLink.get_all_lines('IMGTSTA', 'IMGTSTB') == expected['lines']
+        assert NetworkLink.get_all_lines('IMGTSTB', 'IMGTSTD') == expected['unnamed']
+        assert NetworkLink.is_valid_tiploc('IMGTSTA')
+        assert not NetworkLink.is_valid_tiploc('NOWHERE')
+        assert EdgeWeight.weight_of('IMGTSTA', 'IMGTSTB') == expected['weight']
+        assert EdgeWeight.provenance_of('IMGTSTA', 'IMGTSTB') == expected['provenance']
+        assert LocationRecord.return_instance('IMGTSTB').as_dict == expected['location']
+        assert LocationRecord.return_instance('NOWHERE') is None
+        assert LocationRecord.match_locations('Image C')[0].location_code == 'IMGTSTC'
+        assert sorted(loc.location_code for loc in LocationRecord.locations()) == [
+            'IMGTSTA', 'IMGTSTB', 'IMGTSTC', 'IMGTSTD'
+        ]
+        assert NetworkLink.distance('IMGTSTA', 'IMGTSTB') == expected['distance'] == 8000
+        assert NetworkLink.distance('IMGTSTB', 'IMGTSTA') is None
+        # IMGTSTC to IMGTSTB, 3000m over 4500m in a straight line, is skipped
+        with pytest.warns(RuntimeWarning, match='1 TIPLOC pairs'):
+            assert EdgeWeight.planar_ratio() == pytest.approx(expected['planar_ratio'])
+        assert expected['planar_ratio'] == 1.0
+        assert not LocationRecord._instances
+
+    def test_unsupported(self, image_file):
+        NI.attach(NI.NetworkImage(image_file))
+
+        with pytest.raises(NotInNetworkImage):
+            NetworkLink.get_link('IMGTSTA', 'IMGTSTB')
+        with pytest.raises(NotInNetworkImage):
+            NetworkLink.get_neighbours('IMGTSTA', alt=True)
+        with pytest.raises(NotInNetworkImage):
+            NetworkLink.return_instance('IMGTSTA')
+        with pytest.raises(NotInNetworkImage):
+            NetworkLink.get_origins('IMGTSTB')
+
+    def test_pathfinder(self, image_file):
+        expected = route('IMGTSTA', 'IMGTSTD')
+
+        NI.attach(NI.NetworkImage(image_file))
+        assert route('IMGTSTA', 'IMGTSTD') == expected
+
+    def test_workers(self, image_file):
+        expected = route('IMGTSTA', 'IMGTSTD')
+
+        LocationRecord._instances.clear()
+        NetworkLink._instances.clear()
+        EdgeWeight._instances.clear()
+        NetworkLink.clear_cache()
+
+        with ProcessPoolExecutor(2, initializer=NI.worker_init, initargs=(image_file,)) as pool:
+            results = list(pool.map(route, ['IMGTSTA'] * 4, ['IMGTSTD'] * 4))
+
+        assert results == [expected] * 4
+
+    def test_open_image(self, image_file, tmp_path):
+        source = tmp_path / 'BPLAN'
+        source.write_text('foo')
+        assert NI.open_image(image_file, [str(source)]) is None
+        assert NI.open_image(image_file) is not None
+        assert NI.open_image(str(tmp_path / 'missing.img')) is None
+
+        with open(image_file, 'wb') as file:
+            file.write(b'rubbish')
+        assert NI.open_image(image_file) is None
+        with pytest.raises(BadNetworkImage):
+            NI.NetworkImage(image_file)
@@ -0,0 +1,129 @@
+"""Unit tests for parallel_import"""
+import sys
+sys.path.insert(0, './vstp')  # nopep8
+import gzip
+import json
+import pytest
+import parallel_import as PI
+import bplan_import as f_import
+from network_links import NetworkLink
+from location_record import LocationRecord
+from edge_weights import EdgeWeight
+
+PARTS = ['bplan_location.raw', 'bplan_nwk.raw', 'bplan_tlk.raw', 'bplan_tld.raw']
+
+
+@pytest.fixture
+def bplan(tmp_path):
+    f_name = tmp_path / 'BPLAN'
+    with open(f_name, 'w', encoding='utf-8') as file:
+        for part in PARTS:
+            with open(f'./tests/files/{part}', 'r', encoding='utf-8') as part_file:
+                file.write(part_file.read())
+    return str(f_name)
+
+
+@pytest.fixture
+def registries(monkeypatch):
+    monkeypatch.setattr(NetworkLink, '_instances', {})
+    monkeypatch.setattr(LocationRecord, '_instances', {})
+    monkeypatch.setattr(EdgeWeight, '_instances', {})
+
+
+def network_state() -> tuple:
+    return (
+        {code: obj.as_dict for code, obj in LocationRecord._instances.items()},
+        {
+            origin: {dest: [lnk.as_dict for lnk in lnks] for dest, lnks in dests.items()}
+            for origin, dests in NetworkLink._instances.items()
+        },
+        {
+            origin: {dest: (obj.weight, obj.provenance) for dest, obj in dests.items()}
+            for origin, dests in EdgeWeight._instances.items()
+        }
+    )
+
+
+class TestParallelImport:
+    def test_chunk_ranges(self, bplan):
+        ranges = PI.chunk_ranges(bplan, 1000)
+        assert len(ranges) > 1
+        assert ranges[0][0] == 0
+        with open(bplan, 'rb') as file:
+            content = file.read()
+        assert ranges[-1][1] == len(content)
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            assert end == start
+            assert content[end - 1:end] == b'\n'
+
+    def test_matches_sequential(self, bplan, registries):
+        f_import.import_bplan(bplan, ('LOC', 'NWK'))
+        expected = network_state()
+
+        LocationRecord._instances.clear()
+        NetworkLink._instances.clear()
+        EdgeWeight._instances.clear()
+
+        report = PI.import_parallel([bplan], ('LOC', 'NWK'), workers=2, chunk_size=1000)
+
+        assert network_state() == expected
+        assert report['chunks'] > 1
+        assert report['counts'] == {'LOC': 50, 'NWK': 33}
+        assert set(report['timings']) == {'parse', 'merge', 'edge_weights'}
+        assert 'LOC: 50 records' in PI.format_report(report)
+
+        # The BUS links are rejected, and counted, rather than silently dropped
+        metrics = report['metrics']
+        assert metrics['records']['NWK'] == {'read': 50, 'accepted': 33, 'rejected': 17}
+        assert metrics['records']['LOC'] == {'read': 50, 'accepted': 50, 'rejected': 0}
+        assert metrics['stages']['parse']['rows'] == 100
+        assert metrics['stages']['parse']['rows_per_second'] > 0
+        assert metrics['peak_memory_kb'] > 0
+        assert 'NWK: 50 read, 33 accepted, 17 rejected' in PI.format_report(report)
+
+    def test_reject_file(self, bplan, registries, tmp_path):
+        with open(bplan, 'a', encoding='utf-8') as file:
+            file.write('LOC\tA\tSHORT\n')
+        reject_file = tmp_path / 'rejects.jsonl'
+
+        report = PI.import_parallel([bplan], ('LOC', 'NWK'), workers=1, reject_file=str(reject_file))
+
+        rejects = [json.loads(line) for line in reject_file.read_text().splitlines()]
+        assert len(rejects) == 18
+        assert rejects[-1] == {
+            'record_type': 'LOC',
+            'reason': 'expected 13 fields, found 3',
+            'record': 'LOC\tA\tSHORT'
+        }
+        assert {reject['reason'] for reject in rejects[:-1]} == {PI.FILTERED['NWK']}
+        assert report['metrics']['records']['LOC']['rejected'] == 1
+
+    def test_reject_file_kept(self, bplan, registries, tmp_path):
+        """A later import in the process adds to the rejects, as ensure_loaded
+        importing PLT and ACT after LOC and NWK"""
+        reject_file = tmp_path / 'rejects.jsonl'
+        reject_file.write_text('{"left": "by an earlier run"}\n', encoding='utf-8')
+
+        PI.import_parallel([bplan], ('LOC', 'NWK'), workers=1, reject_file=str(reject_file))
+        with open(bplan, 'a', encoding='utf-8') as file:
+            file.write('TLK\tA\tSHORT\n')
+        PI.import_parallel([bplan], ('TLK',), workers=1, reject_file=str(reject_file))
+
+        rejects = [json.loads(line) for line in reject_file.read_text().splitlines()]
+        assert [reject['record_type'] for reject in rejects[:18]] == ['NWK'] * 17 + ['TLK']
+        assert rejects[-1]['record'] == 'TLK\tA\tSHORT'
+
+    def test_compressed(self, bplan, registries, tmp_path):
+        f_name = str(tmp_path / 'BPLAN.gz')
+        with open(bplan, 'rb') as source, gzip.open(f_name, 'wb') as target:
+            target.write(source.read())
+
+        report = PI.import_parallel([f_name], ('LOC', 'NWK'), workers=2, chunk_size=1000)
+
+        assert report['chunks'] == 1
+        assert LocationRecord.return_instance('WANBRO').wgs_coordinates
+        assert 'FLKLNDS' in NetworkLink._instances['FLKLJN']
+
+    def test_missing(self, tmp_path):
+        with pytest.raises(PI.MissingPartFile):
+            PI.import_parallel([str(tmp_path / 'LOC')], ('LOC',))
@@ -2,8 +2,11 @@
 import sys
 sys.path.insert(0, './vstp')  # nopep8
 import pytest
-from pathfinder import Node, Pathfinder
+from pathfinder import Node, Pathfinder, PLANAR
 from err import BadAvoidList, BadViaList, BadTiplocError
+from network_links import NetworkLink
+from location_record import LocationRecord
+from edge_weights import EdgeWeight
 
 
 class DummyRecord:
@@ -11,6 +14,34 @@ class DummyRecord:
         self.wgs_coordinates = (53.08566483961731, -2.2448107258158285)
 
 
+@pytest.fixture
+def network(monkeypatch):
+    monkeypatch.setattr(NetworkLink, '_instances', {})
+    monkeypatch.setattr(LocationRecord, '_instances', {})
+    monkeypatch.setattr(EdgeWeight, '_instances', {})
+
+    for tiploc, east, north in [
+        ('PFTSTA', 400000, 300000),
+        ('PFTSTB', 405000, 305000),
+        ('PFTSTC', 405000, 300500),
+        ('PFTSTD', 410000, 300000)
+    ]:
+        record = f'LOC\tA\t{tiploc}\t{tiploc}\t\t\t{east}\t{north}\tM\t5\t\tN\t'
+        LocationRecord(*record.split('\t'))
+
+    for origin, destination, distance in [
+        ('PFTSTA', 'PFTSTB', '08000'),
+        ('PFTSTA', 'PFTSTC', '05100'),
+        ('PFTSTB', 'PFTSTD', '08000'),
+        ('PFTSTC', 'PFTSTD', '05100'),
+        ('PFTSTD', 'PFTSTA', '10000')
+    ]:
+        record = f'NWK\tA\t{origin}\t{destination}\tML\t\t\t\tD\tD\t{distance}\tN\tN\tN\t5\tN\t\t0\t0'
+        NetworkLink(*record.split('\t')).append_to_instance()
+
+    EdgeWeight.build()
+
+
 class TestNode:
     def test_init(self):
         node = Node('foo')
@@ -63,6 +94,27 @@ class TestPathfinder:
         with pytest.raises(BadTiplocError):
             Pathfinder.validate_tiploc('BADTPL')
 
+    def test_planar_search(self, network):
+        path = Pathfinder('PFTSTA', 'PFTSTD', heuristic=PLANAR)
+        path.search(std_out=False)
+        assert path.route_locations == ['PFTSTA', 'PFTSTC', 'PFTSTD']
+
+    def test_planar_outliers(self, network):
+        # A detour far shorter by weight than its straight line distances, an
+        # outlier that does not weaken the heuristic for every other search
+        LocationRecord(*'LOC\tA\tPFTSTE\tPFTSTE\t\t\t400000\t310000\tM\t5\t\tN\t'.split('\t'))
+        for origin, destination, distance in [('PFTSTA', 'PFTSTE', '02000'), ('PFTSTE', 'PFTSTD', '01000')]:
+            record = f'NWK\tA\t{origin}\t{destination}\tML\t\t\t\tD\tD\t{distance}\tN\tN\tN\t5\tN\t\t0\t0'
+            NetworkLink(*record.split('\t')).append_to_instance()
+        NetworkLink.clear_cache()
+        EdgeWeight.build()
+
+        with pytest.warns(RuntimeWarning, match='2 TIPLOC pairs'):
+            path = Pathfinder('PFTSTA', 'PFTSTD', heuristic=PLANAR)
+        assert path.planar_ratio == 1.0
+        path.search(std_out=False)
+        assert path.route_locations == ['PFTSTA', 'PFTSTC', 'PFTSTD']
+
     @pytest.mark.xfail
     def test_search(self):
         # FOR INTEGRATION TESTING
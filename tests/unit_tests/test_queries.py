@@ -0,0 +1,76 @@
+"""Unit tests for queries"""
+
+# pylint: disable=C0301, E0401, C0413, W0621
+
+import sys
+sys.path.insert(0, './vstp/models') # nopep8
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlmodel import Session, select
+import fast_validate as FV
+import queries as Q
+
+MODELS = [Q.Location, Q.NetworkLink, Q.TimingLink]
+
+
+@pytest.fixture
+def engine():
+    """A database loaded with the LOC, NWK and TLK test records"""
+    engine = create_engine('sqlite://')
+    Q.create_schema(engine, MODELS)
+    FV.load_bplan(engine, Q.Location, './tests/files/bplan_location.raw')
+    FV.load_bplan(engine, Q.NetworkLink, './tests/files/bplan_nwk.raw')
+    FV.load_bplan(engine, Q.TimingLink, './tests/files/bplan_tlk.raw')
+    return engine
+
+
+def index_names(engine, table: str) -> set:
+    return {index['name'] for index in inspect(engine).get_indexes(table)}
+
+
+class TestQueries:
+    """Tests for the schema and lookups"""
+
+    def test_create_schema(self):
+        """Indexes are added to tables created before they were declared"""
+        engine = create_engine('sqlite://')
+        Q.create_schema(engine, MODELS)
+        with engine.begin() as connection:
+            connection.exec_driver_sql('DROP INDEX ix_networklink_origin_destination_line')
+        assert 'ix_networklink_origin_destination_line' not in index_names(engine, 'networklink')
+
+        names = Q.create_schema(engine, MODELS)
+
+        assert 'ix_networklink_origin_destination_line' in index_names(engine, 'networklink')
+        assert 'ix_location_tiploc' in names
+        assert 'ix_timinglink_origin_destination_line_code' in names
+
+    def test_index_used(self, engine):
+        with Session(engine) as session:
+            plans = [
+                Q.query_plan(session, select(Q.Location).where(Q.Location.tiploc == 'WANBRO')),
+                Q.query_plan(session, select(Q.NetworkLink).where(
+                    Q.NetworkLink.origin == 'FLKLJN', Q.NetworkLink.destination == 'FLKLNDS')),
+                Q.query_plan(session, select(Q.TimingLink).where(Q.TimingLink.origin == 'FLKLJN')),
+            ]
+        for plan in plans:
+            assert 'USING INDEX' in plan
+            assert 'SCAN' not in plan.replace('SEARCH', '')
+
+    def test_lookups(self, engine):
+        with Session(engine) as session:
+            location = Q.location_by_tiploc(session, 'WANBRO')
+            assert location.tiploc == 'WANBRO'
+            assert Q.location_by_tiploc(session, 'NOSUCH') is None
+
+            found = Q.locations_by_tiploc(session, ['WANBRO', 'NOSUCH', 'WANBRO'])
+            assert list(found) == ['WANBRO']
+
+            links = Q.network_links(session, 'FLKLJN')
+            assert [link.destination for link in links] == ['FLKLNDS']
+            assert Q.network_links(session, 'FLKLJN', 'FLKLNDS', 'XX') == []
+            assert links[0] in Q.network_links_to(session, 'FLKLNDS')
+
+            tlk = Q.timing_links(session, 'STAFFRD', 'STAFTVJ')
+            assert tlk
+            assert all((link.origin, link.destination) == ('STAFFRD', 'STAFTVJ') for link in tlk)
@@ -0,0 +1,109 @@
+"""Unit tests for reconcile"""
+
+# pylint: disable=C0301, E0401, C0413, W0621
+
+import sys
+sys.path.insert(0, './vstp/models') # nopep8
+import pytest
+from sqlalchemy import create_engine
+from sqlmodel import Session
+import fast_validate as FV
+import queries as Q
+import reconcile as R
+from naptan import NAPTANCoordinates
+from foi_coordinates import FOICoordinates
+
+
+@pytest.fixture
+def engine():
+    """A database loaded with the LOC test records"""
+    engine = create_engine('sqlite://')
+    Q.create_schema(engine, [Q.Location])
+    FV.load_bplan(engine, Q.Location, './tests/files/bplan_location.raw')
+    return engine
+
+
+def coordinates(engine, *tiplocs) -> dict:
+    with Session(engine) as session:
+        found = Q.locations_by_tiploc(session, tiplocs)
+        return {tiploc: (loc.easting, loc.northing) for tiploc, loc in found.items()}
+
+
+class TestReconcile:
+    """Tests for the reconciliation of reference coordinates"""
+
+    def test_replace(self, engine):
+        rows = [
+            NAPTANCoordinates.csv_factory('WANBRO,493100,150300\n'),
+            NAPTANCoordinates.csv_factory('DONCSJJ,456430,402340\n'),
+            NAPTANCoordinates.csv_factory('GLGH141,259000,665000\n'),
+            NAPTANCoordinates.csv_factory('NOSUCH,100000,100000\n'),
+            None,
+        ]
+
+        report = R.reconcile(engine, rows, R.replace)
+
+        assert report['source_rows'] == 4
+        assert (report['matched'], report['unmatched']) == (3, 1)
+        assert (report['updated'], report['unchanged'], report['inserted']) == (2, 1, 0)
+        assert (report['easting_changed'], report['northing_changed']) == (2, 2)
+        assert report['max_move'] == 50
+        assert report['largest'][0][0] == 'DONCSJJ'
+        assert coordinates(engine, 'WANBRO', 'DONCSJJ', 'GLGH141', 'NOSUCH') == {
+            'WANBRO': ('493100', '150300'),
+            'DONCSJJ': ('456430', '402340'),
+            'GLGH141': ('259000', '665000'),
+        }
+        assert 'DONCSJJ' in R.format_report(report)
+
+    def test_fill(self, engine):
+        rows = [
+            FOICoordinates.csv_factory('DONCSJJ,St. James Jn.,456430,402340\n'),
+            FOICoordinates.csv_factory('VICT16,Victoria Platform 16,528900,178900\n'),
+            FOICoordinates.csv_factory('NEWTIP,New Place,300000,400000\n'),
+        ]
+
+        report = R.reconcile(engine, rows, R.fill, insert_unmatched=True)
+
+        assert (report['updated'], report['unchanged'], report['inserted']) == (1, 1, 1)
+        assert report['max_move'] is None
+        assert coordinates(engine, 'DONCSJJ', 'VICT16', 'NEWTIP') == {
+            'DONCSJJ': ('456400', '402300'),
+            'VICT16': ('528900', '178900'),
+            'NEWTIP': ('300000', '400000'),
+        }
+        with Session(engine) as session:
+            new = Q.location_by_tiploc(session, 'NEWTIP')
+            assert (new.name, new.tp_type, new.zone, new.off_network) == ('New Place', 'O', '0', 'N')
+
+    def test_duplicate_tiploc(self, engine):
+        """Rows for a TIPLOC apply in order: fill keeps the first, replace the
+        last"""
+        rows = [
+            FOICoordinates.csv_factory('GLGH141,High Street Sig 141,259000,665000\n'),
+            FOICoordinates.csv_factory('GLGH141,High Street Sig 141,259100,665100\n'),
+            FOICoordinates.csv_factory('NEWTIP,New Place,300000,400000\n'),
+            FOICoordinates.csv_factory('NEWTIP,Newer Place,300100,400100\n'),
+        ]
+
+        report = R.reconcile(engine, rows, R.fill, insert_unmatched=True)
+
+        assert (report['source_rows'], report['updated'], report['inserted']) == (2, 1, 1)
+        assert coordinates(engine, 'GLGH141', 'NEWTIP') == {
+            'GLGH141': ('259000', '665000'),
+            'NEWTIP': ('300000', '400000'),
+        }
+        with Session(engine) as session:
+            assert Q.location_by_tiploc(session, 'NEWTIP').name == 'New Place'
+
+        R.reconcile(engine, [
+            NAPTANCoordinates.csv_factory('WANBRO,493000,150000\n'),
+            NAPTANCoordinates.csv_factory('WANBRO,493200,150200\n'),
+        ], R.replace)
+
+        assert coordinates(engine, 'WANBRO') == {'WANBRO': ('493200', '150200')}
+
+    def test_nothing_to_do(self, engine):
+        report = R.reconcile(engine, [])
+        assert (report['matched'], report['updated']) == (0, 0)
+        R.reconcile(engine, [])  # the temporary table is dropped
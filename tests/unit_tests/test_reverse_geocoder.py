@@ -0,0 +1,134 @@
+"""Unit tests for reverse_geocoder"""
+import json
+import sys
+sys.path.insert(0, './vstp')  # nopep8
+import pytest
+from bng_latlon import OSGB36toWGS84
+import reverse_geocoder as GC
+from location_record import LocationRecord
+
+LOC = [
+    'LOC\tA\tWANBRO\tWanborough\t\t\t493100\t150300\tO\t3\t87016\tN\t',
+    'LOC\tA\tDONCSJJ\tSt. James Jn.\t\t\t456400\t402300\tO\t7\t23444\tN\t',
+    'LOC\tA\tDUNKELD\tDunkeld & Birnam\t\t\t302658\t754245\tO\t9\t06412\tN\t',
+    'LOC\tA\tNOCOORD\tNo Coordinates\t\t\t999999\t999999\tO\t7\t00000\tN\t',
+]
+
+
+class Counting(GC.Geocoder):
+    """A backend that records the points passed to it"""
+
+    name = 'counting'
+
+    def __init__(self):
+        self.batches = []
+
+    def reverse(self, point):
+        return self.reverse_many([point])[point]
+
+    def reverse_many(self, points):
+        self.batches.append(list(points))
+        return {point: {'postal': f'{point[0]:.1f}'} for point in self.batches[-1]}
+
+
+@pytest.fixture
+def locations(monkeypatch):
+    monkeypatch.setattr(LocationRecord, '_instances', {})
+    monkeypatch.setattr(LocationRecord, '_search', None)
+    for record in LOC:
+        LocationRecord(*record.split('\t'))
+
+
+@pytest.fixture
+def naptan(tmp_path):
+    f_name = tmp_path / '9100.csv'
+    f_name.write_text('WANBRO,493200,150400\nGUILDFD,499400,150000\nbad,line\n', encoding='utf-8')
+    return str(f_name)
+
+
+class TestLocalGeocoder:
+    """Tests for the NaPTAN and LOC backend"""
+
+    def test_from_sources(self, locations, naptan):
+        coder = GC.LocalGeocoder.from_sources(naptan_file=naptan)
+
+        assert coder.places == {
+            'WANBRO': ('Wanborough', 493200, 150400, 'NAPTAN'),
+            'DONCSJJ': ('St. James Jn.', 456400, 402300, 'LOC'),
+            'DUNKELD': ('Dunkeld & Birnam', 302658, 754245, 'LOC'),
+            'GUILDFD': ('GUILDFD', 499400, 150000, 'NAPTAN'),
+        }
+
+    def test_reverse(self, locations, naptan):
+        coder = GC.LocalGeocoder.from_sources(naptan_file=naptan, k=2)
+
+        result = coder.reverse(OSGB36toWGS84(493250, 150400))
+
+        assert [place['tiploc'] for place in result['places']] == ['WANBRO', 'GUILDFD']
+        assert 48 <= result['places'][0]['distance'] <= 52
+        assert result['places'][0]['source'] == 'NAPTAN'
+        assert GC.describe(result).startswith('Wanborough (WANBRO)')
+
+    def test_north(self, locations, naptan):
+        coder = GC.LocalGeocoder.from_sources(naptan_file=naptan, k=1)
+
+        result = coder.reverse(OSGB36toWGS84(302700, 754300))
+
+        assert result['places'][0]['tiploc'] == 'DUNKELD'
+        assert result['places'][0]['source'] == 'LOC'
+
+    def test_empty(self, tmp_path):
+        coder = GC.LocalGeocoder.from_sources([], naptan_file=str(tmp_path / 'none.csv'))
+        assert coder.reverse((51.5, -0.1)) is None
+        assert GC.describe(None) == 'unknown'
+
+    def test_name_follows_data(self, locations, naptan):
+        before = GC.LocalGeocoder.from_sources(naptan_file=naptan).name
+        LocationRecord(*LOC[1].replace('456400', '456500').split('\t'))
+        assert GC.LocalGeocoder.from_sources(naptan_file=naptan).name != before
+
+    def test_abstract(self):
+        """A backend must implement reverse"""
+        with pytest.raises(TypeError):
+            GC.Geocoder()
+
+
+class TestCachedGeocoder:
+    """Tests for the persistent cache and batching"""
+
+    def test_batch(self, tmp_path):
+        backend = Counting()
+        coder = GC.CachedGeocoder(backend, str(tmp_path / 'geocode.json'))
+        points = [(51.1, -0.1), (52.2, -1.2), (51.1, -0.1)]
+
+        results = coder.reverse_many(points)
+
+        assert backend.batches == [[(51.1, -0.1), (52.2, -1.2)]]
+        assert results == {(51.1, -0.1): {'postal': '51.1'}, (52.2, -1.2): {'postal': '52.2'}}
+
+        coder.reverse_many(points + [(53.3, -2.3)])
+        assert backend.batches[1:] == [[(53.3, -2.3)]]
+
+    def test_persistent(self, tmp_path):
+        f_name = tmp_path / 'geocode.json'
+        GC.CachedGeocoder(Counting(), str(f_name)).reverse_many([(51.1, -0.1)])
+        assert json.loads(f_name.read_text(encoding='utf-8')) == {
+            'counting:51.10000,-0.10000': {'postal': '51.1'}
+        }
+
+        backend = Counting()
+        coder = GC.CachedGeocoder(backend, str(f_name))
+        assert coder.reverse((51.1, -0.1)) == {'postal': '51.1'}
+        assert backend.batches == []
+
+    def test_get_geocoder(self, naptan, tmp_path):
+        coder = GC.get_geocoder(
+            'local', str(tmp_path / 'geocode.json'),
+            locations=[('DONCSJJ', 'St. James Jn.', '456400', '402300'), ('NONE', 'None', None, None)],
+            naptan_file=naptan
+        )
+
+        result = coder.reverse(OSGB36toWGS84(456400, 402300))
+
+        assert result['places'][0]['tiploc'] == 'DONCSJJ'
+        assert isinstance(GC.get_geocoder('osm', None).backend, GC.OSMGeocoder)
@@ -0,0 +1,105 @@
+"""Unit tests for smart and smart_reader"""
+
+# pylint: disable=C0301, E0401, C0413, W0621
+
+import json
+import sys
+sys.path.insert(0, './vstp/models') # nopep8
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlmodel import Session, select
+import smart as SM
+import smart_reader as SR
+
+RECORDS = [
+    {
+        'TD': 'AW', 'FROMBERTH': '0251', 'TOBERTH': '0253', 'FROMLINE': '', 'TOLINE': 'M',
+        'BERTHOFFSET': '+14', 'PLATFORM': '', 'EVENT': 'A', 'ROUTE': '', 'STANOX': '87016',
+        'STANME': 'WANBRO', 'STEPTYPE': 'B', 'COMMENT': ''
+    },
+    {
+        'TD': 'AW', 'FROMBERTH': '0253', 'TOBERTH': '0255', 'FROMLINE': 'M', 'TOLINE': 'M',
+        'BERTHOFFSET': '-3', 'PLATFORM': '2', 'EVENT': 'D', 'ROUTE': '', 'STANOX': '87016',
+        'STANME': 'WANBRO', 'STEPTYPE': 'B', 'COMMENT': 'Platform 2 [a, b] "quoted"'
+    },
+    {
+        'TD': 'D3', 'FROMBERTH': '0251', 'TOBERTH': '0253', 'FROMLINE': '', 'TOLINE': '',
+        'BERTHOFFSET': '0', 'PLATFORM': ' ', 'EVENT': 'B', 'ROUTE': '', 'STANOX': '23444',
+        'STANME': 'DONCSJJ', 'STEPTYPE': 'F', 'COMMENT': ''
+    },
+    {
+        'TD': 'D3', 'FROMBERTH': 'A001', 'TOBERTH': '', 'FROMLINE': '', 'TOLINE': '',
+        'BERTHOFFSET': '', 'PLATFORM': '', 'EVENT': 'C', 'ROUTE': '', 'STANOX': '23444',
+        'STANME': 'DONCSJJ', 'STEPTYPE': 'C', 'COMMENT': ''
+    },
+]
+
+
+@pytest.fixture(params=['compact', 'indented'])
+def extract(request, tmp_path):
+    f_name = tmp_path / 'SMARTExtract.json'
+    indent = 2 if request.param == 'indented' else None
+    f_name.write_text(json.dumps({'BERTHDATA': RECORDS}, indent=indent), encoding='utf-8')
+    return str(f_name)
+
+
+class TestSmartReader:
+    """Tests for streaming and indexing the SMART extract"""
+
+    @pytest.mark.parametrize('chunk_size', [1, 7, 64, 1 << 20])
+    def test_read_berth_data(self, extract, chunk_size):
+        assert list(SR.read_berth_data(extract, chunk_size)) == RECORDS
+
+    def test_no_berth_data(self, tmp_path):
+        f_name = tmp_path / 'bad.json'
+        f_name.write_text('{"OTHER": []}', encoding='utf-8')
+        with pytest.raises(ValueError):
+            list(SR.read_berth_data(str(f_name)))
+
+    def test_truncated(self, tmp_path):
+        f_name = tmp_path / 'truncated.json'
+        f_name.write_text(json.dumps({'BERTHDATA': RECORDS})[:-40], encoding='utf-8')
+        with pytest.raises(json.JSONDecodeError):
+            list(SR.read_berth_data(str(f_name), 16))
+
+    def test_step(self):
+        step = SR.SmartStep.from_record(RECORDS[2])
+        assert step.td == 'D3'
+        assert step.berth_offset == '0'
+        assert step.platform is None
+        assert step.stanme == 'DONCSJJ'
+        assert step.step_type == 'F'
+
+    def test_index(self, extract):
+        index = SR.SmartIndex.from_file(extract, 16)
+
+        assert len(index) == 4
+        assert [step.to_berth for step in index.at_stanox('87016')] == ['0253', '0255']
+        assert len(index.in_td('D3')) == 2
+        assert {step.td for step in index.step('0251', '0253')} == {'AW', 'D3'}
+        assert [step.stanox for step in index.step('0251', '0253', td='D3')] == ['23444']
+        assert index.step('0251', '9999') == []
+        assert index.at_stanox('00000') == []
+
+
+class TestLoadSmart:
+    """Tests for loading the SMART extract"""
+
+    def test_load_smart(self, extract):
+        engine = create_engine('sqlite://')
+        SM.create_schema(engine, [SM.Smart])
+
+        report = SM.load_smart(engine, extract, 16)
+
+        assert report['rows'] == 3
+        assert report['skipped'] == 1  # No berth offset
+        with Session(engine) as session:
+            rows = session.exec(select(SM.Smart).order_by(SM.Smart.id)).all()
+        assert [(row.td, row.from_berth, row.to_berth) for row in rows] == [
+            ('AW', '0251', '0253'), ('AW', '0253', '0255'), ('D3', '0251', '0253')
+        ]
+        assert rows[1].comment == 'Platform 2 [a, b] "quoted"'
+        assert rows[0].stanme == 'WANBRO'
+        assert {index['name'] for index in inspect(engine).get_indexes('smart')} == {
+            'ix_smart_stanox', 'ix_smart_td', 'ix_smart_from_berth_to_berth'
+        }
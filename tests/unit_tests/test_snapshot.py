@@ -0,0 +1,110 @@
+"""Unit tests for snapshot"""
+import sys
+sys.path.insert(0, './vstp')  # nopep8
+import pytest
+import snapshot
+from network_links import NetworkLink
+from location_record import LocationRecord
+import edge_weights as EW
+from edge_weights import EdgeWeight
+from spatial_index import SpatialIndex
+
+LOC = [
+    'LOC\tA\tKIDSGRV\tKidsgrove\t\t\t383700\t354300\tM\t5\t43031\tN\t',
+    'LOC\tA\tALSAGER\tAlsager\t\t\t379800\t355100\tM\t5\t43030\tN\t',
+]
+NWK = [
+    'NWK\tA\tKIDSGRV\tALSAGER\tML\t\t01-01-1995 00:00:00\t\tD\tD\t03882\tN\tY\tN\t5\tN\t\t0\t0',
+    'NWK\tA\tALSAGER\tKIDSGRV\tML\t\t01-01-1995 00:00:00\t\tU\tU\t03882\tN\tY\tN\t5\tN\t\t0\t0',
+]
+
+
+@pytest.fixture
+def registries(monkeypatch):
+    monkeypatch.setattr(NetworkLink, '_instances', {})
+    monkeypatch.setattr(LocationRecord, '_instances', {})
+    monkeypatch.setattr(EdgeWeight, '_instances', {})
+    monkeypatch.setattr(LocationRecord, '_search', None)
+    monkeypatch.setattr(LocationRecord, '_version', 0)
+    monkeypatch.setattr(SpatialIndex, '_default', None)
+
+
+@pytest.fixture
+def source(tmp_path):
+    f_name = tmp_path / 'BPLAN'
+    f_name.write_text('\n'.join(LOC + NWK) + '\n')
+    return str(f_name)
+
+
+def load_network():
+    for record in LOC:
+        LocationRecord(*record.split('\t'))
+    for record in NWK:
+        NetworkLink(*record.split('\t')).append_to_instance()
+    LocationRecord.convert_coordinates()
+    EdgeWeight.build()
+
+
+class TestSnapshot:
+    def test_round_trip(self, registries, source, tmp_path):
+        load_network()
+        f_name = str(tmp_path / 'vstp.snap')
+        snapshot.save(f_name, [source])
+
+        LocationRecord._instances.clear()
+        NetworkLink._instances.clear()
+        EdgeWeight._instances.clear()
+
+        assert snapshot.load(f_name, [source])
+
+        loc = LocationRecord.return_instance('KIDSGRV')
+        assert loc.location_name == 'Kidsgrove'
+        assert loc.bng_coordinates == (383700, 354300)
+        assert loc.wgs_coordinates
+        link = NetworkLink.get_link('KIDSGRV', 'ALSAGER')[0]
+        assert link.running_line_code == 'ML'
+        assert link.initial_direction == 'D'
+        assert EdgeWeight.weight_of('KIDSGRV', 'ALSAGER') == 3882
+        assert EdgeWeight.provenance_of('KIDSGRV', 'ALSAGER') == EW.MEASURED
+
+    def test_replaces_loaded(self, registries, source, tmp_path):
+        load_network()
+        f_name = str(tmp_path / 'vstp.snap')
+        snapshot.save(f_name, [source])
+
+        # Records and cached results already held by the process
+        LocationRecord(*LOC[0].replace('KIDSGRV', 'CREWE').split('\t'))
+        LocationRecord.convert_coordinates()
+        assert len(NetworkLink.get_link('KIDSGRV', 'ALSAGER')) == 1
+        assert SpatialIndex.default().nearest(383700, 354300, k=3)
+        assert LocationRecord.match_locations('Kidsgrove')
+        version = LocationRecord._version
+
+        assert snapshot.load(f_name, [source])
+
+        assert LocationRecord.return_instance('CREWE') is None
+        assert LocationRecord._version != version
+        assert [tiploc for _, tiploc in SpatialIndex.default().nearest(383700, 354300, k=3)] == [
+            'KIDSGRV', 'ALSAGER'
+        ]
+        assert [loc.location_code for loc in LocationRecord.match_locations('Kidsgrove')] == ['KIDSGRV']
+        assert len(NetworkLink._instances['KIDSGRV']['ALSAGER']) == 1
+        assert NetworkLink.get_link('KIDSGRV', 'ALSAGER')[0] is NetworkLink._instances['KIDSGRV']['ALSAGER'][0]
+
+    def test_stale(self, registries, source, tmp_path):
+        load_network()
+        f_name = str(tmp_path / 'vstp.snap')
+        snapshot.save(f_name, [source])
+
+        with open(source, 'a') as file:
+            file.write(LOC[0] + '\n')
+
+        assert snapshot.read(f_name, [source]) is None
+        assert not snapshot.load(f_name, [source])
+
+    def test_missing_or_corrupt(self, source, tmp_path):
+        f_name = tmp_path / 'vstp.snap'
+        assert snapshot.read(str(f_name), [source]) is None
+
+        f_name.write_bytes(b'rubbish')
+        assert snapshot.read(str(f_name), [source]) is None
@@ -0,0 +1,77 @@
+"""Unit tests for spatial_index"""
+import sys
+sys.path.insert(0, './vstp')  # nopep8
+import random
+import pytest
+from spatial_index import SpatialIndex
+from location_record import LocationRecord
+
+
+@pytest.fixture
+def points():
+    rand = random.Random(42)
+    return {
+        f'TPL{index}': (rand.uniform(135263, 658013), rand.uniform(10866, 969710))
+        for index in range(2000)
+    }
+
+
+@pytest.fixture
+def index(points):
+    idx = SpatialIndex(cell_size=5000)
+    for key, point in points.items():
+        idx.insert(key, *point)
+    return idx
+
+
+def brute_force(points, easting, northing):
+    return sorted(
+        (((point[0] - easting) ** 2 + (point[1] - northing) ** 2) ** 0.5, key)
+        for key, point in points.items()
+    )
+
+
+class TestSpatialIndex:
+    def test_insert_remove(self, index, points):
+        assert len(index) == len(points)
+        index.remove('TPL0')
+        assert len(index) == len(points) - 1
+        index.remove('TPL0')
+        assert 'TPL0' not in index.within_bbox(0, 0, 999999, 999999)
+
+    def test_nearest(self, index, points):
+        for easting, northing in [(383700, 354300), (140000, 20000), (600000, 900000)]:
+            expected = brute_force(points, easting, northing)[:5]
+            assert index.nearest(easting, northing, k=5) == expected
+
+    def test_nearest_max_distance(self, index, points):
+        result = index.nearest(383700, 354300, k=50, max_distance=20000)
+        expected = [hit for hit in brute_force(points, 383700, 354300) if hit[0] <= 20000]
+        assert result == expected[:50]
+
+    def test_within_radius(self, index, points):
+        expected = [hit for hit in brute_force(points, 383700, 354300) if hit[0] <= 30000]
+        assert index.within_radius(383700, 354300, 30000) == expected
+
+    def test_within_bbox(self, index, points):
+        expected = sorted(
+            key for key, point in points.items()
+            if 300000 <= point[0] <= 400000 and 300000 <= point[1] <= 400000
+        )
+        assert sorted(index.within_bbox(300000, 300000, 400000, 400000)) == expected
+
+    def test_empty(self):
+        assert SpatialIndex().nearest(383700, 354300) == []
+
+    def test_from_locations(self):
+        record = 'LOC\tA\tKIDSGRV\tKidsgrove\t\t\t383700\t354300\tM\t5\t43031\tN\t'
+        location = LocationRecord(*record.split('\t'))
+        idx = SpatialIndex.from_locations([location])
+        assert idx.nearest(383000, 354000) == [(pytest.approx(761.58, 0.01), 'KIDSGRV')]
+
+    def test_parse_point(self):
+        assert SpatialIndex.parse_point('383700, 354300') == (383700, 354300)
+        easting, northing = SpatialIndex.parse_point('53.085665, -2.244811')
+        assert abs(easting - 383700) < 5
+        assert abs(northing - 354300) < 5
+        assert SpatialIndex.parse_point('foo') is None
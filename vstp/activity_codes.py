@@ -29,7 +29,6 @@ class ActivityCode(BaseModel):
         """ Import from a list of BPLAN entries """
 
         for entry in entries:
-            print(entry)
             if 'ACT' not in entry:
                 continue
 
@@ -0,0 +1,205 @@
+"""Cross-reference of TIPLOCs to the SMART berth steps at their STANOX
+
+LocationRecord holds each TIPLOC's STANOX, and the SMART extract the TD berth
+steps (with platform, lines and berth offset) reported at each STANOX. The
+cross-reference joins the two once, so a whole route can be annotated with
+its berth steps in a single pass of dict lookups.
+
+The SMART extract is large, so the cross-reference is cached in a binary
+file. It is keyed on a hash of the extract and a digest of the TIPLOC to
+STANOX mapping (however the LOC records were loaded), and is rebuilt once
+either changes.
+"""
+
+import hashlib
+import json
+import marshal
+import os
+import struct
+from typing import Iterable, List, NamedTuple, Union
+
+from location_record import LocationRecord
+from models.smart_reader import READ_CHUNK_SIZE, SMART_FILE, SmartIndex, SmartStep
+from snapshot import file_hash
+
+XREF_FILE = os.getenv("XREF_FILE", 'berths.xref')
+MAGIC = b'VSTPXREF'
+VERSION = 1
+HEADER = struct.Struct('<8sII')  # magic, version, length of the source key
+
+
+class RouteBerths(NamedTuple):
+    """The berth steps at a location on a route"""
+
+    tiploc: str
+    stanox: Union[str, None]
+    steps: tuple
+
+    @property
+    def platforms(self) -> set:
+        """Return the platforms the steps report"""
+
+        return {step.platform for step in self.steps if step.platform}
+
+    @property
+    def lines(self) -> set:
+        """Return the lines (from and to) the steps report"""
+
+        return {
+            line for step in self.steps
+            for line in (step.from_line, step.to_line) if line
+        }
+
+
+def stanox_codes(locations: Iterable = None) -> dict:
+    """Return the STANOX of each TIPLOC that has one"""
+
+    if locations is None:
+        locations = LocationRecord.locations()
+
+    codes = {}
+    for location in locations:
+        stanox = str(location.stanox_code or '').strip()
+        if stanox and stanox.strip('0'):
+            codes[location.location_code] = stanox
+
+    return codes
+
+
+def source_key(codes: dict, smart_file: str) -> str:
+    """Return the key identifying the TIPLOC to STANOX mapping and the SMART
+    extract"""
+
+    digest = hashlib.blake2b()
+    for tiploc in sorted(codes):
+        digest.update(f'{tiploc}\t{codes[tiploc]}\n'.encode('utf-8'))
+
+    return json.dumps({
+        'LOC': digest.hexdigest(),
+        os.path.basename(smart_file): file_hash(smart_file)
+    }, sort_keys=True)
+
+
+class BerthXref:
+    """TIPLOC to STANOX to SMART berth steps"""
+
+    _default = None
+
+    def __init__(self, codes: dict = None, steps: dict = None):
+        """Initialisation; codes maps a TIPLOC to its STANOX, steps a STANOX
+        to its berth steps"""
+
+        self.codes = codes or {}
+        self.steps = steps or {}
+
+    def __len__(self) -> int:
+        """Return the number of TIPLOCs with berth steps"""
+
+        return sum(1 for stanox in self.codes.values() if stanox in self.steps)
+
+    @classmethod
+    def build(cls, codes: dict, smart: SmartIndex) -> object:
+        """Join the TIPLOC STANOX codes to the SMART steps"""
+
+        steps = {}
+        for stanox in set(codes.values()):
+            stanox_steps = smart.at_stanox(stanox)
+            if stanox_steps:
+                steps[stanox] = tuple(stanox_steps)
+
+        return cls(codes, steps)
+
+    def save(self, f_name: str = XREF_FILE, key: str = '') -> None:
+        """Write the cross-reference to a binary cache file"""
+
+        key = key.encode('utf-8')
+        payload = marshal.dumps((
+            self.codes,
+            {stanox: [tuple(step) for step in steps] for stanox, steps in self.steps.items()}
+        ))
+
+        temp_name = f'{f_name}.tmp'
+        with open(temp_name, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, len(key)))
+            file.write(key)
+            file.write(payload)
+
+        os.replace(temp_name, f_name)
+
+    @classmethod
+    def read(cls, f_name: str = XREF_FILE, key: str = '') -> Union[object, None]:
+        """Return the cached cross-reference, or None if missing, stale or
+        unreadable"""
+
+        if not os.path.isfile(f_name):
+            return None
+
+        with open(f_name, 'rb') as file:
+            try:
+                magic, version, key_len = HEADER.unpack(file.read(HEADER.size))
+            except struct.error:
+                return None
+
+            if magic != MAGIC or version != VERSION:
+                return None
+
+            if file.read(key_len).decode('utf-8') != key:
+                return None
+
+            try:
+                codes, steps = marshal.loads(file.read())
+            except (EOFError, ValueError, TypeError):
+                return None
+
+        return cls(codes, {
+            stanox: tuple(SmartStep._make(step) for step in stanox_steps)
+            for stanox, stanox_steps in steps.items()
+        })
+
+    @classmethod
+    def load(
+            cls,
+            f_name: str = XREF_FILE,
+            smart_file: str = SMART_FILE,
+            locations: Iterable = None,
+            chunk_size: int = READ_CHUNK_SIZE) -> object:
+        """Return the cross-reference from the cache, building (and caching)
+        it where the cache is missing or stale"""
+
+        codes = stanox_codes(locations)
+        key = source_key(codes, smart_file)
+        xref = cls.read(f_name, key)
+        if xref is None:
+            xref = cls.build(codes, SmartIndex.from_file(smart_file, chunk_size))
+            xref.save(f_name, key)
+
+        return xref
+
+    @classmethod
+    def default(cls) -> object:
+        """Return the cross-reference for the loaded LOC records, loaded once"""
+
+        if cls._default is None:
+            cls._default = cls.load()
+
+        return cls._default
+
+    @classmethod
+    def reset(cls) -> None:
+        """Discard the cross-reference, it will be loaded when next needed"""
+
+        cls._default = None
+
+    def annotate(self, route: Iterable) -> List[RouteBerths]:
+        """Return the berth steps at each location of a route; the route may
+        be TIPLOCs or objects with a tiploc (e.g. schedule rows)"""
+
+        codes = self.codes
+        steps = self.steps
+        annotated = []
+        for item in route:
+            tiploc = getattr(item, 'tiploc', item)
+            stanox = codes.get(tiploc)
+            annotated.append(RouteBerths(tiploc, stanox, steps.get(stanox, ())))
+
+        return annotated
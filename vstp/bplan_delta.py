@@ -0,0 +1,226 @@
+"""Applies a BPLAN update file to the loaded registries, in place
+
+Each record carries an action code in its second field. A(dd) and C(hange)
+insert the record, or replace the one with the same natural key; D(elete)
+removes it. LOC records are keyed on TIPLOC, NWK records on (origin,
+destination, running line code). Only what the changes touch is updated
+downstream: the location search and spatial indexes, and the edge weights of
+the affected TIPLOC pairs. The registries are updated, not an attached
+network image.
+"""
+
+import time
+
+from location_record import LocationRecord
+from network_links import NetworkLink
+from edge_weights import EdgeWeight, TIMED
+from spatial_index import SpatialIndex
+from bplan_reader import read_bplan
+from parallel_import import FIELD_COUNTS
+from import_metrics import ImportMetrics, REJECT_FILE
+
+ADD = 'A'
+CHANGE = 'C'
+DELETE = 'D'
+ACTIONS = (ADD, CHANGE, DELETE)
+DELTA_TYPES = ('LOC', 'NWK')
+
+
+def record_action(record: list) -> str:
+    """Return the action code of a split record"""
+
+    if len(record) < 2:
+        return ''
+
+    return record[1].strip().upper()
+
+
+def apply_location(record: list, action: str, tiplocs: set) -> bool:
+    """Add, replace or delete a location; returns False for the delete of an
+    unknown TIPLOC"""
+
+    tiploc = record[2]
+    spatial = SpatialIndex._default
+
+    if action == DELETE:
+        if LocationRecord.unregister(tiploc) is None:
+            return False
+        if spatial is not None:
+            spatial.remove(tiploc)
+        tiplocs.add(tiploc)
+        return True
+
+    obj = LocationRecord(*record)  # Replaces any existing record, and search entry
+    LocationRecord.convert_coordinates([obj])
+
+    if spatial is not None:
+        bng = obj.bng_coordinates
+        if bng:
+            spatial.insert(tiploc, *bng)
+        else:
+            spatial.remove(tiploc)
+
+    tiplocs.add(tiploc)
+    return True
+
+
+def apply_network_link(record: list, action: str, pairs: set) -> bool:
+    """Add, replace or delete a network link, keeping its position among the
+    links of the pair; returns False for the delete of an unknown link"""
+
+    lnk = NetworkLink(*record)
+    origin, dest = lnk.origin_location, lnk.destination_location
+    links = NetworkLink._instances.get(origin, {}).get(dest, [])
+
+    position = None
+    for ind, existing in enumerate(links):
+        if existing.running_line_code == lnk.running_line_code:
+            position = ind
+            break
+
+    # A change to a BUS link takes it off the network, as a full import would
+    if action == DELETE or lnk.is_bus:
+        if position is None:
+            return action != DELETE
+        del links[position]
+        if not links:
+            del NetworkLink._instances[origin][dest]
+            if not NetworkLink._instances[origin]:
+                del NetworkLink._instances[origin]
+            NetworkLink._origins.get(dest, set()).discard(origin)
+    elif position is None:
+        lnk.append_to_instance()
+    else:
+        links[position] = lnk
+
+    pairs.add((origin, dest))
+    return True
+
+
+def update_edge_weights(pairs: set, tiplocs: set) -> int:
+    """Re-resolve the weights of the TIPLOC pairs changed, and of any pair
+    with a changed location at either end; returns the count re-resolved"""
+
+    if not EdgeWeight._instances:
+        return 0  # Not built yet, it will be from the updated links
+
+    # Only the links from and to each changed location
+    pairs = set(pairs)
+    for tiploc in tiplocs:
+        pairs.update((tiploc, dest) for dest in NetworkLink._instances.get(tiploc, {}))
+        pairs.update((origin, tiploc) for origin in NetworkLink.get_origins(tiploc))
+
+    for tiploc_a, tiploc_b in pairs:
+        existing = EdgeWeight._instances.get(tiploc_a, {}).get(tiploc_b, None)
+        links = NetworkLink._instances.get(tiploc_a, {}).get(tiploc_b, None)
+
+        if not links:
+            if existing:
+                del EdgeWeight._instances[tiploc_a][tiploc_b]
+                if not EdgeWeight._instances[tiploc_a]:
+                    del EdgeWeight._instances[tiploc_a]
+            continue
+
+        # TLK records are not held in memory, keep a previous estimate from them
+        timed = None
+        if existing and existing.provenance == TIMED:
+            timed = {(tiploc_a, tiploc_b): existing.weight}
+
+        EdgeWeight.resolve(tiploc_a, tiploc_b, links, timed)
+
+    return len(pairs)
+
+
+def apply_delta(
+        f_name: str,
+        record_types: tuple = DELTA_TYPES,
+        reject_file: str = REJECT_FILE) -> dict:
+    """Apply the LOC and NWK records of an update file (plain, gzip or zip),
+    in file order. Returns a count of the records applied by type and action,
+    those not found (deletes of an unknown key), ignored (an unknown action)
+    or rejected (malformed, written to reject_file if given), and the edge
+    weights re-resolved"""
+
+    started = time.perf_counter()
+    applied = {record_type: dict.fromkeys(ACTIONS, 0) for record_type in record_types}
+    not_found = {record_type: 0 for record_type in record_types}
+    ignored = {record_type: 0 for record_type in record_types}
+    metrics = ImportMetrics()
+    tiplocs = set()
+    pairs = set()
+
+    appliers = {
+        'LOC': lambda record, action: apply_location(record, action, tiplocs),
+        'NWK': lambda record, action: apply_network_link(record, action, pairs)
+    }
+
+    def consumer(record: list) -> None:
+        """Apply a record, by its action code; a malformed record is rejected
+        without changing the registries"""
+
+        record_type = record[0]
+        metrics.count_read(record_type)
+
+        expected = FIELD_COUNTS[record_type]
+        if len(record) != expected:
+            metrics.reject(record_type, f'expected {expected} fields, found {len(record)}', record)
+            return
+
+        action = record_action(record)
+        if action not in ACTIONS:
+            ignored[record_type] += 1
+            return
+
+        try:
+            found = appliers[record_type](record, action)
+        except (IndexError, TypeError, ValueError) as err:
+            metrics.reject(record_type, f'{type(err).__name__}: {err}'.splitlines()[0], record)
+            return
+
+        metrics.accept(record_type)
+        if found:
+            applied[record_type][action] += 1
+        else:
+            not_found[record_type] += 1
+
+    # Whatever was applied, the caches and weights are brought up to date
+    try:
+        read_bplan(f_name, {record_type: consumer for record_type in record_types})
+    finally:
+        if pairs:
+            NetworkLink.clear_cache()
+        edge_weights = update_edge_weights(pairs, tiplocs)
+
+    if reject_file:
+        metrics.write_rejects(reject_file)
+
+    return {
+        'applied': applied,
+        'not_found': not_found,
+        'ignored': ignored,
+        'rejected': {record_type: metrics.rejected.get(record_type, 0) for record_type in record_types},
+        'edge_weights': edge_weights,
+        'metrics': metrics.report(),
+        'seconds': time.perf_counter() - started
+    }
+
+
+def format_report(report: dict) -> str:
+    """Return the delta report as text, a line per record type"""
+
+    lines = []
+    for record_type, actions in report['applied'].items():
+        counts = ', '.join(f'{action}: {count}' for action, count in actions.items())
+        line = f'{record_type}: {counts}'
+        if report['not_found'][record_type]:
+            line += f", {report['not_found'][record_type]} not found"
+        if report['ignored'][record_type]:
+            line += f", {report['ignored'][record_type]} ignored"
+        if report['rejected'][record_type]:
+            line += f", {report['rejected'][record_type]} rejected"
+        lines.append(line)
+
+    lines.append(f"{report['edge_weights']} edge weights re-resolved")
+    lines.append(f"{report['seconds']:.2f}s")
+
+    return '\n'.join(lines)
@@ -1,13 +1,28 @@
 """Functions for importing needed files"""
 
 import os
+from itertools import islice
+from typing import Callable, Iterable, Iterator
 from location_record import LocationRecord
 from network_links import NetworkLink
-from timing_links import TimingLink
 from line_platform import LinePlatform
 from activity_codes import ActivityCode
+from edge_weights import EdgeWeight
+from bplan_reader import read_bplan
+import snapshot
+import network_image
+import parallel_import
+import db_import
+from import_metrics import ImportMetrics, REJECT_FILE
 from err import MissingPartFile
 
+BPLAN_FILE = os.getenv("BPLAN_FILE", 'BPLAN')
+RECORD_TYPES = ('LOC', 'NWK', 'PLT', 'ACT')
+NETWORK_TYPES = ('LOC', 'NWK')
+TIMING_TYPE = 'TLK'  # Read with LOC and NWK, where present, for the edge weights
+
+_LOADED = set()  # Record types imported by ensure_loaded
+
 
 def does_file_exist(f_name: str) -> bool:
     """Check if the file exists in the current path"""
@@ -21,65 +36,166 @@ def does_file_exist(f_name: str) -> bool:
 def import_from_file(f_name: str) -> list:
     """Import the records from a file"""
 
+    return list(iter_records(f_name))
+
+
+def iter_records(f_name: str, batch_size: int = None, fields: Iterable = None) -> Iterator:
+    """Return an iterator over the records in a file, each split into its
+    fields, read lazily so memory does not grow with the file. fields keeps
+    only the field indexes given, in that order (empty where a record is too
+    short); batch_size yields lists of up to that many records"""
+
     if not does_file_exist(f_name):
         raise MissingPartFile(f_name)
 
-    ret_list = []
+    records = read_records(f_name, tuple(fields) if fields is not None else None)
+    if batch_size:
+        return batched(records, batch_size)
+
+    return records
+
+
+def read_records(f_name: str, fields: tuple = None) -> Iterator[list]:
+    """Yield each line of the file split into fields, or just those wanted"""
 
     with open(f_name, 'r', encoding='utf-8') as open_file:
 
+        if fields is None:
+            for line in open_file:
+                yield line.split('\t')
+            return
+
+        # No need to split beyond the last field wanted
+        max_split = max(fields, default=0) + 1
         for line in open_file:
-            split_ln = line.split('\t')
-            ret_list.append(split_ln)
+            split_ln = line.split('\t', max_split)
+            length = len(split_ln)
+            yield [split_ln[field] if field < length else '' for field in fields]
+
+
+def batched(records: Iterator, batch_size: int) -> Iterator[list]:
+    """Yield lists of up to batch_size records"""
 
-    return ret_list
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
 
 
-def import_location() -> list:
-    """Import the location records from the file"""
+def import_location(metrics: ImportMetrics = None) -> list:
+    """Import the location records from the file, counting them in the
+    metrics if given"""
 
+    metrics = metrics or ImportMetrics()
     locs = []
-    for loc_record in import_from_file('LOC'):
-        locs.append(LocationRecord(*loc_record))
+    for loc_record in iter_records('LOC'):
+        loc = parallel_import.parse_counted('LOC', loc_record, metrics)
+        if loc:
+            locs.append(loc)
+
+    LocationRecord.convert_coordinates()
 
     return locs
 
 
-def import_network_links() -> list:
-    """Import the network link records from the NWK file"""
+def import_network_links(metrics: ImportMetrics = None) -> list:
+    """Import the network link records from the NWK file, counting them in
+    the metrics if given"""
 
+    metrics = metrics or ImportMetrics()
     nwks = []
 
-    for link in import_from_file('NWK'):
+    for link in iter_records('NWK'):
 
-        lnk = NetworkLink(*link)
-        rlc = str(lnk.running_line_code).upper()
-        rld = str(lnk.running_line_description).upper()
+        lnk = network_link_from_record(link, metrics)
+        if lnk:
+            nwks.append(lnk)
 
-        if 'BUS' in (rlc, rld):
-            continue
+    return nwks
 
-        lnk.append_to_instance()
-        nwks.append(lnk)
 
-    return nwks
+def network_link_from_record(record: list, metrics: ImportMetrics = None) -> NetworkLink:
+    """Create and register a network link; returns None for BUS links and
+    malformed records, counted as rejected in the metrics if given"""
+
+    lnk = parallel_import.parse_counted('NWK', record, metrics or ImportMetrics())
+    if lnk is None:
+        return None
+
+    lnk.append_to_instance()
+    return lnk
+
+
+def import_edge_weights(timing_links: list = None, timed: dict = None) -> dict:
+    """Resolve a single weight for each NWK TIPLOC pair, needs LOC and NWK"""
+
+    return EdgeWeight.build(timing_links, timed)
+
+
+def has_timings() -> bool:
+    """Return True if there are TLK records to read, in the complete BPLAN or
+    the TLK part file"""
+
+    return does_file_exist(BPLAN_FILE) or does_file_exist(TIMING_TYPE)
 
-def import_timing_links() -> list:
-    """Import the timing link records from the TLK file"""
 
+def with_timings(record_types: tuple) -> tuple:
+    """Add TLK to the record types where LOC and NWK are imported together
+    and there are TLK records, so the edge weights get the TLK estimates"""
+
+    if TIMING_TYPE in record_types or not set(NETWORK_TYPES) <= set(record_types):
+        return tuple(record_types)
+
+    if not has_timings():
+        return tuple(record_types)
+
+    return (*record_types, TIMING_TYPE)
+
+
+def network_sources() -> list:
+    """Return the files the network (and its edge weights) are read from"""
+
+    return record_sources(with_timings(NETWORK_TYPES))
+
+
+def timed_distances() -> dict:
+    """Return the shortest TLK derived distance for each TIPLOC pair, read
+    from the BPLAN or TLK part file without keeping the records; empty if
+    there are none"""
+
+    if not has_timings():
+        return {}
+
+    rows = []
+
+    def consume(record: list) -> None:
+        if len(record) == parallel_import.FIELD_COUNTS[TIMING_TYPE]:
+            rows.append((record[2], record[3], record[7], record[13]))
+
+    read_bplan(record_sources((TIMING_TYPE,))[0], {TIMING_TYPE: consume})
+
+    return EdgeWeight.timed_pairs(rows)
+
+
+def import_timing_links(metrics: ImportMetrics = None) -> list:
+    """Import the timing link records from the TLK file, counting them in the
+    metrics if given"""
+
+    metrics = metrics or ImportMetrics()
     tlks = []
-    for link in import_from_file('TLK'):
+    for link in iter_records('TLK'):
 
-        lnk = TimingLink.factory_from_TLK(link.split('\t'))
-        tlks.append(lnk)
+        lnk = parallel_import.parse_counted('TLK', link, metrics)
+        if lnk:
+            tlks.append(lnk)
 
-        
     return tlks
 
 def import_line_platform() -> dict:
     """Import the line/platform records from PLT file """
 
-    for entry in import_from_file('PLT'):
+    for entry in iter_records('PLT', fields=range(4)):
         LinePlatform.factory_from_bplan_entry(entry)
 
     return LinePlatform.instances
@@ -87,4 +203,168 @@ def import_line_platform() -> dict:
 def import_activity_codes() -> None:
     """ Import the activity codes """
 
-    ActivityCode.import_bplan(import_from_file('ACT'))
\ No newline at end of file
+    ActivityCode.import_bplan(iter_records('ACT', fields=range(5)))
+
+
+def import_bplan(
+        f_name: str = BPLAN_FILE,
+        record_types: tuple = RECORD_TYPES,
+        metrics: ImportMetrics = None,
+        reject_file: str = REJECT_FILE) -> dict:
+    """Import the record types wanted from a complete BPLAN file (plain, gzip
+    or zip) in a single pass; returns a count of records read by type. The
+    records are counted in the metrics if given, and the rejected records
+    written to reject_file, if given, as the parallel import"""
+
+    metrics = metrics or ImportMetrics()
+    if 'LOC' in record_types and 'NWK' in record_types and TIMING_TYPE not in record_types:
+        record_types = (*record_types, TIMING_TYPE)
+
+    tlks = []
+    registers = {
+        'LOC': lambda loc: None,  # Registered on creation
+        'NWK': NetworkLink.append_to_instance,
+        'TLK': tlks.append,
+        'PLT': LinePlatform.factory_from_bplan_entry,
+        'ACT': ActivityCode.instances.append
+    }
+
+    def consumer(record_type: str) -> Callable:
+        """Return the consumer, parsing and registering a record of the type"""
+
+        register = registers[record_type]
+
+        def consume(record: list) -> None:
+            obj = parallel_import.parse_counted(record_type, record, metrics)
+            if obj is not None:
+                register(obj)
+
+        return consume
+
+    counts = read_bplan(
+        f_name,
+        {record_type: consumer(record_type) for record_type in record_types}
+    )
+
+    if 'LOC' in record_types:
+        LocationRecord.convert_coordinates()
+
+    if 'LOC' in record_types and 'NWK' in record_types:
+        import_edge_weights(tlks)
+
+    if reject_file:
+        metrics.write_rejects(reject_file)
+
+    return counts
+
+
+def record_sources(record_types: tuple = RECORD_TYPES) -> list:
+    """Return the files the record types are read from, the complete BPLAN
+    if present, otherwise the part file for each type"""
+
+    if does_file_exist(BPLAN_FILE):
+        sources = [BPLAN_FILE]
+    else:
+        sources = list(record_types)
+
+    for f_name in sources:
+        if not does_file_exist(f_name):
+            raise MissingPartFile(f_name)
+
+    return sources
+
+
+def import_records(
+        record_types: tuple = RECORD_TYPES,
+        workers: int = parallel_import.WORKERS) -> dict:
+    """Import the record types wanted, parsing the BPLAN (or part files) in
+    parallel chunks; returns the counts and per-stage timings"""
+
+    record_types = with_timings(record_types)
+
+    return parallel_import.import_parallel(
+        record_sources(record_types),
+        record_types,
+        workers=workers
+    )
+
+
+def import_network(snapshot_file: str = snapshot.SNAPSHOT_FILE) -> bool:
+    """Import LOC and NWK, with edge weights, from the snapshot if it is
+    current; otherwise parse the BPLAN (or part files) and write a new
+    snapshot. Where NETWORK_DB is set they are read from the database
+    instead. Returns True if the snapshot was used"""
+
+    if db_import.NETWORK_DB:
+        db_import.load_network(db_import.NETWORK_DB, NETWORK_TYPES)
+        return False
+
+    sources = network_sources()
+
+    if snapshot.load(snapshot_file, sources):
+        return True
+
+    import_records(NETWORK_TYPES)
+
+    snapshot.save(snapshot_file, sources)
+
+    return False
+
+
+def load_snapshot(snapshot_file: str = snapshot.SNAPSHOT_FILE) -> bool:
+    """Load LOC and NWK from the snapshot if every network source exists and
+    the snapshot is current; returns True if it was used"""
+
+    try:
+        sources = network_sources()
+    except MissingPartFile:
+        return False
+
+    return snapshot.load(snapshot_file, sources)
+
+
+def ensure_loaded(*record_types: str, snapshot_file: str = snapshot.SNAPSHOT_FILE) -> set:
+    """Import each of the record types (LOC, NWK, PLT, ACT) not loaded yet;
+    LOC and NWK come from the snapshot if it is current, or the database
+    where NETWORK_DB is set. Returns the record types now loaded"""
+
+    wanted = [record_type for record_type in record_types if record_type not in _LOADED]
+    network = tuple(record_type for record_type in NETWORK_TYPES if record_type in wanted)
+    others = tuple(record_type for record_type in wanted if record_type not in NETWORK_TYPES)
+
+    if network == NETWORK_TYPES:
+        import_network(snapshot_file)
+    elif network and db_import.NETWORK_DB:
+        db_import.load_network(db_import.NETWORK_DB, network)
+    elif network and not _LOADED.intersection(NETWORK_TYPES) and load_snapshot(snapshot_file):
+        network = NETWORK_TYPES
+    elif network:
+        import_records(network)
+        if _LOADED.intersection(NETWORK_TYPES):
+            import_edge_weights(timed=timed_distances())  # Now both are loaded
+
+    if others:
+        import_records(others)
+
+    _LOADED.update(network, others)
+
+    return _LOADED
+
+
+def import_network_image(
+        image_file: str = network_image.IMAGE_FILE,
+        snapshot_file: str = snapshot.SNAPSHOT_FILE) -> network_image.NetworkImage:
+    """Map and attach the shared network image, first building it (from the
+    snapshot or source files) if it is missing or stale"""
+
+    sources = network_sources()
+
+    image = network_image.open_image(image_file, sources)
+    if image is None:
+        import_network(snapshot_file)
+        network_image.build(image_file, sources)
+        image = network_image.NetworkImage(image_file)
+
+    network_image.attach(image)
+
+    return image
@@ -0,0 +1,56 @@
+"""Single pass reader for a complete BPLAN file, plain, gzip or zip"""
+
+import gzip
+import io
+import zipfile
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, TextIO
+
+from err import MissingPartFile
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZIP_MAGIC = b'PK\x03\x04'
+
+
+@contextmanager
+def open_bplan(f_name: str) -> Iterator[TextIO]:
+    """Open a BPLAN file for reading as text, whatever its compression"""
+
+    try:
+        with open(f_name, 'rb') as raw:
+            magic = raw.read(4)
+    except FileNotFoundError as err:
+        raise MissingPartFile(f_name) from err
+
+    if magic.startswith(GZIP_MAGIC):
+        with gzip.open(f_name, 'rt', encoding='utf-8', errors='replace') as file:
+            yield file
+        return
+
+    if magic.startswith(ZIP_MAGIC):
+        with zipfile.ZipFile(f_name) as archive:
+            member = archive.namelist()[0]
+            with archive.open(member) as raw:
+                yield io.TextIOWrapper(raw, encoding='utf-8', errors='replace')
+        return
+
+    with open(f_name, 'r', encoding='utf-8', errors='replace') as file:
+        yield file
+
+
+def read_bplan(f_name: str, consumers: Dict[str, Callable]) -> dict:
+    """Read the file once, passing each split record to the consumer for its
+    record type (LOC, NWK, TLK...); returns a count of records by type"""
+
+    counts = {}
+
+    with open_bplan(f_name) as file:
+        for line in file:
+            record_type = line[:3]
+            counts[record_type] = counts.get(record_type, 0) + 1
+
+            consumer = consumers.get(record_type, None)
+            if consumer:
+                consumer(line.split('\t'))
+
+    return counts
@@ -1,7 +1,10 @@
 import os
-from sqlmodel import Session, create_engine, select, and_
-from models import network_link as NWK
-from models import timing_link as TLK
+import sys
+from sqlmodel import Session, create_engine, select
+sys.path.insert(0, './vstp/models')
+import network_link as NWK
+import timing_link as TLK
+import queries
 
 DB_CON_STRING = os.getenv("DB_CON_STRING", 'sqlite:///vstp.db')
 engine = create_engine(DB_CON_STRING, echo=False)
@@ -13,21 +16,7 @@ def get_network_links() -> list:
     
 def get_timing_link(origin: str, destination: str) -> TLK.TimingLink:
     with Session(engine) as session:
-        stmt = select(
-            TLK.TimingLink
-        ).filter(
-            and_(
-                TLK.TimingLink.origin == origin,
-                TLK.TimingLink.destination == destination,
-
-            )
-        )
-        
-                # TLK.TimingLink.speed == '60',
-                # TLK.TimingLink.entry_speed == '-1',
-                # TLK.TimingLink.exit_speed == '-1'
-
-        results = [result[0] for result in session.execute(stmt)]
+        results = queries.timing_links(session, origin, destination)
         if not results:
             print(f'NO RESULTS: {origin}, {destination}')
             return None
@@ -35,6 +24,7 @@ def get_timing_link(origin: str, destination: str) -> TLK.TimingLink:
     
 
 def main():
+    queries.create_schema(engine, [NWK.NetworkLink, TLK.TimingLink])
     for nwk in get_network_links():
         # print(nwk)
         origin = nwk[0].origin
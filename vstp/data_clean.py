@@ -1,14 +1,12 @@
 import os
 import sys
-import subprocess
-import json
-from functools import lru_cache
-from time import sleep
-from typing import Union
-from sqlmodel import Session, create_engine, select, or_, cast, Numeric
+from sqlmodel import Session, create_engine, select
+import reverse_geocoder
 sys.path.insert(0, './vstp/models')
-from models import location as LOC
-from models import network_link as NWK
+import location as LOC
+import network_link as NWK
+import link_distances
+import queries
 
 DB_CON_STRING = os.getenv("DB_CON_STRING", 'sqlite:///vstp.db')
 engine = create_engine(DB_CON_STRING, echo=False)
@@ -45,40 +43,9 @@ def remove_bus(table: str, session: Session) -> dict():
 
 def update_bad_distance() -> None:
     """Update NWK records with questionable distances"""
-    
-    def load_json(stdout: Union[str, bytes]) -> Union[None, str]:
-        """Loads a json object from a geocoder request"""
-        if isinstance(stdout, bytes):
-            stdout = stdout.decode('utf-8')
-        try:
-            return json.loads(stdout)
-        except Exception:
-            return None
-    
-    @lru_cache(maxsize=1000)   
-    def geo_info(wgs_coords: tuple) -> Union[dict, None]:
-        """Sends a geocoder request and returns the results as dict"""
-        args = f'"{wgs_coords[0]}, {wgs_coords[1]}"'
-        proc = subprocess.run(
-            ['geocode', '-m', 'reverse', '-p', 'osm',
-            args],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        
-        return load_json(proc.stdout)
-    
-    @lru_cache(maxsize=1000)
-    def get_loc(tiploc: str, session: Session) -> LOC.Location:
-        """Returns the location record specified in the TIPLOC"""
-        location = select(
-            LOC.Location
-        ).where(
-            LOC.Location.tiploc == tiploc
-        )
-        return session.execute(location).fetchone()[0]
 
-    
+    queries.create_schema(engine, [LOC.Location, NWK.NetworkLink])
+
     with Session(engine) as session:
         
         # Remove the BUS trips from timinglink
@@ -87,74 +54,43 @@ def update_bad_distance() -> None:
         # Remove the BUS trips from networklink
         remove_bus('networklink', session)
         session.commit()
-        
-        # Define query to fetch all network link records where
-        # distance is less that 100 metres.
-        stmt = select(
-            NWK.NetworkLink
-        ).where(
-            or_(
-                NWK.NetworkLink.distance == None, 
-                cast(NWK.NetworkLink.distance, Numeric) < 100
-            )
+
+    # Recompute every link distance, correcting the outliers in one update
+    report = link_distances.recompute(engine)
+    print(link_distances.format_report(report))
+
+    # Links too long to record suggest bad coordinates at one end
+    if not report['unwritable']:
+        return
+
+    with Session(engine) as session:
+        locations = [record[0] for record in session.execute(select(LOC.Location))]
+        LOC.Location.convert_coordinates(locations)
+        by_tiploc = queries.locations_by_tiploc(
+            session,
+            {tiploc for link in report['unwritable'] for tiploc in link[:2]}
         )
-        
-        # Loop through the query results
-        for row in [record[0] for record in session.execute(stmt)]:
-
-            # Fetch the location record
-            origin_loc = get_loc(row.origin, session)
-            
-            # Check if the easting/northing coordinates are valid
-            if not origin_loc.are_coords_valid:
-                continue
-            
-            # Fetch the destination record
-            dest_loc = get_loc(row.destination, session)
-            
-            # Check if the easting/northing coordinates are valid
-            if not dest_loc.are_coords_valid:
-                continue
-            
-            # Check if wgs coordinates are available
-            if not all([origin_loc.wgs_coordinates, dest_loc.wgs_coordinates]):
-                continue
-            
-            # Calculate the new distance
-            distance = LOC.Location.distance(
-                origin_loc.wgs_coordinates,
-                dest_loc.wgs_coordinates,
-                miles=False
-            )
-            
-            # If we could not calculate the distance, move on
-            if not distance:
-                continue
-            
-            if distance > 99999:
-                distance = str(int(distance)).rjust(5,'0')
-                print(f'{origin_loc.tiploc} -> {dest_loc.tiploc} was {row.distance}, is now {distance}')
-                print(origin_loc)
-                print(origin_loc.wgs_coordinates)
-                info = geo_info(origin_loc.wgs_coordinates)
-                if not info:
-                    continue
-                if 'postal' not in info:
-                    print(info)
-                else:
-                    print(info["postal"])
-                sleep(0.5)
-                print(dest_loc)
-                print(dest_loc.wgs_coordinates)
-                info = geo_info(dest_loc.wgs_coordinates)
-                if not info:
-                    continue
-                if 'postal' not in info:
-                    print(info)
-                else:
-                    print(info["postal"])
-                sleep(0.5)
-                print('*' * 20)
+
+    # The ends with a location and coordinates; the others are unknown
+    points = {
+        tiploc: loc.wgs_coordinates for tiploc, loc in by_tiploc.items()
+        if loc.are_coords_valid and loc.wgs_coordinates
+    }
+
+    # Describe both ends of each link, resolving every point in one call
+    coder = reverse_geocoder.get_geocoder(
+        locations=[(loc.tiploc, loc.name, loc.easting, loc.northing) for loc in locations]
+    )
+    places = coder.reverse_many(points.values())
+
+    for origin, destination, recorded, distance in report['unwritable']:
+        distance = str(int(distance)).rjust(5,'0')
+        print(f'{origin} -> {destination} was {recorded}, is now {distance}')
+        for tiploc in (origin, destination):
+            print(by_tiploc.get(tiploc, tiploc))
+            print(points.get(tiploc))
+            print(reverse_geocoder.describe(places.get(points.get(tiploc))))
+        print('*' * 20)
         
     
 
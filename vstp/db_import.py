@@ -0,0 +1,141 @@
+"""Builds the LOC and NWK registries from the database
+
+The location and networklink tables, as loaded and cleaned by the models
+scripts, are read with a query each and streamed in batches, so the cleaned
+coordinates and distances are used without exporting them to text files.
+Links are read in the order they were loaded, which keeps the order of each
+TIPLOC's neighbours the same as a text import.
+"""
+
+import os
+import time
+
+from sqlalchemy import create_engine, inspect, text
+
+from location_record import LocationRecord
+from network_links import NetworkLink
+from edge_weights import EdgeWeight
+from spatial_index import SpatialIndex
+
+NETWORK_DB = os.getenv("NETWORK_DB", None)  # e.g. sqlite:///vstp.db, in place of LOC/NWK
+BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", 10000))
+
+LOCATIONS = text("""
+    SELECT tiploc, name, easting, northing, tp_type, zone, stanox,
+           off_network, lpb
+    FROM location
+    ORDER BY id
+""")
+
+# BUS links are not used for routing
+NETWORK_LINKS = text("""
+    SELECT origin, destination, line, line_desc, initial_dir, final_dir,
+           distance, doop, doof, retb, zone, reversable, power, route_avail,
+           max_len
+    FROM networklink
+    WHERE UPPER(TRIM(COALESCE(line, ''))) != 'BUS'
+      AND UPPER(TRIM(COALESCE(line_desc, ''))) != 'BUS'
+    ORDER BY id
+""")
+
+# The TLK estimates for the edge weights, where the timinglink table is loaded
+TIMING_LINKS = text("""
+    SELECT origin, destination, speed, srt
+    FROM timinglink
+""")
+
+
+def text_value(value: object) -> str:
+    """Return a column value as the text the BPLAN would hold"""
+
+    if value is None:
+        return ''
+
+    return str(value)
+
+
+def location_record(row: tuple) -> list:
+    """Return a location row as a split LOC record"""
+
+    tiploc, name, easting, northing, tp_type, zone, stanox, off_network, lpb = row
+
+    return [
+        'LOC', 'A', tiploc, text_value(name), '', '',
+        easting or 0, northing or 0,
+        text_value(tp_type), text_value(zone), text_value(stanox),
+        text_value(off_network), text_value(lpb)
+    ]
+
+
+def network_link_record(row: tuple) -> list:
+    """Return a networklink row as a split NWK record"""
+
+    values = [text_value(value) for value in row]
+
+    return ['NWK', 'A', *values[:4], '', '', *values[4:]]
+
+
+def stream(connection: object, query: object, batch_size: int = BATCH_SIZE):
+    """Yield the rows of a query, fetched batch_size at a time"""
+
+    result = connection.execution_options(stream_results=True).execute(query)
+    for batch in result.partitions(batch_size):
+        yield from batch
+
+
+def clear(record_types: tuple) -> None:
+    """Empty the registries of the record types, and what is derived from
+    them, as snapshot.load"""
+
+    if 'LOC' in record_types:
+        LocationRecord._instances.clear()
+        LocationRecord._version += 1
+        LocationRecord._search = None
+        SpatialIndex.reset()
+
+    if 'NWK' in record_types:
+        NetworkLink._instances.clear()
+        NetworkLink._origins.clear()
+        NetworkLink.clear_cache()
+
+    EdgeWeight._instances.clear()
+    EdgeWeight._planar_ratio = None
+
+
+def load_network(
+        db_con_string: str = NETWORK_DB,
+        record_types: tuple = ('LOC', 'NWK'),
+        batch_size: int = BATCH_SIZE) -> dict:
+    """Populate the LOC and/or NWK registries from the database, replacing
+    anything already loaded, then the edge weights (where both are loaded),
+    with the TLK estimates from the timinglink table if there is one.
+    Returns the records loaded by type and the seconds taken"""
+
+    started = time.perf_counter()
+    counts = {record_type: 0 for record_type in record_types}
+    clear(record_types)
+    engine = create_engine(db_con_string, echo=False)
+
+    with engine.connect() as connection:
+        if 'LOC' in record_types:
+            for row in stream(connection, LOCATIONS, batch_size):
+                LocationRecord(*location_record(row))
+                counts['LOC'] += 1
+            LocationRecord.convert_coordinates()
+
+        if 'NWK' in record_types:
+            for row in stream(connection, NETWORK_LINKS, batch_size):
+                NetworkLink(*network_link_record(row)).append_to_instance()
+                counts['NWK'] += 1
+            NetworkLink.clear_cache()
+
+        timed = {}
+        if 'LOC' in record_types and 'NWK' in record_types and inspect(engine).has_table('timinglink'):
+            timed = EdgeWeight.timed_pairs(stream(connection, TIMING_LINKS, batch_size))
+
+    engine.dispose()
+
+    if 'LOC' in record_types and 'NWK' in record_types:
+        EdgeWeight.build(timed=timed)
+
+    return {'counts': counts, 'seconds': time.perf_counter() - started}
@@ -0,0 +1,260 @@
+"""Resolves each NWK TIPLOC pair to a single numeric weight at load time"""
+
+# pylint: disable=R0903
+
+import re
+import warnings
+from typing import Iterable, Union
+
+from network_links import NetworkLink
+from location_record import LocationRecord
+
+MEASURED = 'NWK'  # Best measured NWK distance
+GEOGRAPHIC = 'LOC'  # As the crow flies, from LOC coordinates
+TIMED = 'TLK'  # Extrapolated from TLK speed and sectional running time
+DEFAULT = 'DEFAULT'  # Nothing better was available
+
+MIN_MEASURED = 2  # NWK distances of 0 and 1 are placeholders, not measurements
+DEFAULT_WEIGHT = 1609  # One mile, in metres
+PLANAR_RATIO_FLOOR = 0.9  # Pairs shorter than this against the straight line are outliers
+METRES_PER_MILE = 1609.344
+SRT = re.compile(r"^\+?([0-9]{1,3})'([0-9]{2})$")
+
+
+class EdgeWeight:
+    """The resolved weight (metres) of a TIPLOC pair and where it came from"""
+
+    _instances = {}
+    _image = None  # NetworkImage, when attached weights are read from it
+    _planar_ratio = None  # Cached by planar_ratio, reset as weights resolve
+
+    def __init__(self, tiploc_a: str, tiploc_b: str, weight: int, provenance: str):
+        """Initialisation"""
+
+        self.tiploc_a = tiploc_a
+        self.tiploc_b = tiploc_b
+        self.weight = weight
+        self.provenance = provenance
+
+    def __repr__(self) -> str:
+        """Return a string representation of the object"""
+
+        return f'{self.tiploc_a} -> {self.tiploc_b}: {self.weight}m ({self.provenance})'
+
+    @staticmethod
+    def measured_distance(links: list) -> Union[int, None]:
+        """Return the shortest measured distance from a list of parallel links"""
+
+        distances = [
+            int(link.distance) for link in links
+            if str(link.distance).strip().isdigit()
+            and int(link.distance) >= MIN_MEASURED
+        ]
+
+        if not distances:
+            return None
+
+        return min(distances)
+
+    @staticmethod
+    def geographic_distance(tiploc_a: str, tiploc_b: str) -> Union[int, None]:
+        """Return the distance in metres between two TIPLOCs, from LOC coordinates"""
+
+        loc_a = LocationRecord.return_instance(tiploc_a)
+        loc_b = LocationRecord.return_instance(tiploc_b)
+        if not loc_a or not loc_b:
+            return None
+
+        wgs_a = loc_a.wgs_coordinates
+        wgs_b = loc_b.wgs_coordinates
+        if not wgs_a or not wgs_b:
+            return None
+
+        distance = LocationRecord.distance(wgs_a, wgs_b)
+        if not distance:
+            return None
+
+        return max(int(round(distance * METRES_PER_MILE, 0)), 1)
+
+    @staticmethod
+    def timed_distance(speed: str, srt: str) -> Union[int, None]:
+        """Return an estimated distance in metres from a TLK speed and SRT"""
+
+        if not str(speed).strip().isdigit():
+            return None
+
+        match = SRT.match(str(srt).strip())
+        if not match:
+            return None
+
+        seconds = (int(match[1]) * 60) + int(match[2])
+        distance = (int(speed) / 3600) * seconds * METRES_PER_MILE
+        if not distance:
+            return None
+
+        return int(round(distance, 0))
+
+    @classmethod
+    def timed_pairs(cls, rows: Iterable) -> dict:
+        """Return the shortest TLK derived distance for each TIPLOC pair, from
+        (origin, destination, speed, srt) rows"""
+
+        estimates = {}
+        for origin, destination, speed, srt in rows:
+            distance = cls.timed_distance(speed, srt)
+            if not distance:
+                continue
+            pair = (origin, destination)
+            if pair not in estimates or distance < estimates[pair]:
+                estimates[pair] = distance
+
+        return estimates
+
+    @classmethod
+    def timed_distances(cls, timing_links: Iterable) -> dict:
+        """Return the shortest TLK derived distance for each TIPLOC pair"""
+
+        return cls.timed_pairs(
+            (link.start_tiploc.tiploc, link.end_tiploc.tiploc, link.speed, link.srt)
+            for link in timing_links
+        )
+
+    @classmethod
+    def build(cls, timing_links: Iterable = None, timed: dict = None) -> dict:
+        """Resolve a weight for every TIPLOC pair in the NWK records; the TLK
+        estimates come from the timing links, or timed if already derived"""
+
+        if timed is None:
+            timed = cls.timed_distances(timing_links or [])
+        cls._instances = {}
+        cls._planar_ratio = None
+
+        for tiploc_a, destinations in NetworkLink._instances.items():
+            for tiploc_b, links in destinations.items():
+                cls.resolve(tiploc_a, tiploc_b, links, timed)
+
+        return cls._instances
+
+    @classmethod
+    def resolve(cls, tiploc_a: str, tiploc_b: str, links: list, timed: dict = None) -> object:
+        """Resolve (or re-resolve) the weight of a single TIPLOC pair"""
+
+        weight = cls.measured_distance(links)
+        provenance = MEASURED
+
+        if weight is None:
+            weight = cls.geographic_distance(tiploc_a, tiploc_b)
+            provenance = GEOGRAPHIC
+
+        if weight is None and timed:
+            weight = timed.get((tiploc_a, tiploc_b), None)
+            provenance = TIMED
+
+        if weight is None:
+            weight = DEFAULT_WEIGHT
+            provenance = DEFAULT
+
+        obj = cls(tiploc_a, tiploc_b, weight, provenance)
+        cls._instances.setdefault(tiploc_a, {})[tiploc_b] = obj
+        cls._planar_ratio = None
+
+        return obj
+
+    @classmethod
+    def ensure_built(cls) -> None:
+        """Weights should be built explicitly (with the TLK records); if they
+        were not, build them from the NWK and LOC records alone, with a
+        warning, so the pairs only a TLK estimate would resolve get
+        DEFAULT_WEIGHT"""
+
+        if not cls._instances:
+            warnings.warn(
+                'EdgeWeight.build was not called, building weights without TLK estimates',
+                RuntimeWarning,
+                stacklevel=3
+            )
+            cls.build()
+
+    @classmethod
+    def return_instance(cls, tiploc_a: str, tiploc_b: str):
+        """Return the EdgeWeight for a TIPLOC pair, see ensure_built"""
+
+        cls.ensure_built()
+
+        return cls._instances.get(tiploc_a, {}).get(tiploc_b, None)
+
+    @classmethod
+    def planar_ratio(cls) -> float:
+        """Return the smallest ratio of weight to planar distance (as
+        LocationRecord.planar_distance) between the ends of any pair, at most
+        1. DEFAULT and TIMED weights, and some measured ones, are shorter than
+        the straight line; scaled by this ratio, the planar distance does not
+        overestimate the weight of a path. Pairs below PLANAR_RATIO_FLOOR are
+        outliers (a bad distance or coordinates), skipped with a warning so
+        that one cannot cripple the heuristic"""
+
+        if cls._image is not None:
+            return cls._image.planar_ratio()
+
+        if cls._planar_ratio is None:
+            cls.ensure_built()
+            ratio = 1.0
+            skipped = 0
+            for tiploc_a, destinations in cls._instances.items():
+                loc_a = LocationRecord.return_instance(tiploc_a)
+                bng_a = loc_a.bng_coordinates if loc_a else None
+                if not bng_a:
+                    continue
+                for tiploc_b, obj in destinations.items():
+                    loc_b = LocationRecord.return_instance(tiploc_b)
+                    distance = LocationRecord.planar_distance(
+                        bng_a, loc_b.bng_coordinates if loc_b else None
+                    )
+                    if not distance:
+                        continue
+                    if obj.weight / distance < PLANAR_RATIO_FLOOR:
+                        skipped += 1
+                    else:
+                        ratio = min(ratio, obj.weight / distance)
+            warn_outliers(skipped)
+            cls._planar_ratio = ratio
+
+        return cls._planar_ratio
+
+    @classmethod
+    def weight_of(cls, tiploc_a: str, tiploc_b: str) -> Union[int, None]:
+        """Return the precomputed weight (metres) between tiploc A and tiploc B"""
+
+        if cls._image is not None:
+            return cls._image.weight(tiploc_a, tiploc_b)
+
+        obj = cls.return_instance(tiploc_a, tiploc_b)
+        if not obj:
+            return None
+
+        return obj.weight
+
+    @classmethod
+    def provenance_of(cls, tiploc_a: str, tiploc_b: str) -> Union[str, None]:
+        """Return where the weight between tiploc A and tiploc B came from"""
+
+        if cls._image is not None:
+            return cls._image.provenance(tiploc_a, tiploc_b)
+
+        obj = cls.return_instance(tiploc_a, tiploc_b)
+        if not obj:
+            return None
+
+        return obj.provenance
+
+
+def warn_outliers(skipped: int) -> None:
+    """Warn of the pairs skipped by planar_ratio, if any"""
+
+    if skipped:
+        warnings.warn(
+            f'{skipped} TIPLOC pairs shorter than {PLANAR_RATIO_FLOOR} of their '
+            'straight line distance skipped by planar_ratio',
+            RuntimeWarning,
+            stacklevel=3
+        )
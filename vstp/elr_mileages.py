@@ -0,0 +1,249 @@
+"""Tags schedule rows with the ELR and mileage (miles.chains) of each TIPLOC
+
+Each TIPLOC is matched, once, to the places its name is found in the mileage
+files; where the ELR references are available (the engineerslineref table,
+with the LOR codes from the ELR mapping) places outside an ELR's mileage
+range are dropped. A schedule is then annotated in a single pass: each row
+keeps to the ELR of the row before it where it can, and rows that could not
+be matched by name (signals, crossovers...) are interpolated, by route
+distance, between the matched rows either side on the same ELR.
+"""
+
+import os
+import re
+from typing import Iterable, List, Union
+
+from sqlalchemy import create_engine, text
+
+from location_record import LocationRecord
+from location_search import normalise
+from mileages import Mileage, MileageIndex, from_chains, to_chains
+
+ELR_DB = os.getenv("ELR_DB", None)  # e.g. sqlite:///vstp.db, for the ELR references
+
+ELR_REFERENCES = text("""
+    SELECT elr, name, start_mileage, end_mileage, lor_reference
+    FROM engineerslineref
+    WHERE elr IS NOT NULL
+""")
+
+# BPLAN location name abbreviations, as they are written in the mileage files
+ABBREVIATIONS = {
+    'JN': 'JUNCTION',
+    'JCN': 'JUNCTION',
+    'JNC': 'JUNCTION',
+    'SDG': 'SIDING',
+    'SDGS': 'SIDINGS',
+    'N': 'NORTH',
+    'S': 'SOUTH',
+    'E': 'EAST',
+    'W': 'WEST',
+}
+
+PARENTHESES = re.compile(r'\([^)]*\)')
+
+
+def location_keys(name: str) -> List[str]:
+    """Return the names a BPLAN location name may be found by in the
+    mileage files, most specific first"""
+
+    keys = []
+    for variant in (name, PARENTHESES.sub(' ', name)):
+        words = normalise(variant).split()
+        key = ' '.join(ABBREVIATIONS.get(word, word) for word in words)
+        if key and key not in keys:
+            keys.append(key)
+
+    return keys
+
+
+def read_lines(db_con_string: str = ELR_DB) -> dict:
+    """Return the name, LOR code and mileage range (in chains) of each ELR,
+    from the engineerslineref table"""
+
+    lines = {}
+    engine = create_engine(db_con_string, echo=False)
+    with engine.connect() as connection:
+        for elr, name, start, end, lor in connection.execute(ELR_REFERENCES):
+            held = lines.setdefault(elr, [name, lor, []])
+            held[1] = held[1] or lor
+            held[2].extend(to_chains(value) for value in (start, end) if value is not None)
+    engine.dispose()
+
+    return {
+        elr: (name, lor, min(chains, default=None), max(chains, default=None))
+        for elr, (name, lor, chains) in lines.items()
+    }
+
+
+class ELRIndex:
+    """The places in the mileage files each TIPLOC is found"""
+
+    _default = None
+
+    def __init__(self, mileages: MileageIndex, lines: dict = None):
+        """Initialisation"""
+
+        self.mileages = mileages
+        self.lines = lines or {}
+        self.tiplocs = {}
+
+    def __len__(self) -> int:
+        """Return the number of TIPLOCs matched"""
+
+        return len(self.tiplocs)
+
+    def in_range(self, place: Mileage) -> bool:
+        """Return True if a place is within its ELR's mileage range, or the
+        range is not known"""
+
+        if place.elr not in self.lines:
+            return True
+
+        _, _, start, end = self.lines[place.elr]
+        if start is None or end is None:
+            return True
+
+        return start <= place.chains <= end
+
+    def add(self, tiploc: str, name: str) -> tuple:
+        """Match a TIPLOC to its places, by name; returns them, exact
+        mileages first"""
+
+        places = ()
+        for key in location_keys(name):
+            places = tuple(
+                place for place in self.mileages.locate(key) if self.in_range(place)
+            )
+            if places:
+                break
+
+        places = tuple(sorted(places, key=lambda place: place.approximate))
+        if places:
+            self.tiplocs[tiploc] = places
+
+        return places
+
+    @classmethod
+    def from_locations(
+            cls,
+            locations: Iterable = None,
+            mileages: MileageIndex = None,
+            lines: dict = None) -> object:
+        """Build the index for LocationRecords (all, by default)"""
+
+        if locations is None:
+            locations = LocationRecord.locations()
+
+        index = cls(mileages or MileageIndex.default(), lines)
+        for location in locations:
+            if location.location_name:
+                index.add(location.location_code, location.location_name)
+
+        return index
+
+    @classmethod
+    def default(cls) -> object:
+        """Return the TIPLOC index, built once from the LOC records"""
+
+        if cls._default is None:
+            cls._default = cls.from_locations(lines=read_lines() if ELR_DB else None)
+
+        return cls._default
+
+    @classmethod
+    def reset(cls) -> None:
+        """Discard the TIPLOC index, it will be rebuilt when next needed"""
+
+        cls._default = None
+
+    def places(self, tiploc: str) -> tuple:
+        """Return the places a TIPLOC is found, exact mileages first"""
+
+        return self.tiplocs.get(tiploc, ())
+
+    @staticmethod
+    def choose(places: tuple, previous: Union[str, None], following: tuple) -> Mileage:
+        """Choose a place, preferring the ELR of the previous row, then one
+        shared with the following row"""
+
+        for place in places:
+            if place.elr == previous:
+                return place
+
+        following_elrs = {place.elr for place in following}
+        for place in places:
+            if place.elr in following_elrs:
+                return place
+
+        return places[0]
+
+    def annotate(self, rows: list) -> int:
+        """Set the elr and elr_mileage of each row (objects with a tiploc and,
+        to interpolate, a cumulative route mileage in miles). Returns the
+        number of rows annotated"""
+
+        places = [self.places(row.tiploc) for row in rows]
+
+        # The places of the next matched row, for each row
+        ahead = [()] * len(rows)
+        following = ()
+        for ind in range(len(rows) - 1, -1, -1):
+            ahead[ind] = following
+            following = places[ind] or following
+
+        chosen = [None] * len(rows)
+        previous = None
+        for ind, here in enumerate(places):
+            if here:
+                chosen[ind] = self.choose(here, previous, ahead[ind])
+                previous = chosen[ind].elr
+
+        annotated = 0
+        last = None
+        for ind, row in enumerate(rows):
+            place = chosen[ind]
+            if place is None:
+                row.elr, row.elr_mileage = '', ''
+                continue
+
+            row.elr, row.elr_mileage = place.elr, place.miles
+            annotated += 1
+            if last is not None and chosen[last].elr == place.elr and ind - last > 1:
+                annotated += self.interpolate(rows, last, ind, chosen)
+            last = ind
+
+        return annotated
+
+    @staticmethod
+    def interpolate(rows: list, first: int, last: int, chosen: list) -> int:
+        """Set the ELR mileage of the rows between two rows on the same ELR,
+        in proportion to the route distance; marked approximate (≈). Returns
+        the number of rows set"""
+
+        try:
+            start = float(rows[first].mileage)
+            end = float(rows[last].mileage)
+        except (AttributeError, TypeError, ValueError):
+            return 0
+
+        if end <= start:
+            return 0
+
+        elr = chosen[first].elr
+        from_chain = chosen[first].chains
+        to_chain = chosen[last].chains
+        count = 0
+        for ind in range(first + 1, last):
+            try:
+                share = (float(rows[ind].mileage) - start) / (end - start)
+            except (AttributeError, TypeError, ValueError):
+                continue
+
+            chains = round(from_chain + (to_chain - from_chain) * share)
+            rows[ind].elr = elr
+            rows[ind].elr_mileage = f'≈{from_chains(chains)}'
+            count += 1
+
+        return count
+
@@ -63,3 +63,36 @@ class BadTiplocError(Exception):
         self.tiploc = tiploc
         self.message = f'{self.tiploc} is not a valid TIPLOC'
         super().__init__(self.message)
+
+
+class BadNetworkImage(Exception):
+    """Exception raised where a network image file cannot be used
+
+    Attributes:
+        file_name -- the image file which caused the error
+        message -- explanation of the error
+    """
+
+    def __init__(self, file_name):
+        """Initialisation"""
+
+        self.file_name = file_name
+        self.message = f'{self.file_name} is not a valid network image'
+        super().__init__(self.message)
+
+
+class NotInNetworkImage(Exception):
+    """Exception raised where a lookup needs the NWK records themselves, which
+    an attached network image does not hold
+
+    Attributes:
+        lookup -- the lookup which caused the error
+        message -- explanation of the error
+    """
+
+    def __init__(self, lookup):
+        """Initialisation"""
+
+        self.lookup = lookup
+        self.message = f'{self.lookup} needs the NWK records, not available from a network image'
+        super().__init__(self.message)
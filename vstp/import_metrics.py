@@ -0,0 +1,158 @@
+"""Counts, throughput and rejected records for an import
+
+An ImportMetrics is filled in as records are parsed, one per chunk where the
+parsing is spread across processes, and the chunks' metrics merged. The
+rejected records, with the reason for each, can be written out as JSON lines.
+"""
+
+import json
+import os
+import sys
+from typing import Union
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+REJECT_FILE = os.getenv("REJECT_FILE", None)  # JSON lines, written if set
+
+_WRITTEN = set()  # Reject files started by this process, appended to after
+
+
+def peak_memory() -> Union[int, None]:
+    """Return the peak resident memory of this process in KiB, or None where
+    it cannot be measured"""
+
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak //= 1024  # Reported in bytes, not KiB
+
+    return peak
+
+
+class ImportMetrics:
+    """Records read, accepted and rejected by record type, and the time and
+    rows of each stage of an import"""
+
+    def __init__(self):
+        """Initialisation"""
+
+        self.read = {}
+        self.accepted = {}
+        self.rejected = {}
+        self.rejects = []  # (record type, reason, record text)
+        self.stages = {}  # stage -> [seconds, rows]
+        self.peak_memory = None
+
+    def count_read(self, record_type: str) -> None:
+        """Count a record read"""
+
+        self.read[record_type] = self.read.get(record_type, 0) + 1
+
+    def accept(self, record_type: str) -> None:
+        """Count a record accepted"""
+
+        self.accepted[record_type] = self.accepted.get(record_type, 0) + 1
+
+    def reject(self, record_type: str, reason: str, record: list) -> None:
+        """Count a record rejected, keeping it and the reason"""
+
+        self.rejected[record_type] = self.rejected.get(record_type, 0) + 1
+        self.rejects.append((record_type, reason, '\t'.join(record).rstrip('\n')))
+
+    def add_stage(self, stage: str, seconds: float, rows: int = 0) -> None:
+        """Add the time spent, and rows handled, in a stage"""
+
+        totals = self.stages.setdefault(stage, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += rows
+
+    def sample_memory(self) -> None:
+        """Update the peak memory, from this process"""
+
+        peak = peak_memory()
+        if peak is not None:
+            self.peak_memory = max(self.peak_memory or 0, peak)
+
+    def merge(self, other: object) -> None:
+        """Add in the metrics of another chunk (or process)"""
+
+        for name in ('read', 'accepted', 'rejected'):
+            totals = getattr(self, name)
+            for record_type, count in getattr(other, name).items():
+                totals[record_type] = totals.get(record_type, 0) + count
+
+        self.rejects.extend(other.rejects)
+
+        for stage, (seconds, rows) in other.stages.items():
+            self.add_stage(stage, seconds, rows)
+
+        if other.peak_memory is not None:
+            self.peak_memory = max(self.peak_memory or 0, other.peak_memory)
+
+    def write_rejects(self, f_name: str) -> int:
+        """Write the rejected records as JSON lines; the first import in a
+        process starts the file afresh, later imports append to it. Returns
+        the count"""
+
+        path = os.path.abspath(f_name)
+        mode = 'a' if path in _WRITTEN else 'w'
+        _WRITTEN.add(path)
+
+        with open(f_name, mode, encoding='utf-8') as file:
+            for record_type, reason, record in self.rejects:
+                file.write(json.dumps({
+                    'record_type': record_type,
+                    'reason': reason,
+                    'record': record
+                }) + '\n')
+
+        return len(self.rejects)
+
+    def report(self) -> dict:
+        """Return the metrics as a dict"""
+
+        record_types = list(dict.fromkeys([*self.read, *self.accepted, *self.rejected]))
+
+        return {
+            'records': {
+                record_type: {
+                    'read': self.read.get(record_type, 0),
+                    'accepted': self.accepted.get(record_type, 0),
+                    'rejected': self.rejected.get(record_type, 0)
+                }
+                for record_type in record_types
+            },
+            'stages': {
+                stage: {
+                    'seconds': seconds,
+                    'rows': rows,
+                    'rows_per_second': rows / seconds if seconds else 0.0
+                }
+                for stage, (seconds, rows) in self.stages.items()
+            },
+            'peak_memory_kb': self.peak_memory
+        }
+
+
+def format_report(report: dict) -> str:
+    """Return the metrics report as text"""
+
+    lines = []
+    for record_type, counts in report['records'].items():
+        lines.append(
+            f"\t{record_type}: {counts['read']} read, {counts['accepted']} accepted, "
+            f"{counts['rejected']} rejected"
+        )
+    for stage, totals in report['stages'].items():
+        lines.append(
+            f"\t{stage}: {totals['seconds']:.2f}s, {totals['rows_per_second']:.0f} rows/s"
+        )
+    if report['peak_memory_kb'] is not None:
+        lines.append(f"\tpeak memory: {report['peak_memory_kb'] / 1024:.0f} MiB")
+
+    return '\n'.join(lines)
@@ -1,10 +1,11 @@
 """Imports the timing load data into a database"""
 
+from typing import Iterator
 from sqlalchemy import create_engine
-from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
 from database.schema import TimingLoad, BASE as Base
-from bplan_import import import_from_file
+from bplan_import import iter_records
+from models.bulk_load import bulk_load, format_report
 
 ENGINE = create_engine('sqlite:///tld.db', echo=False)
 SESSION = sessionmaker(bind=ENGINE)()
@@ -19,34 +20,37 @@ def strip_value(value: str) -> str:
     return val
 
 
-def import_timing_loads():
-    """Imports the timing load records into a database"""
+def timing_load_rows() -> Iterator[dict]:
+    """Yield a row for each usable TLD record"""
+
+    for record in iter_records('TLD'):
+        if not len(record) == 10:
+            continue
+        row = {
+            'traction_type': strip_value(record[2]),
+            'trailing_load': strip_value(record[3]),
+            'max_speed': strip_value(record[4]),
+            'ra_guage': strip_value(record[5]),
+            'description': strip_value(record[6]),
+            'power_type': strip_value(record[7]),
+            'load': strip_value(record[8]),
+            'limiting_speed': strip_value(record[9])
+        }
+        if not row['max_speed']:
+            continue
+        yield row
+
+
+def import_timing_loads() -> dict:
+    """Imports the timing load records into a database, in bulk; rows
+    missing a required value are skipped"""
 
     Base.metadata.create_all(ENGINE, checkfirst=True)
 
-    with SESSION as ses:
-
-        for record in import_from_file('TLD'):
-            if not len(record) == 10:
-                continue
-            tld = TimingLoad()
-            tld.traction_type = strip_value(record[2])
-            tld.trailing_load = strip_value(record[3])
-            tld.max_speed = strip_value(record[4])
-            tld.ra_guage = strip_value(record[5])
-            tld.description = strip_value(record[6])
-            tld.power_type = strip_value(record[7])
-            tld.load = strip_value(record[8])
-            tld.limiting_speed = strip_value(record[9])
-            if not tld.max_speed:
-                continue
-            try:
-                ses.add(tld)
-                ses.commit()
-            except IntegrityError as err:
-                print(record)
-                print(err)
-                ses.rollback()
+    report = bulk_load(ENGINE, TimingLoad, timing_load_rows())
+    print(format_report(report))
+
+    return report
 
 
 if __name__ == '__main__':
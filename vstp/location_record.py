@@ -5,22 +5,33 @@
 # pylint: disable=E0611
 
 import json
-
-from fuzzyfinder import fuzzyfinder
+from typing import Iterable
 
 from bng_latlon import OSGB36toWGS84 as conv
 from haversine import haversine, Unit
+from models.coordinates import bng_to_wgs_pairs
+from location_search import LocationSearch
 
 EAST_L = 135263
 EAST_U = 658013
 NORTH_L = 10866
 NORTH_U = 969710
 
+# The OS grid scale factor runs from 0.9996 on the central meridian to about
+# 1.0007 at the edges of Great Britain, so the grid overstates ground distance
+# by at most ~0.07%; scale the planar distance down to stay within the ground
+# distance. Weights can still be shorter than it, see EdgeWeight.planar_ratio
+PLANAR_SCALE = 0.999
+
 
 class LocationRecord:
     """Representation of the LOC record"""
 
     _instances = {}
+    _version = 0  # Changed as locations are registered or removed
+    _search = None
+    _search_version = None  # The _version the search index is current to
+    _image = None  # NetworkImage, when attached lookups run against it
 
     def __init__(self, *args):
         """Initialisation"""
@@ -36,7 +47,41 @@ class LocationRecord:
         self.stanox_code = args[10]
         self.off_network_indicator = args[11]
         self.force_lpb = str(args[12]).strip('\n').strip()
-        self._instances[self.location_code] = self
+        self._wgs = None
+        self._wgs_converted = False
+        self.register()
+
+    def register(self) -> None:
+        """Add to the class instances, and the search index if built and
+        current"""
+
+        cls = type(self)
+        current = cls._search is not None and cls._search_version == cls._version
+
+        cls._instances[self.location_code] = self
+        cls._version += 1
+
+        if current:
+            cls._search.add(self)
+            cls._search_version = cls._version
+
+    @classmethod
+    def unregister(cls, tiploc: str) -> object:
+        """Remove a location from the class instances, and the search index if
+        built and current; returns it, None if not known"""
+
+        obj = cls._instances.pop(tiploc, None)
+        if obj is None:
+            return None
+
+        current = cls._search is not None and cls._search_version == cls._version
+        cls._version += 1
+
+        if current:
+            cls._search.remove(tiploc)
+            cls._search_version = cls._version
+
+        return obj
 
     @property
     def as_dict(self) -> dict:
@@ -71,20 +116,84 @@ class LocationRecord:
         except Exception:  # pylint: disable=W0703
             return None
 
+    @staticmethod
+    def planar_distance(bng_1: tuple, bng_2: tuple) -> float:
+        """Provide 2 valid easting/northing pairs, get a float back that is the
+        straight line distance in metres twixt the two, on the OS grid"""
+
+        if not bng_1 or not bng_2:
+            return None
+
+        d_east = bng_1[0] - bng_2[0]
+        d_north = bng_1[1] - bng_2[1]
+
+        return ((d_east * d_east + d_north * d_north) ** 0.5) * PLANAR_SCALE
+
+    @classmethod
+    def search_index(cls) -> LocationSearch:
+        """Return the search index over all locations, built on first use"""
+
+        if cls._image is not None:
+            if cls._search is None:
+                cls._search = LocationSearch(cls._image.locations())
+            return cls._search
+
+        if cls._search is None or cls._search_version != cls._version:
+            cls._search = LocationSearch(cls._instances.values())
+            cls._search_version = cls._version
+
+        return cls._search
+
+    @classmethod
+    def match_locations(cls, search: str, limit: int = None) -> list:
+        """Returns a list of matching locations, best matches first"""
+
+        return cls.search_index().search(search, limit)
+
+    @classmethod
+    def convert_coordinates(cls, records: list = None) -> int:
+        """Convert the coordinates of every location (or those passed) in one
+        vectorised pass, caching the WGS coordinates on each record; returns
+        the count converted"""
+
+        if records is None:
+            records = cls._instances.values()
+
+        valid = []
+        for obj in records:
+            if obj.bng_coordinates:
+                valid.append(obj)
+                continue
+            obj._wgs = None
+            obj._wgs_converted = True
+
+        pairs = bng_to_wgs_pairs(
+            [obj.os_easting for obj in valid],
+            [obj.os_northing for obj in valid]
+        )
+
+        for obj, wgs in zip(valid, pairs):
+            obj._wgs = wgs
+            obj._wgs_converted = True
+
+        return len(valid)
+
     @classmethod
-    def match_locations(cls, search: str) -> list:
-        """Returns a list of matching locations"""
-        ret_val = []
-        for _, obj in cls._instances.items():
-            match = fuzzyfinder(search, [obj.location_code, obj.location_name])
-            if list(match):
-                ret_val.append(obj)
-        return ret_val
+    def locations(cls) -> Iterable:
+        """Return every location, from the image where one is attached"""
+
+        if cls._image is not None:
+            return cls._image.locations()
+
+        return cls._instances.values()
 
     @classmethod
     def return_instance(cls, tiploc: str):
         """Return an instance matching the tiploc passed"""
 
+        if cls._image is not None:
+            return cls._image.location(tiploc)
+
         return cls._instances.get(tiploc, None)
 
     @staticmethod
@@ -116,6 +225,15 @@ class LocationRecord:
     def wgs_coordinates(self) -> tuple:
         """Return WGS [lat, lon] coordinates as a tuple (or None if invalid)"""
 
+        if not self._wgs_converted:
+            self._wgs = self.convert_wgs()
+            self._wgs_converted = True
+
+        return self._wgs
+
+    def convert_wgs(self) -> tuple:
+        """Convert this record's coordinates to WGS [lat, lon] (or None if invalid)"""
+
         bng = self.bng_coordinates
         if not bng:
             return None
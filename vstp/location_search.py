@@ -0,0 +1,211 @@
+"""A prebuilt search index over TIPLOC codes and location names"""
+
+import bisect
+import heapq
+import re
+from typing import List
+
+NON_ALNUM = re.compile(r'[^A-Z0-9 ]')
+MIN_OVERLAP = 0.5  # Share of the query's trigrams needed for a fuzzy match
+
+EXACT = 0
+CODE_PREFIX = 1
+NAME_PREFIX = 2
+WORD_PREFIX = 3
+SUBSTRING = 4
+
+
+def normalise(text: str) -> str:
+    """Upper case, alphanumerics and single spaces only"""
+
+    return ' '.join(NON_ALNUM.sub(' ', str(text).upper()).split())
+
+
+def trigrams(text: str) -> set:
+    """Return the set of trigrams in a (normalised) string"""
+
+    return {text[index:index + 3] for index in range(len(text) - 2)}
+
+
+class LocationSearch:
+    """Trigram and prefix index over location codes and names, ranked results"""
+
+    def __init__(self, records: list = None):
+        """Initialisation"""
+
+        self.records = {}  # code -> record
+        self.texts = {}  # code -> (normalised code, normalised name)
+        self.grams = {}  # trigram -> set of codes
+        self.prefixes = {  # sorted (term, code), for codes, names and words
+            CODE_PREFIX: [],
+            NAME_PREFIX: [],
+            WORD_PREFIX: []
+        }
+        self._last = (None, None)  # last query and its substring matches
+
+        for record in records or []:
+            self.add(record, ordered=False)
+
+        for terms in self.prefixes.values():
+            terms.sort()
+
+    def __len__(self) -> int:
+        """Return the number of records indexed"""
+
+        return len(self.records)
+
+    @staticmethod
+    def terms(code: str, name: str) -> list:
+        """Return the (tier, term) prefix terms for a record"""
+
+        terms = [(CODE_PREFIX, code), (NAME_PREFIX, name)]
+        terms += [(WORD_PREFIX, word) for word in set(name.split()[1:])]
+
+        return [(tier, term) for tier, term in terms if term]
+
+    def add(self, record: object, ordered: bool = True) -> None:
+        """Add (or replace) a record with location_code/location_name attributes,
+        ordered=False defers sorting the prefix terms to the caller"""
+
+        key = record.location_code
+        if key in self.records:
+            self.remove(key)
+
+        code = normalise(key)
+        name = normalise(record.location_name)
+        self.records[key] = record
+        self.texts[key] = (code, name)
+
+        for gram in trigrams(code) | trigrams(name):
+            self.grams.setdefault(gram, set()).add(key)
+
+        for tier, term in self.terms(code, name):
+            if ordered:
+                bisect.insort(self.prefixes[tier], (term, key))
+            else:
+                self.prefixes[tier].append((term, key))
+
+        self._last = (None, None)
+
+    def remove(self, key: str) -> None:
+        """Remove a record from the index, if present"""
+
+        if key not in self.records:
+            return
+
+        code, name = self.texts.pop(key)
+        del self.records[key]
+
+        for gram in trigrams(code) | trigrams(name):
+            self.grams[gram].discard(key)
+            if not self.grams[gram]:
+                del self.grams[gram]
+
+        for tier, term in self.terms(code, name):
+            terms = self.prefixes[tier]
+            index = bisect.bisect_left(terms, (term, key))
+            if index < len(terms) and terms[index] == (term, key):
+                del terms[index]
+
+        self._last = (None, None)
+
+    def prefixed(self, query: str, limit: int = None) -> list:
+        """Return the codes with a code, name or word starting with the query,
+        code matches first, then names, then words; each alphabetically"""
+
+        found = {}
+        for tier in (CODE_PREFIX, NAME_PREFIX, WORD_PREFIX):
+            terms = self.prefixes[tier]
+            index = bisect.bisect_left(terms, (query,))
+            while index < len(terms) and terms[index][0].startswith(query):
+                found.setdefault(terms[index][1], None)
+                if limit is not None and len(found) >= limit:
+                    return list(found)
+                index += 1
+
+        return list(found)
+
+    def containing(self, query: str) -> set:
+        """Return the codes whose code or name contains the query"""
+
+        last_query, last_found = self._last
+        if last_query and query.startswith(last_query):
+            # Typing more only ever narrows the previous matches
+            candidates = last_found
+        else:
+            postings = sorted(
+                (self.grams.get(gram, set()) for gram in trigrams(query)),
+                key=len
+            )
+            if not postings or not postings[0]:
+                self._last = (query, set())
+                return set()
+            candidates = set.intersection(*postings)
+
+        found = {
+            key for key in candidates
+            if query in self.texts[key][0] or query in self.texts[key][1]
+        }
+        self._last = (query, found)
+
+        return found
+
+    def similar(self, query: str) -> dict:
+        """Return codes sharing enough trigrams with the query, with the count"""
+
+        grams = trigrams(query)
+        counts = {}
+        for gram in grams:
+            for key in self.grams.get(gram, ()):
+                counts[key] = counts.get(key, 0) + 1
+
+        needed = max(int(len(grams) * MIN_OVERLAP), 1)
+
+        return {key: count for key, count in counts.items() if count >= needed}
+
+    def rank(self, key: str, query: str) -> int:
+        """Return the rank tier for a code matching the query"""
+
+        code, name = self.texts[key]
+        if code == query:
+            return EXACT
+        if code.startswith(query):
+            return CODE_PREFIX
+        if name.startswith(query):
+            return NAME_PREFIX
+        if any(word.startswith(query) for word in name.split()):
+            return WORD_PREFIX
+
+        return SUBSTRING
+
+    def search(self, query: str, limit: int = None) -> List[object]:
+        """Return the records matching the query, best matches first"""
+
+        query = normalise(query)
+        if not query:
+            return []
+
+        if len(query) < 3:
+            return [self.records[key] for key in self.prefixed(query, limit)]
+
+        found = self.containing(query)
+
+        def order(key: str) -> tuple:
+            return (self.rank(key, query), len(self.texts[key][1]), key)
+
+        if limit is None:
+            ranked = sorted(found, key=order)
+        else:
+            ranked = heapq.nsmallest(limit, found, key=order)
+
+        if limit is None or len(ranked) < limit:
+            fuzzy = self.similar(query)
+            ranked += sorted(
+                (key for key in fuzzy if key not in found),
+                key=lambda key: (-fuzzy[key], len(self.texts[key][1]), key)
+            )
+
+        if limit is not None:
+            ranked = ranked[:limit]
+
+        return [self.records[key] for key in ranked]
@@ -0,0 +1,352 @@
+"""An index of the per-ELR mileage files, for mileage and location lookups
+
+Each file in reference_data/mileage_files holds the features along one ELR,
+a line each: a mileage (miles.chains, sometimes km, ≈ or ? where approximate
+and in brackets where measured off the line) and a description. Mileages are
+held in chains, sorted per ELR, so a lookup by mileage is a binary search;
+locations are found by name through a sorted list of normalised names.
+
+Parsing all the files takes a while, so the index is cached in a binary file
+keyed on hashes of the files, and rebuilt once any of them change.
+"""
+
+import bisect
+import glob
+import marshal
+import os
+import re
+import struct
+from array import array
+from typing import List, NamedTuple, Union
+
+from location_search import normalise
+from snapshot import source_key
+
+MILEAGE_DIR = os.getenv("MILEAGE_DIR", './reference_data/mileage_files')
+MILEAGE_CACHE = os.getenv("MILEAGE_CACHE", 'mileages.bin')
+MAGIC = b'VSTPMILE'
+VERSION = 2
+HEADER = struct.Struct('<8sII')  # magic, version, length of the source key
+
+CHAINS_PER_MILE = 80
+METRES_PER_CHAIN = 20.1168
+
+MILEAGE = re.compile(r"""
+    ^[('(]*
+    (?P<approx>≈)?
+    (?P<value>-?\d+(?:[.,]\d+)?)
+    \s*(?P<km>km)?
+""", re.VERBOSE)
+
+ALIASES = re.compile(r' (formerly|later|same as|also|with) .*$', re.IGNORECASE)
+QUALIFIERS = re.compile(r'\[[^\]]*\]')
+
+
+class Mileage(NamedTuple):
+    """A feature at a mileage on an ELR"""
+
+    elr: str
+    chains: int
+    description: str
+    approximate: bool
+
+    @property
+    def miles(self) -> str:
+        """Return the mileage as miles.chains"""
+
+        return from_chains(self.chains)
+
+
+def to_chains(mileage: Union[str, float]) -> int:
+    """Return a miles.chains mileage (e.g. '24.57' or 24.57) in chains"""
+
+    if not isinstance(mileage, str):
+        mileage = f'{mileage:.2f}'
+
+    negative = mileage.strip().startswith('-')
+    miles, _, chains = mileage.strip().lstrip('-').partition('.')
+    total = int(miles or 0) * CHAINS_PER_MILE + int(chains or 0)
+
+    return -total if negative else total
+
+
+def from_chains(chains: int) -> str:
+    """Return a number of chains as a miles.chains mileage"""
+
+    sign = '-' if chains < 0 else ''
+    miles, chains = divmod(abs(chains), CHAINS_PER_MILE)
+
+    return f'{sign}{miles}.{chains:02d}'
+
+
+def parse_mileage(text: str) -> Union[tuple, None]:
+    """Return the (chains, approximate) of a mileage field, None if there
+    is no mileage"""
+
+    text = text.strip()
+    match = MILEAGE.match(text)
+    if not match:
+        return None
+
+    value = match['value'].replace(',', '.')
+    if match['km']:
+        chains = round(float(value) * 1000 / METRES_PER_CHAIN)
+    else:
+        chains = to_chains(value)
+
+    approximate = bool(match['approx']) or '?' in text or text.startswith('(')
+
+    return chains, approximate
+
+
+def name_key(description: str) -> str:
+    """Return the name a description is found by: the name before any
+    former or later names (or the line a junction is with), less qualifiers
+    such as [1]"""
+
+    return normalise(ALIASES.sub('', QUALIFIERS.sub(' ', description)))
+
+
+def parse_file(f_name: str) -> List[tuple]:
+    """Return the (chains, description, approximate) in a mileage file,
+    sorted by mileage. Notes and lines without a mileage are skipped"""
+
+    entries = []
+    with open(f_name, 'r', encoding='utf-8') as file:
+        for line in file:
+            mileage, tab, description = line.partition('\t')
+            description = description.strip()
+            if not tab or not description:
+                continue
+
+            parsed = parse_mileage(mileage)
+            if parsed is None:
+                continue
+
+            entries.append((parsed[0], description, parsed[1]))
+
+    entries.sort(key=lambda entry: entry[0])
+
+    return entries
+
+
+class MileageIndex:
+    """Sorted mileages per ELR, and the places each name is found"""
+
+    _default = None
+
+    def __init__(self, elrs: dict = None, names: tuple = None):
+        """Initialisation; elrs maps an ELR to its (chains, descriptions,
+        approximate) columns, in mileage order"""
+
+        self.elrs = elrs or {}
+        self.elr_codes = sorted(self.elrs)
+        if names is None:
+            names = self.name_index(self.elrs)
+        self.names, self.name_elrs, self.name_entries = names
+
+    def __len__(self) -> int:
+        """Return the number of features indexed"""
+
+        return sum(len(columns[0]) for columns in self.elrs.values())
+
+    @staticmethod
+    def name_index(elrs: dict) -> tuple:
+        """Return the sorted names, with the ELR (by position) and entry of
+        each"""
+
+        elr_codes = sorted(elrs)
+        keyed = sorted(
+            (name_key(description), elr_ind, entry)
+            for elr_ind, elr in enumerate(elr_codes)
+            for entry, description in enumerate(elrs[elr][1])
+        )
+
+        names = [name for name, _, _ in keyed if name]
+        name_elrs = array('H', (elr_ind for name, elr_ind, _ in keyed if name))
+        name_entries = array('i', (entry for name, _, entry in keyed if name))
+
+        return names, name_elrs, name_entries
+
+    @classmethod
+    def build(cls, directory: str = MILEAGE_DIR) -> object:
+        """Build the index from the mileage files in a directory"""
+
+        elrs = {}
+        for f_name in cls.sources(directory):
+            entries = parse_file(f_name)
+            if not entries:
+                continue
+
+            elr = os.path.splitext(os.path.basename(f_name))[0]
+            elrs[elr] = (
+                array('i', (entry[0] for entry in entries)),
+                [entry[1] for entry in entries],
+                bytes(entry[2] for entry in entries)
+            )
+
+        return cls(elrs)
+
+    @staticmethod
+    def sources(directory: str = MILEAGE_DIR) -> list:
+        """Return the mileage files the index is built from"""
+
+        return sorted(glob.glob(os.path.join(directory, '*.txt')))
+
+    def save(self, f_name: str = MILEAGE_CACHE, sources: list = None) -> None:
+        """Write the index to a binary cache file"""
+
+        key = source_key(sources or []).encode('utf-8')
+        payload = marshal.dumps((
+            {
+                elr: (chains.tobytes(), descriptions, approximate)
+                for elr, (chains, descriptions, approximate) in self.elrs.items()
+            },
+            self.names,
+            self.name_elrs.tobytes(),
+            self.name_entries.tobytes()
+        ))
+
+        temp_name = f'{f_name}.tmp'
+        with open(temp_name, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, len(key)))
+            file.write(key)
+            file.write(payload)
+
+        os.replace(temp_name, f_name)
+
+    @classmethod
+    def read(cls, f_name: str = MILEAGE_CACHE, sources: list = None) -> Union[object, None]:
+        """Return the cached index, or None if missing, stale or unreadable"""
+
+        if not os.path.isfile(f_name):
+            return None
+
+        with open(f_name, 'rb') as file:
+            try:
+                magic, version, key_len = HEADER.unpack(file.read(HEADER.size))
+            except struct.error:
+                return None
+
+            if magic != MAGIC or version != VERSION:
+                return None
+
+            if file.read(key_len).decode('utf-8') != source_key(sources or []):
+                return None
+
+            try:
+                elrs, names, name_elrs, name_entries = marshal.loads(file.read())
+            except (EOFError, ValueError, TypeError):
+                return None
+
+        for elr, (chains, descriptions, approximate) in elrs.items():
+            columns = array('i')
+            columns.frombytes(chains)
+            elrs[elr] = (columns, descriptions, approximate)
+
+        elr_array = array('H')
+        elr_array.frombytes(name_elrs)
+        entry_array = array('i')
+        entry_array.frombytes(name_entries)
+
+        return cls(elrs, (names, elr_array, entry_array))
+
+    @classmethod
+    def load(cls, directory: str = MILEAGE_DIR, f_name: str = MILEAGE_CACHE) -> object:
+        """Return the index from the cache, building (and caching) it from the
+        mileage files where the cache is missing or stale"""
+
+        sources = cls.sources(directory)
+        index = cls.read(f_name, sources)
+        if index is None:
+            index = cls.build(directory)
+            index.save(f_name, sources)
+
+        return index
+
+    @classmethod
+    def default(cls) -> object:
+        """Return the mileage index, loaded once"""
+
+        if cls._default is None:
+            cls._default = cls.load()
+
+        return cls._default
+
+    @classmethod
+    def reset(cls) -> None:
+        """Discard the mileage index, it will be loaded when next needed"""
+
+        cls._default = None
+
+    def entry(self, elr: str, ind: int) -> Mileage:
+        """Return an entry of an ELR, by position"""
+
+        chains, descriptions, approximate = self.elrs[elr]
+
+        return Mileage(elr, chains[ind], descriptions[ind], bool(approximate[ind]))
+
+    def at(self, elr: str, mileage: Union[str, float], tolerance: int = 0) -> List[Mileage]:
+        """Return what is at a mileage (miles.chains) on an ELR, within a
+        tolerance in chains"""
+
+        if elr not in self.elrs:
+            return []
+
+        chains = to_chains(mileage)
+        column = self.elrs[elr][0]
+        start = bisect.bisect_left(column, chains - tolerance)
+        end = bisect.bisect_right(column, chains + tolerance)
+
+        return [self.entry(elr, ind) for ind in range(start, end)]
+
+    def nearest(self, elr: str, mileage: Union[str, float]) -> Union[Mileage, None]:
+        """Return the feature nearest a mileage on an ELR"""
+
+        if elr not in self.elrs:
+            return None
+
+        chains = to_chains(mileage)
+        column = self.elrs[elr][0]
+        ind = bisect.bisect_left(column, chains)
+        candidates = [pos for pos in (ind - 1, ind) if 0 <= pos < len(column)]
+        best = min(candidates, key=lambda pos: abs(column[pos] - chains))
+
+        return self.entry(elr, best)
+
+    def between(self, elr: str, start: Union[str, float], end: Union[str, float]) -> List[Mileage]:
+        """Return the features from one mileage to another on an ELR"""
+
+        if elr not in self.elrs:
+            return []
+
+        column = self.elrs[elr][0]
+        first = bisect.bisect_left(column, to_chains(start))
+        last = bisect.bisect_right(column, to_chains(end))
+
+        return [self.entry(elr, ind) for ind in range(first, last)]
+
+    def locate(self, name: str) -> List[Mileage]:
+        """Return the places a location is found, by name"""
+
+        return self.prefixed(name, exact=True)
+
+    def prefixed(self, prefix: str, limit: int = None, exact: bool = False) -> List[Mileage]:
+        """Return the places whose name starts with the prefix (or, exact,
+        is the name)"""
+
+        key = normalise(prefix)
+        if not key:
+            return []
+
+        found = []
+        ind = bisect.bisect_left(self.names, key)
+        while ind < len(self.names) and self.names[ind].startswith(key):
+            if exact and self.names[ind] != key:
+                break  # The exact matches sort first
+            found.append(self.entry(self.elr_codes[self.name_elrs[ind]], self.name_entries[ind]))
+            if limit and len(found) >= limit:
+                break
+            ind += 1
+
+        return found
@@ -0,0 +1,131 @@
+"""Bulk loading of rows into a table, as chunked executemany INSERTs"""
+
+import os
+import time
+from typing import Iterable
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", 10000))
+
+# Safe for a load that can simply be re-run, not for general use
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode = MEMORY',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -65536'  # KiB
+)
+
+# Restored after the load, so a pooled connection does not carry the loading
+# pragmas into later updates
+DURABILITY_PRAGMAS = ('journal_mode', 'synchronous')
+
+
+def tune_sqlite(connection: object) -> tuple:
+    """Apply the loading pragmas, where the database is SQLite. Returns the
+    durability pragmas they replaced, for restore_sqlite"""
+
+    if connection.dialect.name != 'sqlite':
+        return ()
+
+    previous = tuple(
+        f'PRAGMA {name} = {connection.exec_driver_sql(f"PRAGMA {name}").scalar()}'
+        for name in DURABILITY_PRAGMAS
+    )
+
+    for pragma in SQLITE_PRAGMAS:
+        connection.exec_driver_sql(pragma)
+
+    # A 2.0 style connection begins a transaction on first use
+    if connection.in_transaction():
+        connection.commit()
+
+    return previous
+
+
+def restore_sqlite(connection: object, pragmas: tuple) -> None:
+    """Restore the durability pragmas tune_sqlite replaced"""
+
+    for pragma in pragmas:
+        connection.exec_driver_sql(pragma)
+
+    if connection.in_transaction():
+        connection.commit()
+
+
+def bulk_load(
+        engine: object,
+        table: object,
+        rows: Iterable,
+        chunk_size: int = BULK_CHUNK_SIZE) -> dict:
+    """Insert the rows (dicts, or objects with an attribute per column) into
+    the table (or SQLModel class) in a single transaction, chunk_size rows per
+    executemany. Rows that are None, or missing a NOT NULL value, are skipped.
+    Returns a report of the rows loaded and the rate"""
+
+    table = getattr(table, '__table__', table)
+    primary = {column.name for column in table.primary_key.columns}
+    columns = [column.name for column in table.columns if column.name not in primary]
+    required = [
+        column.name for column in table.columns
+        if column.name not in primary and not column.nullable
+        and column.default is None and column.server_default is None
+    ]
+
+    statement = table.insert()
+    inserted = 0
+    skipped = 0
+    started = time.perf_counter()
+
+    with engine.connect() as connection:
+        previous = tune_sqlite(connection)
+
+        try:
+            with connection.begin():
+                chunk = []
+                for obj in rows:
+                    if obj is None:
+                        skipped += 1
+                        continue
+
+                    if isinstance(obj, dict):
+                        row = obj
+                    else:
+                        row = {column: getattr(obj, column, None) for column in columns}
+
+                    if any(row.get(column) is None for column in required):
+                        skipped += 1
+                        continue
+
+                    chunk.append(row)
+                    if len(chunk) >= chunk_size:
+                        connection.execute(statement, chunk)
+                        inserted += len(chunk)
+                        chunk = []
+
+                if chunk:
+                    connection.execute(statement, chunk)
+                    inserted += len(chunk)
+        finally:
+            restore_sqlite(connection, previous)
+
+    seconds = time.perf_counter() - started
+
+    return {
+        'table': table.name,
+        'rows': inserted,
+        'skipped': skipped,
+        'seconds': seconds,
+        'rows_per_second': inserted / seconds if seconds else 0.0
+    }
+
+
+def format_report(report: dict) -> str:
+    """Return the load report as a line of text"""
+
+    line = f"{report['table']}: {report['rows']} rows in {report['seconds']:.2f}s "
+    line += f"({report['rows_per_second']:.0f} rows/s)"
+    if report['skipped']:
+        line += f", {report['skipped']} skipped"
+    if report.get('rejected'):
+        line += f", {len(report['rejected'])} rejected"
+
+    return line
@@ -0,0 +1,146 @@
+"""Vectorised OSGB36 (easting/northing) to WGS84 (lat/lon) conversion
+
+A NumPy port of bng_latlon.OSGB36toWGS84, so that every LOC coordinate
+can be converted in a single pass rather than one point at a time, and the
+matching great circle and planar distances between arrays of points.
+"""
+
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+# The Airy 1830 semi-major and semi-minor axes used for OSGB36 (m)
+AIRY_A, AIRY_B = 6377563.396, 6356256.909
+F0 = 0.9996012717  # Scale factor on the central meridian
+LAT0 = np.radians(49)  # Latitude of true origin
+LON0 = np.radians(-2)  # Longitude of central meridian
+N0, E0 = -100000, 400000  # Northing & easting of true origin (m)
+
+# The GRS80 semi-major and semi-minor axes used for WGS84 (m)
+GRS80_A, GRS80_B = 6378137.000, 6356752.3141
+
+# Helmert transform, Airy 1830 to GRS80
+HELMERT_S = -20.4894 * 10 ** -6
+HELMERT_T = (446.448, -125.157, 542.060)
+HELMERT_R = tuple(np.radians(sec / 3600) for sec in (0.1502, 0.2470, 0.8421))
+
+MAX_ITERATIONS = 100
+
+EARTH_RADIUS = 6371008.8  # Mean earth radius (m), as used by haversine
+
+
+def bng_to_wgs(eastings: Iterable, northings: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+    """Convert arrays of eastings/northings, return arrays of lat and lon (degrees)"""
+
+    east = np.asarray(eastings, dtype=np.float64)
+    north = np.asarray(northings, dtype=np.float64)
+
+    e2 = 1 - (AIRY_B * AIRY_B) / (AIRY_A * AIRY_A)
+    n = (AIRY_A - AIRY_B) / (AIRY_A + AIRY_B)
+
+    lat = np.full(east.shape, LAT0)
+    meridional = np.zeros(east.shape)
+
+    # Iterate the meridional arc until accurate to 0.01mm
+    for _ in range(MAX_ITERATIONS):
+        todo = north - N0 - meridional >= 0.00001
+        if not todo.any():
+            break
+        lat = np.where(todo, (north - N0 - meridional) / (AIRY_A * F0) + lat, lat)
+        m_1 = (1 + n + (5 / 4) * n ** 2 + (5 / 4) * n ** 3) * (lat - LAT0)
+        m_2 = (3 * n + 3 * n ** 2 + (21 / 8) * n ** 3) * np.sin(lat - LAT0) * np.cos(lat + LAT0)
+        m_3 = ((15 / 8) * n ** 2 + (15 / 8) * n ** 3) * np.sin(2 * (lat - LAT0)) * np.cos(2 * (lat + LAT0))
+        m_4 = (35 / 24) * n ** 3 * np.sin(3 * (lat - LAT0)) * np.cos(3 * (lat + LAT0))
+        meridional = np.where(todo, AIRY_B * F0 * (m_1 - m_2 + m_3 - m_4), meridional)
+
+    sin_lat = np.sin(lat)
+    tan_lat = np.tan(lat)
+    nu = AIRY_A * F0 / np.sqrt(1 - e2 * sin_lat ** 2)
+    rho = AIRY_A * F0 * (1 - e2) * (1 - e2 * sin_lat ** 2) ** (-1.5)
+    eta2 = nu / rho - 1
+
+    sec_lat = 1 / np.cos(lat)
+    vii = tan_lat / (2 * rho * nu)
+    viii = tan_lat / (24 * rho * nu ** 3) * (5 + 3 * tan_lat ** 2 + eta2 - 9 * tan_lat ** 2 * eta2)
+    ix = tan_lat / (720 * rho * nu ** 5) * (61 + 90 * tan_lat ** 2 + 45 * tan_lat ** 4)
+    x = sec_lat / nu
+    xi = sec_lat / (6 * nu ** 3) * (nu / rho + 2 * tan_lat ** 2)
+    xii = sec_lat / (120 * nu ** 5) * (5 + 28 * tan_lat ** 2 + 24 * tan_lat ** 4)
+    xiia = sec_lat / (5040 * nu ** 7) * (
+        61 + 662 * tan_lat ** 2 + 1320 * tan_lat ** 4 + 720 * tan_lat ** 6)
+    d_e = east - E0
+
+    # Still on the Airy 1830 ellipsoid
+    lat_1 = lat - vii * d_e ** 2 + viii * d_e ** 4 - ix * d_e ** 6
+    lon_1 = LON0 + x * d_e - xi * d_e ** 3 + xii * d_e ** 5 - xiia * d_e ** 7
+
+    # To cartesian, then Helmert transform to GRS80
+    x_1 = (nu / F0) * np.cos(lat_1) * np.cos(lon_1)
+    y_1 = (nu / F0) * np.cos(lat_1) * np.sin(lon_1)
+    z_1 = ((1 - e2) * nu / F0) * np.sin(lat_1)
+
+    t_x, t_y, t_z = HELMERT_T
+    r_x, r_y, r_z = HELMERT_R
+    x_2 = t_x + (1 + HELMERT_S) * x_1 - r_z * y_1 + r_y * z_1
+    y_2 = t_y + r_z * x_1 + (1 + HELMERT_S) * y_1 - r_x * z_1
+    z_2 = t_z - r_y * x_1 + r_x * y_1 + (1 + HELMERT_S) * z_1
+
+    # Back to spherical polar coordinates on GRS80
+    e2_2 = 1 - (GRS80_B * GRS80_B) / (GRS80_A * GRS80_A)
+    p = np.sqrt(x_2 ** 2 + y_2 ** 2)
+
+    lat = np.arctan2(z_2, p * (1 - e2_2))
+    lat_old = np.full(lat.shape, 2 * np.pi)
+    for _ in range(MAX_ITERATIONS):
+        todo = np.abs(lat - lat_old) > 10 ** -16
+        if not todo.any():
+            break
+        lat, lat_old = np.where(todo, lat_old, lat), lat
+        nu_2 = GRS80_A / np.sqrt(1 - e2_2 * np.sin(lat_old) ** 2)
+        lat = np.where(todo, np.arctan2(z_2 + e2_2 * nu_2 * np.sin(lat_old), p), lat)
+
+    lon = np.arctan2(y_2, x_2)
+
+    return np.degrees(lat), np.degrees(lon)
+
+
+def bng_to_wgs_pairs(eastings: Iterable, northings: Iterable) -> List[tuple]:
+    """Convert eastings/northings, return a list of rounded (lat, lon) tuples,
+    matching the output of bng_latlon.OSGB36toWGS84"""
+
+    lats, lons = bng_to_wgs(eastings, northings)
+
+    return [
+        (round(lat, 6), round(lon, 6))
+        for lat, lon in zip(lats.tolist(), lons.tolist())
+    ]
+
+
+def haversine_metres(lats_1: Iterable, lons_1: Iterable, lats_2: Iterable, lons_2: Iterable) -> np.ndarray:
+    """Return the great circle distances (m) between arrays of WGS84 points,
+    matching haversine.haversine"""
+
+    lat_1, lon_1, lat_2, lon_2 = (
+        np.radians(np.asarray(values, dtype=np.float64))
+        for values in (lats_1, lons_1, lats_2, lons_2)
+    )
+
+    d = (
+        np.sin((lat_2 - lat_1) / 2) ** 2
+        + np.cos(lat_1) * np.cos(lat_2) * np.sin((lon_2 - lon_1) / 2) ** 2
+    )
+
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(d))
+
+
+def planar_metres(
+        eastings_1: Iterable,
+        northings_1: Iterable,
+        eastings_2: Iterable,
+        northings_2: Iterable) -> np.ndarray:
+    """Return the straight line distances (m) between arrays of OSGB36 points"""
+
+    return np.hypot(
+        np.asarray(eastings_2, dtype=np.float64) - np.asarray(eastings_1, dtype=np.float64),
+        np.asarray(northings_2, dtype=np.float64) - np.asarray(northings_1, dtype=np.float64)
+    )
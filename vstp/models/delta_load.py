@@ -0,0 +1,148 @@
+"""Applies a BPLAN update file to the database tables, in place
+
+A(dd) and C(hange) records update the row with the same natural key (the
+model's BPLAN_KEY), inserting it if there is none; D(elete) records delete
+it. Records are validated as for a bulk load, without building model objects,
+and applied in file order in a single transaction.
+"""
+
+import os
+import time
+
+from sqlalchemy import and_, bindparam
+from sqlmodel import SQLModel, create_engine
+from fast_validate import bplan_values, format_rejects, validate_chunk
+from location import Location
+from network_link import NetworkLink
+from timing_link import TimingLink
+from timing_load import TimingLoad
+
+DB_CON_STRING = os.getenv("DB_CON_STRING", 'sqlite:///vstp.db')
+DELTA_FILE = os.getenv("DELTA_FILE", 'BPLAN_DELTA')
+
+MODELS = {
+    'LOC': Location,
+    'NWK': NetworkLink,
+    'TLK': TimingLink,
+    'TLD': TimingLoad
+}
+
+ACTIONS = ('A', 'C', 'D')
+
+
+class Statements:
+    """The keyed UPDATE and DELETE, and the INSERT, for a model's table"""
+
+    def __init__(self, model: type):
+        """Initialisation"""
+
+        self.table = model.__table__
+        self.key = model.BPLAN_KEY
+
+        # IS rather than =, as some key columns are nullable
+        where = and_(*(
+            self.table.c[column].is_not_distinct_from(bindparam(f'key_{column}'))
+            for column in self.key
+        ))
+        self.update = self.table.update().where(where)
+        self.delete = self.table.delete().where(where)
+        self.insert = self.table.insert()
+
+    def key_params(self, row: dict) -> dict:
+        """Return the bound key values for a row"""
+
+        return {f'key_{column}': row[column] for column in self.key}
+
+
+def apply_delta(
+        engine: object,
+        f_name: str = DELTA_FILE,
+        record_types: tuple = tuple(MODELS)) -> dict:
+    """Apply the records of an update file to their tables. Returns a count
+    of the rows inserted, updated and deleted by record type, the deletes not
+    found, and the records rejected by validation"""
+
+    statements = {record_type: Statements(MODELS[record_type]) for record_type in record_types}
+    counts = {
+        record_type: {'inserted': 0, 'updated': 0, 'deleted': 0, 'not_found': 0}
+        for record_type in record_types
+    }
+    rejects = []
+    started = time.perf_counter()
+
+    with engine.connect() as connection:
+        with connection.begin(), open(f_name, 'r', encoding='utf-8') as file:
+            for number, line in enumerate(file, start=1):
+                record_type = line[:3]
+                if record_type not in statements:
+                    continue
+
+                model = MODELS[record_type]
+                action = line.split('\t', 2)[1].strip().upper() if '\t' in line else ''
+                values = bplan_values(model, line)
+                if action not in ACTIONS or values is None:
+                    rejects.append({
+                        'line': number,
+                        'text': line.rstrip('\n'),
+                        'errors': {'*': 'unknown action or wrong number of fields'}
+                    })
+                    continue
+
+                valid, failed = validate_chunk(model, [values])
+                if failed:
+                    rejects.append({
+                        'line': number,
+                        'text': line.rstrip('\n'),
+                        'errors': failed[0][1]
+                    })
+                    continue
+
+                row = valid[0]
+                stmts = statements[record_type]
+                count = counts[record_type]
+                params = stmts.key_params(row)
+
+                if action == 'D':
+                    result = connection.execute(stmts.delete, params)
+                    count['deleted' if result.rowcount else 'not_found'] += 1
+                    continue
+
+                result = connection.execute(stmts.update, {**row, **params})
+                if result.rowcount:
+                    count['updated'] += 1
+                else:
+                    connection.execute(stmts.insert, row)
+                    count['inserted'] += 1
+
+    return {
+        'counts': counts,
+        'rejected': rejects,
+        'seconds': time.perf_counter() - started
+    }
+
+
+def format_report(report: dict) -> str:
+    """Return the delta report as text, a line per record type"""
+
+    lines = []
+    for record_type, count in report['counts'].items():
+        lines.append(
+            f"{record_type}: {count['inserted']} inserted, {count['updated']} updated, "
+            f"{count['deleted']} deleted, {count['not_found']} not found"
+        )
+    lines.append(f"{report['seconds']:.2f}s")
+    if report['rejected']:
+        lines.append(format_rejects(report['rejected']))
+
+    return '\n'.join(lines)
+
+
+def main():
+    """Entry point if running module"""
+    engine = create_engine(DB_CON_STRING, echo=False)
+    SQLModel.metadata.create_all(engine)
+
+    print(format_report(apply_delta(engine, DELTA_FILE)))
+
+if __name__ == "__main__":
+    main()
@@ -4,20 +4,36 @@
 
 import os
 import re
-from typing import Optional, Union
+import time
+from typing import Iterable, Iterator, Optional, Union
 import pydantic
+from sqlalchemy import Index, text
 from sqlmodel import Field, Session, SQLModel, create_engine
+from bulk_load import bulk_load, format_report
+from queries import create_schema
 
 DB_CON_STRING = os.getenv("DB_CON_STRING", 'sqlite:///vstp.db')
 ELR_MAPPING = os.getenv("ELR_MAPPING", './reference_data/elr_mapping.csv')
 ELR_REFERENCE = os.getenv("ELR_REFERENCE", './reference_data/elr_references.csv')
 PRIDE_LOR_CODES = os.getenv("PRIDE_LOR_CODES", './reference_data/pride_lor_codes.csv')
 
+UPDATE_LOR = text("""
+    UPDATE engineerslineref
+    SET lor_reference = :lor_reference,
+        lor_name = :lor_name,
+        ra_value = :ra_value
+    WHERE elr = :key_elr
+""")
+
 class EngineersLineRef(SQLModel, table=True):
     """Representation of an Engineers Line Reference Record"""
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
+    __table_args__ = (
+        Index('ix_engineerslineref_elr', 'elr'),
+    )
+
     elr: str = pydantic.Field(
         title='ELR Code',
         min_length=3,
@@ -226,62 +242,88 @@ class ELRMapping(pydantic.BaseModel):
 
         return cls(**val_dict)
 
-def get_elr_mapping() -> list:
-    """Parse the CSV, create a list of ELRMapping objects"""
+def get_elr_mapping() -> Iterator[ELRMapping]:
+    """Parse the CSV, yield ELRMapping objects"""
 
     with open(ELR_MAPPING, 'r', encoding='utf-8') as file:
-        return [ELRMapping.factory(line)
-                for line in file.readlines() if 'no ELR' not in line]
+        for line in file:
+            if 'no ELR' not in line:
+                yield ELRMapping.factory(line)
 
 def get_pride_lor() -> list:
     """Parse the CSV, create a list of LORPride objects"""
 
     with open(PRIDE_LOR_CODES, 'r', encoding='utf-8') as file:
-        return [LORPride.factory(line) for line in file.readlines()]
-
-def update_lor(session: Session) -> None:
-    """Update ELR with LOR"""
-
-    pride_lor = get_pride_lor()
-    mapping = get_elr_mapping()
-
-    def return_lor(code: str) -> Union[LORPride, None]:
-        """Return None or the LORPride object"""
-        for obj in pride_lor:
-            if obj.code == code:
-                return obj
-        return None
-
-    for item in mapping:
-        lor = return_lor(item.code)
-        stmt = f"""
-        UPDATE engineerslineref
-        SET lor_reference = "{lor.code}",
-            lor_name = "{lor.name}",
-            ra_value = {lor.ra_value}
-        WHERE
-            elr = "{item.elr}";
-        """.strip()
-
-        session.execute(stmt)
-
+        return [LORPride.factory(line) for line in file]
+
+def lor_index(records: Iterable) -> dict:
+    """Return the LORPride records keyed on code; where a code appears more
+    than once, the first is kept"""
+
+    index = {}
+    for obj in records:
+        if obj is not None:
+            index.setdefault(obj.code, obj)
+
+    return index
+
+def update_lor(session: Session) -> dict:
+    """Update ELR with LOR, as a single executemany UPDATE. Returns the
+    mappings applied, the LOR codes not found and the seconds taken"""
+
+    started = time.perf_counter()
+    pride_lor = lor_index(get_pride_lor())
+
+    params = []
+    missing = []
+    for item in get_elr_mapping():
+        if item is None:
+            continue
+        lor = pride_lor.get(item.code)
+        if lor is None:
+            missing.append(item.code)
+            continue
+        params.append({
+            'lor_reference': lor.code,
+            'lor_name': lor.name,
+            'ra_value': lor.ra_value,
+            'key_elr': item.elr
+        })
+
+    if params:
+        session.execute(UPDATE_LOR, params)
     session.commit()
 
-def main():
-    """Entry point if running module"""
-    engine = create_engine(DB_CON_STRING, echo=False)
-    session = Session(engine)
-    SQLModel.metadata.create_all(engine)
+    return {
+        'applied': len(params),
+        'missing': missing,
+        'seconds': time.perf_counter() - started
+    }
+
+def parse_elr_reference() -> Iterator[EngineersLineRef]:
+    """Parse the CSV, yield EngineersLineRef objects"""
 
     with open(ELR_REFERENCE, 'r', encoding='utf-8') as file:
-        for line in file.readlines():
+        for line in file:
             try:
-                session.add(EngineersLineRef.factory(line))
+                yield EngineersLineRef.factory(line)
             except pydantic.ValidationError as err:
                 print(f"Skipped: {line}\n\t{err}")
 
-    session.commit()
-    update_lor(session)
+def main():
+    """Entry point if running module"""
+    engine = create_engine(DB_CON_STRING, echo=False)
+    create_schema(engine, [EngineersLineRef])
+
+    print(format_report(bulk_load(engine, EngineersLineRef, parse_elr_reference())))
+
+    with Session(engine) as session:
+        report = update_lor(session)
+
+    print(
+        f"LOR: {report['applied']} mappings applied in {report['seconds']:.2f}s, "
+        f"{len(report['missing'])} LOR codes not found"
+    )
 
 if __name__ == "__main__":
     main()
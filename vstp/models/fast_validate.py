@@ -0,0 +1,265 @@
+"""Chunked validation of BPLAN rows, without building model objects
+
+bplan_factory validates a row by building the model, then validating it again
+(see https://github.com/tiangolo/sqlmodel/issues/52). For a bulk load, rows are
+instead checked a chunk at a time, column by column: each field runs the
+model's own pre validators, then its length and regex constraints, compiled
+once per model. Rows that fail are collected as rejects rather than raising,
+and the rows that pass are plain dicts, ready for bulk_load.
+
+The field checks read pydantic v1 internals. With any other version of
+pydantic, each row is instead validated by building the model.
+"""
+
+import json
+import os
+import re
+from collections import Counter
+from typing import Iterable, Iterator, Union
+
+import pydantic
+from bulk_load import bulk_load, BULK_CHUNK_SIZE
+
+VALIDATE_CHUNK_SIZE = int(os.getenv("VALIDATE_CHUNK_SIZE", 10000))
+REJECT_FILE = os.getenv("REJECT_FILE", None)  # JSON lines, as import_metrics
+PYDANTIC_V1 = pydantic.VERSION.startswith('1.')  # FieldRule needs its internals
+
+_RULES = {}  # Model -> [FieldRule, ...]
+
+
+def bplan_values(model: type, bplan_line: str) -> Union[dict, None]:
+    """Return the model's field values from a BPLAN line, None for a blank
+    line or one with the wrong number of fields"""
+
+    if not bplan_line.strip():
+        return None
+
+    values = bplan_line.split('\t')
+    if not len(values) == model.BPLAN_LENGTH:
+        return None
+
+    return {name: values[index] for name, index in model.BPLAN_FIELDS.items()}
+
+
+class FieldRule:
+    """The checks pydantic makes on one (string) field, compiled once"""
+
+    def __init__(self, model: type, name: str):
+        """Initialisation"""
+
+        field = model.__fields__[name]
+        info = field.field_info
+
+        self.model = model
+        self.name = name
+        self.field = field
+        self.pre_validators = list(field.pre_validators or [])
+        self.allow_none = field.allow_none
+        self.min_length = info.min_length
+        self.max_length = info.max_length
+        self.pattern = re.compile(info.regex) if info.regex else None
+
+        # Anything beyond pre validators and constraints is left to pydantic
+        self.fallback = bool(field.post_validators) or any(
+            not validator.pre for validator in field.class_validators.values()
+        )
+
+    def check(self, value: object, values: dict) -> tuple:
+        """Return the validated value and an error message (None if valid)"""
+
+        if self.fallback:
+            value, errors = self.field.validate(value, values, loc=self.name, cls=self.model)
+            if errors:
+                return value, str(getattr(errors, 'exc', errors))
+            return value, None
+
+        try:
+            for validator in self.pre_validators:
+                value = validator(self.model, value, values, self.field, self.model.__config__)
+        except (ValueError, TypeError, AssertionError) as err:
+            return value, str(err)
+
+        if value is None:
+            if self.allow_none:
+                return None, None
+            return value, 'none is not an allowed value'
+
+        if not isinstance(value, str):
+            return value, 'str type expected'
+
+        if self.min_length is not None and len(value) < self.min_length:
+            return value, f'ensure this value has at least {self.min_length} characters'
+
+        if self.max_length is not None and len(value) > self.max_length:
+            return value, f'ensure this value has at most {self.max_length} characters'
+
+        # pydantic v1 matches from the start of the string, as re.match does
+        if self.pattern and not self.pattern.match(value):
+            return value, f'string does not match regex "{self.pattern.pattern}"'
+
+        return value, None
+
+
+def field_rules(model: type) -> list:
+    """Return the compiled rules for the model's BPLAN fields"""
+
+    if model not in _RULES:
+        _RULES[model] = [FieldRule(model, name) for name in model.BPLAN_FIELDS]
+
+    return _RULES[model]
+
+
+def validate_rows(model: type, rows: list) -> tuple:
+    """Validate a chunk of row dicts a row at a time, by building the model;
+    returns the same as validate_chunk"""
+
+    validate = getattr(model, 'model_validate', None) or model.validate
+    valid = []
+    errors = []
+    for ind, row in enumerate(rows):
+        try:
+            obj = validate(row)
+        except pydantic.ValidationError as err:
+            errors.append((ind, {
+                str(error['loc'][0]) if error['loc'] else '*': error['msg']
+                for error in err.errors()
+            }))
+            continue
+        valid.append({name: getattr(obj, name) for name in row})
+
+    return valid, errors
+
+
+def validate_chunk(model: type, rows: list) -> tuple:
+    """Validate a chunk of row dicts column by column; returns the valid rows
+    (values as validated) and the (position, errors) of each rejected row"""
+
+    if not PYDANTIC_V1:
+        return validate_rows(model, rows)
+
+    errors = {}
+    for rule in field_rules(model):
+        for ind, row in enumerate(rows):
+            value, error = rule.check(row[rule.name], row)
+            row[rule.name] = value
+            if error:
+                errors.setdefault(ind, {})[rule.name] = error
+
+    valid = [row for ind, row in enumerate(rows) if ind not in errors]
+
+    return valid, sorted(errors.items())
+
+
+def validate_lines(
+        model: type,
+        lines: Iterable,
+        chunk_size: int = VALIDATE_CHUNK_SIZE,
+        rejects: list = None) -> Iterator[dict]:
+    """Yield a dict of validated values for each valid BPLAN line, checking
+    chunk_size lines at a time. Blank lines are ignored; each line that fails
+    is appended to rejects as a dict of its line number, text and errors"""
+
+    if rejects is None:
+        rejects = []
+
+    chunk, numbers, texts, short = [], [], [], []
+
+    def flush() -> list:
+        """Validate the chunk, recording its rejects in line order"""
+
+        valid, failed = validate_chunk(model, chunk)
+        failed = short + [
+            {'line': numbers[ind], 'text': texts[ind], 'errors': errors}
+            for ind, errors in failed
+        ]
+        rejects.extend(sorted(failed, key=lambda reject: reject['line']))
+        short.clear()
+        chunk.clear()
+        numbers.clear()
+        texts.clear()
+        return valid
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+
+        values = bplan_values(model, line)
+        if values is None:
+            short.append({
+                'line': number,
+                'text': line.rstrip('\n'),
+                'errors': {'*': f'expected {model.BPLAN_LENGTH} fields'}
+            })
+            continue
+
+        chunk.append(values)
+        numbers.append(number)
+        texts.append(line.rstrip('\n'))
+
+        if len(chunk) >= chunk_size:
+            yield from flush()
+
+    if chunk or short:
+        yield from flush()
+
+
+def load_bplan(
+        engine: object,
+        model: type,
+        f_name: str,
+        chunk_size: int = BULK_CHUNK_SIZE,
+        reject_file: str = REJECT_FILE) -> dict:
+    """Validate a BPLAN record file a chunk at a time and bulk load the rows
+    that pass. Returns the load report, with the rejected rows; these are
+    also written to reject_file, if given"""
+
+    rejects = []
+    with open(f_name, 'r', encoding='utf-8') as file:
+        report = bulk_load(
+            engine,
+            model,
+            validate_lines(model, file, chunk_size, rejects),
+            chunk_size
+        )
+
+    report['rejected'] = rejects
+    if reject_file:
+        write_rejects(rejects, reject_file)
+
+    return report
+
+
+def write_rejects(rejects: list, f_name: str) -> int:
+    """Write the rejected rows as JSON lines, in the form the vstp imports
+    write them (import_metrics.ImportMetrics.write_rejects); returns the count"""
+
+    with open(f_name, 'w', encoding='utf-8') as file:
+        for reject in rejects:
+            file.write(json.dumps({
+                'record_type': reject['text'][:3],
+                'reason': '; '.join(
+                    f'{field}: {error}' for field, error in reject['errors'].items()
+                ),
+                'record': reject['text']
+            }) + '\n')
+
+    return len(rejects)
+
+
+def format_rejects(rejects: list, limit: int = 10) -> str:
+    """Return the rejected rows as text, a count by field then the first
+    few rows"""
+
+    if not rejects:
+        return 'No rows rejected'
+
+    by_field = Counter(field for reject in rejects for field in reject['errors'])
+    lines = [f'{len(rejects)} rows rejected']
+    for field, count in by_field.most_common():
+        lines.append(f'\t{field}: {count}')
+
+    for reject in rejects[:limit]:
+        errors = '; '.join(f'{field}: {error}' for field, error in reject['errors'].items())
+        lines.append(f"\tline {reject['line']}: {errors}")
+
+    return '\n'.join(lines)
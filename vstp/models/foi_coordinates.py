@@ -3,11 +3,14 @@
 # pylint: disable=E0401
 
 import os
+from typing import Iterator
 
 import location as LOC
+import queries
+import reconcile
 import pydantic
 from bng_latlon import OSGB36toWGS84 as conv
-from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel import SQLModel, create_engine
 
 DB_CON_STRING = os.getenv("DB_CON_STRING", 'sqlite:///vstp.db')
 FOI_FILE = os.getenv("FOI_FILE", 'FOI_easting_northing.csv')
@@ -79,62 +82,26 @@ class FOICoordinates(SQLModel):
 
         return cls(**val_dict)
 
-def parse_foi_file() -> list:
-    """Parse the FOI file, return a list of objects"""
+def parse_foi_file() -> Iterator[FOICoordinates]:
+    """Parse the FOI file, yield an object per line"""
 
     with open(FOI_FILE, 'r', encoding='utf-8') as csv:
-        return [FOICoordinates.csv_factory(line) for line in csv.readlines()]
-
-def match_location(tiploc: str, session: Session) -> LOC.Location:
-    """Return a matching location object, based on TIPLOC"""
-
-    stmt = select(
-        LOC.Location
-    ).where(
-        LOC.Location.tiploc == tiploc
-    )
-
-    return session.execute(stmt).fetchone()
+        for line in csv:
+            yield FOICoordinates.csv_factory(line)
 
 def main():
-    """Parse the FOI file and update the database"""
+    """Parse the FOI file and update the database, filling in any missing
+    coordinates and adding the TIPLOCs not held"""
 
     engine = create_engine(DB_CON_STRING, echo=False)
-    with Session(engine) as session:
-        for coord in parse_foi_file():
-            match = match_location(coord.tiploc, session)
-            if not match:
-                new = LOC.Location(
-                    tiploc=coord.tiploc,
-                    easting=coord.easting,
-                    northing=coord.northing,
-                    name=coord.name,
-                    tp_type='O',
-                    zone='0',
-                    off_network='N'
-                )
-                session.add(new)
-                continue
-            
-            if match[0].easting == '999999':
-                match[0].easting = None
-                
-            if match[0].northing == '999999':
-                match[0].northing = None
-                
-            if not match[0].easting:
-                match[0].easting = coord.easting
-                
-            if not match[0].northing:
-                match[0].northing = coord.northing
-                
-            # if not match[0].easting == coord.easting:
-            #     match[0].easting = coord.easting
-
-            # if not match[0].northing == coord.northing:
-            #     match[0].northing = coord.northing
-
-        session.commit()
+    queries.create_schema(engine, [LOC.Location])
+    report = reconcile.reconcile(
+        engine,
+        parse_foi_file(),
+        reconcile.fill,
+        insert_unmatched=True
+    )
+    print(reconcile.format_report(report))
 
 if __name__ == '__main__':
     main()
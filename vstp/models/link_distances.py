@@ -0,0 +1,175 @@
+"""Column-wise recomputation of the networklink distances
+
+Every link is joined to the coordinates of its origin and destination in a
+single query, and the columns are taken into NumPy arrays. The distances
+between the ends of all the links are computed at once - great circle
+(geodesic, through one vectorised OSGB36 to WGS84 conversion) or straight
+line on the national grid (planar) - and compared with the recorded
+distances. A link is an outlier where it has no recorded distance, or where
+the recorded distance is shorter than the distance between its ends by more
+than the allowed slack (for the precision of the coordinates). The
+outliers' distances are corrected with one executemany UPDATE, keyed on id.
+"""
+
+import os
+import time
+
+import numpy as np
+from sqlalchemy import text
+from coordinates import bng_to_wgs, haversine_metres, planar_metres
+from location import EAST_L, EAST_U, NORTH_L, NORTH_U
+
+DISTANCE_METHOD = os.getenv("DISTANCE_METHOD", 'geodesic')  # geodesic or planar
+DISTANCE_SLACK = float(os.getenv("DISTANCE_SLACK", 200))  # Metres
+DISTANCE_TOLERANCE = float(os.getenv("DISTANCE_TOLERANCE", 0.1))  # Fraction of the distance
+MAX_DISTANCE = 99999  # The most the five digit distance field can hold
+
+# The first location of each TIPLOC, as queries.location_by_tiploc
+LINKS = text("""
+    SELECT networklink.id, networklink.origin, networklink.destination,
+           networklink.distance,
+           CAST(networklink.distance AS REAL),
+           CAST(origin.easting AS REAL), CAST(origin.northing AS REAL),
+           CAST(destination.easting AS REAL), CAST(destination.northing AS REAL)
+    FROM networklink
+    JOIN location AS origin ON origin.id = (
+        SELECT MIN(id) FROM location WHERE tiploc = networklink.origin
+    )
+    JOIN location AS destination ON destination.id = (
+        SELECT MIN(id) FROM location WHERE tiploc = networklink.destination
+    )
+    ORDER BY networklink.id
+""")
+
+UPDATE = text("""
+    UPDATE networklink SET distance = :distance WHERE id = :id
+""")
+
+
+def valid_coordinates(eastings: np.ndarray, northings: np.ndarray) -> np.ndarray:
+    """Return True where the easting/northing is valid, as
+    Location.are_coords_valid"""
+
+    return (
+        (eastings >= EAST_L) & (eastings < EAST_U)
+        & (northings >= NORTH_L) & (northings < NORTH_U)
+    )
+
+
+def distances(
+        origin_e: np.ndarray,
+        origin_n: np.ndarray,
+        dest_e: np.ndarray,
+        dest_n: np.ndarray,
+        method: str = DISTANCE_METHOD) -> np.ndarray:
+    """Return the distances (m) between arrays of origin and destination
+    eastings/northings"""
+
+    if method == 'planar':
+        return planar_metres(origin_e, origin_n, dest_e, dest_n)
+
+    if method != 'geodesic':
+        raise ValueError(f'Unknown distance method: {method}')
+
+    # Both ends in one conversion
+    lats, lons = bng_to_wgs(
+        np.concatenate((origin_e, dest_e)),
+        np.concatenate((origin_n, dest_n))
+    )
+    count = len(origin_e)
+
+    return haversine_metres(lats[:count], lons[:count], lats[count:], lons[count:])
+
+
+def outliers(
+        recorded: np.ndarray,
+        computed: np.ndarray,
+        slack: float = DISTANCE_SLACK,
+        tolerance: float = DISTANCE_TOLERANCE) -> np.ndarray:
+    """Return True where a recorded distance is missing, or is shorter than
+    the computed distance by more than the slack (metres) or the tolerance
+    (a fraction of the computed distance), whichever is greater"""
+
+    allowed = np.maximum(slack, tolerance * computed)
+
+    return np.isnan(recorded) | (recorded < computed - allowed)
+
+
+def recompute(
+        engine: object,
+        method: str = DISTANCE_METHOD,
+        slack: float = DISTANCE_SLACK,
+        tolerance: float = DISTANCE_TOLERANCE,
+        apply: bool = True,
+        sample_size: int = 10) -> dict:
+    """Recompute the distance of every link with valid coordinates at both
+    ends, and correct the outliers (unless apply is False) in a single
+    transaction. Outliers too long for the distance field are not
+    corrected, but returned as 'unwritable'. Returns a summary"""
+
+    started = time.perf_counter()
+
+    with engine.connect() as connection:
+        with connection.begin():
+            rows = connection.execute(LINKS).all()
+            columns = list(zip(*rows)) or [()] * 9
+            ids, origins, destinations, recorded_text = columns[:4]
+            recorded, origin_e, origin_n, dest_e, dest_n = (
+                np.array(column, dtype=np.float64) for column in columns[4:]
+            )
+
+            valid = valid_coordinates(origin_e, origin_n) & valid_coordinates(dest_e, dest_n)
+            computed = np.full(len(rows), np.nan)
+            computed[valid] = distances(
+                origin_e[valid], origin_n[valid], dest_e[valid], dest_n[valid], method
+            )
+
+            flagged = valid & outliers(recorded, computed, slack, tolerance)
+            writable = flagged & (np.rint(computed) <= MAX_DISTANCE)
+
+            updates = [
+                {'id': ids[i], 'distance': str(int(np.rint(computed[i]))).rjust(5, '0')}
+                for i in np.flatnonzero(writable).tolist()
+            ]
+            if apply and updates:
+                connection.execute(UPDATE, updates)
+
+    def link(i: int) -> tuple:
+        """Return (origin, destination, recorded, computed) for a link"""
+
+        return (origins[i], destinations[i], recorded_text[i], float(computed[i]))
+
+    # The corrections that change the recorded distance most
+    largest = np.flatnonzero(writable)
+    change = np.abs(computed[largest] - np.nan_to_num(recorded[largest]))
+    largest = largest[np.argsort(-change, kind='stable')][:sample_size]
+
+    return {
+        'links': len(rows),
+        'checked': int(valid.sum()),
+        'invalid': int((~valid).sum()),
+        'outliers': int(flagged.sum()),
+        'corrected': len(updates) if apply else 0,
+        'unwritable': [link(i) for i in np.flatnonzero(flagged & ~writable).tolist()],
+        'largest': [link(i) for i in largest.tolist()],
+        'method': method,
+        'seconds': time.perf_counter() - started
+    }
+
+
+def format_report(report: dict) -> str:
+    """Return the recomputation summary as text"""
+
+    lines = [
+        f"{report['links']} links, {report['checked']} checked ({report['method']}), "
+        f"{report['invalid']} without valid coordinates",
+        f"\t{report['outliers']} outliers, {report['corrected']} corrected, "
+        f"{len(report['unwritable'])} too long to record"
+    ]
+
+    for origin, destination, recorded, computed in report['largest']:
+        lines.append(f'\t{origin} -> {destination}: {recorded} -> {computed:.0f}m')
+
+    lines.append(f"\t{report['seconds']:.2f}s")
+
+    return '\n'.join(lines)
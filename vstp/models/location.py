@@ -4,12 +4,16 @@
 
 from datetime import datetime
 import os
-from typing import Optional, Union
+from typing import ClassVar, Optional, Union
 
 import pydantic
 from bng_latlon import OSGB36toWGS84 as conv
 from haversine import Unit, haversine
-from sqlmodel import Field, Session, SQLModel, create_engine
+from sqlmodel import Field, SQLModel, create_engine
+from sqlalchemy import Index
+from bulk_load import format_report
+from fast_validate import bplan_values, format_rejects, load_bplan
+from coordinates import bng_to_wgs_pairs
 
 DB_CON_STRING = os.getenv("DB_CON_STRING", 'sqlite:///vstp.db')
 LOC_FILE = os.getenv("LOC_FILE", 'LOC')
@@ -17,12 +21,32 @@ EAST_L = 135263
 EAST_U = 658013
 NORTH_L = 10866
 NORTH_U = 969710
+WGS_CACHE = {}  # (easting, northing) -> (lat, lon), shared by all instances
 
 class Location(SQLModel, table=True):
     """Representaion of a LOC record from BPLAN"""
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
+    # Field name -> position in the tab separated BPLAN record
+    BPLAN_LENGTH: ClassVar[int] = 13
+    BPLAN_FIELDS: ClassVar[dict] = {
+        'tiploc': 2,
+        'name': 3,
+        'easting': 6,
+        'northing': 7,
+        'tp_type': 8,
+        'zone': 9,
+        'stanox': 10,
+        'off_network': 11,
+        'lpb': 12
+    }
+    # The natural key, for applying BPLAN updates
+    BPLAN_KEY: ClassVar[tuple] = ('tiploc',)
+    __table_args__ = (
+        Index('ix_location_tiploc', 'tiploc'),
+    )
+
     tiploc: str = pydantic.Field(
         title='Location TIPLOC code',
         min_length=3,
@@ -123,23 +147,9 @@ class Location(SQLModel, table=True):
     @pydantic.validate_arguments
     def bplan_factory(cls, bplan_line: str) -> Union[object, None]:
         """Return a TimingLoad object from a BPLAN TLD line entry"""
-        if not bplan_line.strip():
+        val_dict = bplan_values(cls, bplan_line)
+        if val_dict is None:
             return None
-        values = bplan_line.split('\t')
-        if not len(values) == 13:
-            return None
-
-        val_dict = {
-            'tiploc': values[2],
-            'name': values[3],
-            'easting': values[6],
-            'northing': values[7],
-            'tp_type': values[8],
-            'zone': values[9],
-            'stanox': values[10],
-            'off_network': values[11],
-            'lpb': values[12]
-        }
 
         obj =  cls(**val_dict)
         # Need to do this because we are mixing pydantic with SQLModel!
@@ -162,7 +172,33 @@ class Location(SQLModel, table=True):
         if not all(self.bng_coordinates):
             return None
 
-        return conv(int(self.easting), int(self.northing))
+        bng = (int(self.easting), int(self.northing))
+        if bng not in WGS_CACHE:
+            WGS_CACHE[bng] = conv(*bng)
+
+        return WGS_CACHE[bng]
+
+    @staticmethod
+    def convert_coordinates(locations: list) -> int:
+        """Convert the coordinates of all the locations passed in one
+        vectorised pass, populating WGS_CACHE; returns the count converted"""
+
+        todo = set()
+        for location in locations:
+            if not all(location.bng_coordinates):
+                continue
+            bng = (int(location.easting), int(location.northing))
+            if bng not in WGS_CACHE:
+                todo.add(bng)
+
+        todo = list(todo)
+        pairs = bng_to_wgs_pairs(
+            [bng[0] for bng in todo],
+            [bng[1] for bng in todo]
+        )
+        WGS_CACHE.update(zip(todo, pairs))
+
+        return len(todo)
 
     @property
     def are_coords_valid(self) -> bool:
@@ -223,14 +259,13 @@ class Location(SQLModel, table=True):
 def main():
     """Entry point if running module"""
     engine = create_engine(DB_CON_STRING, echo=False)
-    session = Session(engine)
     SQLModel.metadata.create_all(engine)
 
-    with open(LOC_FILE, 'r', encoding='utf-8') as file:
-        for line in file.readlines():
-            session.add(Location.bplan_factory(line))
+    report = load_bplan(engine, Location, LOC_FILE)
 
-    session.commit()
+    print(format_report(report))
+    if report['rejected']:
+        print(format_rejects(report['rejected']))
 
 if __name__ == "__main__":
     main()
@@ -4,11 +4,13 @@
 
 import os
 
-from typing import Union
+from typing import Iterator, Union
 import location as LOC
+import queries
+import reconcile
 import pydantic
 from bng_latlon import OSGB36toWGS84 as conv
-from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel import SQLModel, create_engine
 
 DB_CON_STRING = os.getenv("DB_CON_STRING", 'sqlite:///vstp.db')
 NAPTAN_9100 = os.getenv("NAPTAN_9100", './reference_data/9100.csv')
@@ -78,55 +80,21 @@ class NAPTANCoordinates(SQLModel):
             print(err)
             return None
 
-def parse_naptan_file() -> list:
-    """Parse the NAPTAN file, return a list of objects"""
+def parse_naptan_file() -> Iterator[NAPTANCoordinates]:
+    """Parse the NAPTAN file, yield an object per line"""
 
     with open(NAPTAN_9100, 'r', encoding='utf-8') as csv:
-        return [NAPTANCoordinates.csv_factory(line) for line in csv.readlines()]
-
-def match_location(tiploc: str, session: Session) -> LOC.Location:
-    """Return a matching location object, based on TIPLOC"""
-
-    stmt = select(
-        LOC.Location
-    ).where(
-        LOC.Location.tiploc == tiploc
-    )
-
-    return session.execute(stmt).fetchone()
+        for line in csv:
+            yield NAPTANCoordinates.csv_factory(line)
 
 def main():
-    """Parse the NAPTAN file and update the database"""
+    """Parse the NAPTAN file and update the database, the NAPTAN coordinates
+    replacing those held"""
 
     engine = create_engine(DB_CON_STRING, echo=False)
-    with Session(engine) as session:
-        for coord in parse_naptan_file():
-            if not coord:
-                continue
-            match = match_location(coord.tiploc, session)
-            if not match:
-                continue
-
-            updated = []
-            if not match[0].easting == coord.easting:
-                updated.append(
-                    f'Easting: {match[0].easting} -> {coord.easting}'
-                )
-                match[0].easting = coord.easting
-
-            if not match[0].northing == coord.northing:
-                updated.append(
-                    f'Northing: {match[0].northing} -> {coord.northing}'
-                )
-                match[0].northing = coord.northing
-
-            if not updated:
-                print(f'TIPLOC: {coord.tiploc} - no amends!')
-                continue
-
-            print(f'TIPLOC: {coord.tiploc}: {updated}')
-
-        session.commit()
+    queries.create_schema(engine, [LOC.Location])
+    report = reconcile.reconcile(engine, parse_naptan_file(), reconcile.replace)
+    print(reconcile.format_report(report))
 
 if __name__ == '__main__':
     main()
@@ -2,9 +2,12 @@
 
 from datetime import datetime
 import os
-from typing import Union, Optional
-from sqlmodel import SQLModel, Field, Session, create_engine
+from typing import ClassVar, Union, Optional
+from sqlmodel import SQLModel, Field, create_engine
+from sqlalchemy import Index
 import pydantic
+from bulk_load import format_report
+from fast_validate import bplan_values, format_rejects, load_bplan
 
 DB_CON_STRING = os.getenv("DB_CON_STRING", 'sqlite:///vstp.db')
 NWK_FILE = os.getenv("NWK_FILE", 'NWK')
@@ -14,6 +17,32 @@ class NetworkLink(SQLModel, table=True):
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
+    # Field name -> position in the tab separated BPLAN record
+    BPLAN_LENGTH: ClassVar[int] = 19
+    BPLAN_FIELDS: ClassVar[dict] = {
+        'origin': 2,
+        'destination': 3,
+        'line': 4,
+        'line_desc': 5,
+        'initial_dir': 8,
+        'final_dir': 9,
+        'distance': 10,
+        'doop': 11,
+        'doof': 12,
+        'retb': 13,
+        'zone': 14,
+        'reversable': 15,
+        'power': 16,
+        'route_avail': 17,
+        'max_len': 18
+    }
+    # The natural key, for applying BPLAN updates
+    BPLAN_KEY: ClassVar[tuple] = ('origin', 'destination', 'line')
+    __table_args__ = (
+        Index('ix_networklink_origin_destination_line', 'origin', 'destination', 'line'),
+        Index('ix_networklink_destination', 'destination'),
+    )
+
     origin: str = pydantic.Field(
         title='Origin location',
         min_length=3,
@@ -162,29 +191,9 @@ class NetworkLink(SQLModel, table=True):
     @pydantic.validate_arguments
     def bplan_factory(cls, bplan_line: str) -> Union[object, None]:
         """Return a NetworkLink object from a BPLAN NWK line entry"""
-        if not bplan_line.strip():
+        val_dict = bplan_values(cls, bplan_line)
+        if val_dict is None:
             return None
-        values = bplan_line.split('\t')
-        if not len(values) == 19:
-            return None
-
-        val_dict= {
-            'origin': values[2],
-            'destination': values[3],
-            'line': values[4],
-            'line_desc': values[5],
-            'initial_dir': values[8],
-            'final_dir': values[9],
-            'distance': values[10],
-            'doop': values[11],
-            'doof': values[12],
-            'retb': values[13],
-            'zone': values[14],
-            'reversable': values[15],
-            'power': values[16],
-            'route_avail': values[17],
-            'max_len': values[18]
-        }
 
         obj =  cls(**val_dict)
 
@@ -197,14 +206,13 @@ class NetworkLink(SQLModel, table=True):
 def main():
     """Entry point if running module"""
     engine = create_engine(DB_CON_STRING, echo=False)
-    session = Session(engine)
     SQLModel.metadata.create_all(engine)
 
-    with open(NWK_FILE, 'r', encoding='utf-8') as file:
-        for line in file.readlines():
-            session.add(NetworkLink.bplan_factory(line))
+    report = load_bplan(engine, NetworkLink, NWK_FILE)
 
-    session.commit()
+    print(format_report(report))
+    if report['rejected']:
+        print(format_rejects(report['rejected']))
 
 if __name__ == "__main__":
     main()
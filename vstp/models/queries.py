@@ -0,0 +1,108 @@
+"""Schema creation, and the lookups the data cleaning scripts make
+
+Each lookup filters on the leading columns of one of the table indexes, so it
+is an index search rather than a scan of the table. create_schema also adds
+the indexes to a database created before they were declared.
+"""
+
+from typing import Iterable, Union
+
+from sqlmodel import Session, SQLModel, select
+from location import Location
+from network_link import NetworkLink
+from timing_link import TimingLink
+
+MAX_PARAMETERS = 900  # SQLite allows 999 bound parameters per statement
+
+
+def create_schema(engine: object, models: Iterable = None) -> list:
+    """Create any missing tables (those of the models given, or all) and
+    their indexes; returns the names of the indexes"""
+
+    tables = None
+    if models is not None:
+        tables = [model.__table__ for model in models]
+
+    SQLModel.metadata.create_all(engine, tables=tables)
+
+    names = []
+    for table in tables or SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+            names.append(index.name)
+
+    return names
+
+
+def query_plan(session: Session, stmt: object) -> str:
+    """Return SQLite's plan for a statement, to check an index is used"""
+
+    compiled = stmt.compile(
+        session.get_bind(),
+        compile_kwargs={'literal_binds': True}
+    )
+
+    return '\n'.join(
+        str(row[-1]) for row in session.execute(f'EXPLAIN QUERY PLAN {compiled}')
+    )
+
+
+def location_by_tiploc(session: Session, tiploc: str) -> Union[Location, None]:
+    """Return the location for a TIPLOC, or None"""
+
+    stmt = select(Location).where(Location.tiploc == tiploc)
+
+    return session.execute(stmt).scalars().first()
+
+
+def locations_by_tiploc(session: Session, tiplocs: Iterable) -> dict:
+    """Return the locations for many TIPLOCs, keyed on TIPLOC, a batch of
+    TIPLOCs per query"""
+
+    tiplocs = list(dict.fromkeys(tiplocs))
+    found = {}
+
+    for start in range(0, len(tiplocs), MAX_PARAMETERS):
+        stmt = select(Location).where(
+            Location.tiploc.in_(tiplocs[start:start + MAX_PARAMETERS])
+        )
+        for location in session.execute(stmt).scalars():
+            found.setdefault(location.tiploc, location)
+
+    return found
+
+
+def network_links(
+        session: Session,
+        origin: str,
+        destination: str = None,
+        line: str = None) -> list:
+    """Return the network links from an origin, optionally to a destination
+    and on a line"""
+
+    stmt = select(NetworkLink).where(NetworkLink.origin == origin)
+    if destination is not None:
+        stmt = stmt.where(NetworkLink.destination == destination)
+    if line is not None:
+        stmt = stmt.where(NetworkLink.line == line)
+
+    return session.execute(stmt).scalars().all()
+
+
+def network_links_to(session: Session, destination: str) -> list:
+    """Return the network links into a destination"""
+
+    stmt = select(NetworkLink).where(NetworkLink.destination == destination)
+
+    return session.execute(stmt).scalars().all()
+
+
+def timing_links(session: Session, origin: str, destination: str) -> list:
+    """Return the timing links between an origin and destination"""
+
+    stmt = select(TimingLink).where(
+        TimingLink.origin == origin,
+        TimingLink.destination == destination
+    )
+
+    return session.execute(stmt).scalars().all()
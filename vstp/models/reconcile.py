@@ -0,0 +1,201 @@
+"""Set-based reconciliation of reference coordinates against the location table
+
+The reference rows (NaPTAN, FOI...) are loaded into a temporary table in one
+pass and joined against location in a single query. A policy decides the
+coordinates each matched location should have; the changes are then applied
+as one executemany UPDATE, keyed on id, and summarised rather than printed
+row by row.
+"""
+
+import statistics
+import time
+from typing import Callable, Iterable, Union
+
+from sqlalchemy import text
+
+PLACEHOLDER = '999999'  # Used in the BPLAN where the coordinates are unknown
+
+CREATE_SOURCE = text("""
+    CREATE TEMPORARY TABLE reconcile_source (
+        tiploc TEXT PRIMARY KEY,
+        name TEXT,
+        easting TEXT,
+        northing TEXT
+    )
+""")
+
+INSERT_SOURCE = text("""
+    INSERT INTO reconcile_source (tiploc, name, easting, northing)
+    VALUES (:tiploc, :name, :easting, :northing)
+""")
+
+MATCHED = text("""
+    SELECT location.id, location.tiploc, location.easting, location.northing,
+           reconcile_source.easting, reconcile_source.northing
+    FROM reconcile_source
+    JOIN location ON location.tiploc = reconcile_source.tiploc
+    ORDER BY location.id
+""")
+
+UNMATCHED = text("""
+    SELECT reconcile_source.tiploc, reconcile_source.name,
+           reconcile_source.easting, reconcile_source.northing
+    FROM reconcile_source
+    LEFT JOIN location ON location.tiploc = reconcile_source.tiploc
+    WHERE location.id IS NULL
+    ORDER BY reconcile_source.tiploc
+""")
+
+UPDATE = text("""
+    UPDATE location SET easting = :easting, northing = :northing WHERE id = :id
+""")
+
+INSERT = text("""
+    INSERT INTO location (tiploc, name, easting, northing, tp_type, zone, off_network)
+    VALUES (:tiploc, :name, :easting, :northing, 'O', '0', 'N')
+""")
+
+
+def replace(current: tuple, reference: tuple) -> tuple:
+    """Policy: the reference coordinates replace those held"""
+
+    return reference
+
+
+def fill(current: tuple, reference: tuple) -> tuple:
+    """Policy: the reference coordinates fill in any that are missing, or
+    placeholders"""
+
+    return tuple(
+        held if held and held != PLACEHOLDER else new
+        for held, new in zip(current, reference)
+    )
+
+
+def moved(before: tuple, after: tuple) -> Union[float, None]:
+    """Return how far (metres) the coordinates moved, None if either pair is
+    incomplete or a placeholder"""
+
+    if PLACEHOLDER in before or PLACEHOLDER in after:
+        return None
+
+    try:
+        d_east = int(after[0]) - int(before[0])
+        d_north = int(after[1]) - int(before[1])
+    except (TypeError, ValueError):
+        return None
+
+    return (d_east * d_east + d_north * d_north) ** 0.5
+
+
+def reconcile(
+        engine: object,
+        rows: Iterable,
+        policy: Callable = replace,
+        insert_unmatched: bool = False,
+        sample_size: int = 10) -> dict:
+    """Reconcile reference rows (objects with tiploc, easting, northing and,
+    to insert, name) against the location table in a single transaction.
+    Rows for the same TIPLOC are combined by the policy, in order, as if
+    applied one after another: with fill the first row wins, with replace
+    the last. Returns a summary of the changes"""
+
+    started = time.perf_counter()
+    source = {}
+    for row in rows:
+        if row is None:
+            continue
+
+        coordinates = (row.easting, row.northing)
+        if row.tiploc in source:
+            earlier = source[row.tiploc]
+            coordinates = policy((earlier['easting'], earlier['northing']), coordinates)
+            source[row.tiploc].update(easting=coordinates[0], northing=coordinates[1])
+            continue
+
+        source[row.tiploc] = {
+            'tiploc': row.tiploc,
+            'name': getattr(row, 'name', None),
+            'easting': coordinates[0],
+            'northing': coordinates[1]
+        }
+
+    updates = []
+    diffs = []
+    easting_changed = 0
+    northing_changed = 0
+
+    with engine.connect() as connection:
+        with connection.begin():
+            connection.execute(CREATE_SOURCE)
+            if source:
+                connection.execute(INSERT_SOURCE, list(source.values()))
+
+            matched = connection.execute(MATCHED).all()
+            unmatched = connection.execute(UNMATCHED).all()
+
+            for loc_id, tiploc, easting, northing, ref_easting, ref_northing in matched:
+                before = (easting, northing)
+                after = policy(before, (ref_easting, ref_northing))
+                if after == before:
+                    continue
+
+                easting_changed += after[0] != before[0]
+                northing_changed += after[1] != before[1]
+                updates.append({'id': loc_id, 'easting': after[0], 'northing': after[1]})
+                diffs.append((tiploc, before, after, moved(before, after)))
+
+            if updates:
+                connection.execute(UPDATE, updates)
+
+            inserted = []
+            if insert_unmatched:
+                inserted = [dict(row._mapping) for row in unmatched]
+                if inserted:
+                    connection.execute(INSERT, inserted)
+
+            connection.execute(text('DROP TABLE reconcile_source'))
+
+    distances = [diff[3] for diff in diffs if diff[3] is not None]
+
+    return {
+        'source_rows': len(source),
+        'matched': len(matched),
+        'unmatched': len(unmatched),
+        'updated': len(updates),
+        'unchanged': len(matched) - len(updates),
+        'inserted': len(inserted),
+        'easting_changed': easting_changed,
+        'northing_changed': northing_changed,
+        'median_move': statistics.median(distances) if distances else None,
+        'max_move': max(distances) if distances else None,
+        'largest': sorted(
+            (diff for diff in diffs if diff[3] is not None),
+            key=lambda diff: diff[3],
+            reverse=True
+        )[:sample_size],
+        'seconds': time.perf_counter() - started
+    }
+
+
+def format_report(report: dict) -> str:
+    """Return the reconciliation summary as text"""
+
+    lines = [
+        f"{report['source_rows']} reference rows, {report['matched']} matched, "
+        f"{report['unmatched']} unmatched",
+        f"\t{report['updated']} updated ({report['easting_changed']} eastings, "
+        f"{report['northing_changed']} northings), {report['unchanged']} unchanged, "
+        f"{report['inserted']} inserted"
+    ]
+
+    if report['max_move'] is not None:
+        lines.append(
+            f"\tmoved: median {report['median_move']:.0f}m, max {report['max_move']:.0f}m"
+        )
+    for tiploc, before, after, distance in report['largest']:
+        lines.append(f'\t{tiploc}: {before} -> {after} ({distance:.0f}m)')
+
+    lines.append(f"\t{report['seconds']:.2f}s")
+
+    return '\n'.join(lines)
@@ -1,20 +1,28 @@
 """Representation of a SMART record"""
 
-import json
 import os
 from typing import Optional, Union
 
 import pydantic
-from sqlmodel import Field, Session, SQLModel, create_engine
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel, create_engine
+from bulk_load import bulk_load, format_report
+from queries import create_schema
+from smart_reader import READ_CHUNK_SIZE, SMART_FILE, read_steps
 
 DB_CON_STRING = os.getenv("DB_CON_STRING", 'sqlite:///vstp.db')
-SMART_FILE = os.getenv("SMART_FILE", 'SMARTExtract.json')
 
 class Smart(SQLModel, table=True):
     """Representation of a SMART record"""
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
+    __table_args__ = (
+        Index('ix_smart_stanox', 'stanox'),
+        Index('ix_smart_td', 'td'),
+        Index('ix_smart_from_berth_to_berth', 'from_berth', 'to_berth'),
+    )
+
     step_type: str = pydantic.Field(
         alias="STEPTYPE",
         regex="^[BFCDITE]{1}$"
@@ -89,18 +97,21 @@ class Smart(SQLModel, table=True):
             return None
         return stripped
 
+def load_smart(engine: object, f_name: str = SMART_FILE, chunk_size: int = READ_CHUNK_SIZE) -> dict:
+    """Stream the SMART extract into the smart table, returns the bulk_load
+    report"""
+
+    return bulk_load(
+        engine,
+        Smart,
+        (step._asdict() for step in read_steps(f_name, chunk_size))
+    )
+
 def main():
     """Entry point if running module"""
     engine = create_engine(DB_CON_STRING, echo=False)
-    session = Session(engine)
-    SQLModel.metadata.create_all(engine)
-
-    with open(SMART_FILE, 'r', encoding='utf-8') as file:
-        rep = json.loads(file.readline())
-        for record in rep['BERTHDATA']:
-            session.add(Smart(**record))
-
-    session.commit()
+    create_schema(engine, [Smart])
+    print(format_report(load_smart(engine)))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,158 @@
+"""Streaming reader and lookup indexes for the SMART berth step extract
+
+SMARTExtract.json is a single object holding one very long BERTHDATA array.
+The array is decoded a record at a time from a buffer refilled in chunks, so
+the whole file is never held in memory. SmartIndex holds the steps keyed on
+STANOX, TD area and (from berth, to berth), for constant time lookups.
+
+Needs only the standard library, so it can be imported from vstp as well as
+the models scripts.
+"""
+
+import json
+import os
+from typing import Iterator, List, NamedTuple, Union
+
+SMART_FILE = os.getenv("SMART_FILE", 'SMARTExtract.json')
+READ_CHUNK_SIZE = int(os.getenv("SMART_CHUNK_SIZE", 1 << 20))  # Characters
+
+SEPARATORS = ' \t\r\n,'
+
+
+class SmartStep(NamedTuple):
+    """A SMART berth step"""
+
+    td: Union[str, None]
+    from_berth: Union[str, None]
+    to_berth: Union[str, None]
+    from_line: Union[str, None]
+    to_line: Union[str, None]
+    berth_offset: Union[str, None]
+    platform: Union[str, None]
+    event: Union[str, None]
+    route: Union[str, None]
+    stanox: Union[str, None]
+    stanme: Union[str, None]
+    step_type: Union[str, None]
+    comment: Union[str, None]
+
+    @classmethod
+    def from_record(cls, record: dict) -> object:
+        """Return a step from a BERTHDATA record; values are stripped, and
+        empty values are None"""
+
+        return cls._make(clean(record.get(key)) for key in RECORD_KEYS)
+
+
+# The BERTHDATA key of each SmartStep field, e.g. from_berth: FROMBERTH
+RECORD_KEYS = tuple(field.replace('_', '').upper() for field in SmartStep._fields)
+
+
+def clean(value: object) -> object:
+    """Strip a string value; an empty string is None"""
+
+    if isinstance(value, str):
+        return value.strip() or None
+
+    return value
+
+
+def read_berth_data(f_name: str = SMART_FILE, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[dict]:
+    """Yield the BERTHDATA records of a SMART extract, one at a time"""
+
+    decoder = json.JSONDecoder()
+
+    with open(f_name, 'r', encoding='utf-8') as file:
+        buffer = ''
+        while True:
+            chunk = file.read(chunk_size)
+            buffer += chunk
+            key = buffer.find('"BERTHDATA"')
+            start = buffer.find('[', key) if key >= 0 else -1
+            if start >= 0:
+                buffer = buffer[start + 1:]
+                break
+            if not chunk:
+                raise ValueError(f'{f_name}: no BERTHDATA array')
+
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in SEPARATORS:
+                pos += 1
+
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # The record runs past the end of the buffer
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    raise
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+
+            yield record
+
+
+def read_steps(f_name: str = SMART_FILE, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[SmartStep]:
+    """Yield the steps of a SMART extract"""
+
+    for record in read_berth_data(f_name, chunk_size):
+        yield SmartStep.from_record(record)
+
+
+class SmartIndex:
+    """SMART steps keyed on STANOX, TD area and (from berth, to berth)"""
+
+    def __init__(self, steps: Iterator[SmartStep] = ()):
+        """Initialisation"""
+
+        self.steps = []
+        self.by_stanox = {}
+        self.by_td = {}
+        self.by_berths = {}
+        for step in steps:
+            self.add(step)
+
+    def __len__(self) -> int:
+        """Return the number of steps indexed"""
+
+        return len(self.steps)
+
+    def add(self, step: SmartStep) -> None:
+        """Add a step to the indexes"""
+
+        self.steps.append(step)
+        if step.stanox:
+            self.by_stanox.setdefault(step.stanox, []).append(step)
+        if step.td:
+            self.by_td.setdefault(step.td, []).append(step)
+        self.by_berths.setdefault((step.from_berth, step.to_berth), []).append(step)
+
+    @classmethod
+    def from_file(cls, f_name: str = SMART_FILE, chunk_size: int = READ_CHUNK_SIZE) -> object:
+        """Build the index from a SMART extract"""
+
+        return cls(read_steps(f_name, chunk_size))
+
+    def at_stanox(self, stanox: str) -> List[SmartStep]:
+        """Return the steps at a STANOX"""
+
+        return self.by_stanox.get(stanox, [])
+
+    def in_td(self, td: str) -> List[SmartStep]:
+        """Return the steps in a TD area"""
+
+        return self.by_td.get(td, [])
+
+    def step(self, from_berth: str, to_berth: str, td: str = None) -> List[SmartStep]:
+        """Return the steps between two berths, optionally in one TD area"""
+
+        steps = self.by_berths.get((from_berth, to_berth), [])
+        if td is None:
+            return steps
+
+        return [step for step in steps if step.td == td]
@@ -4,9 +4,12 @@
 
 from datetime import datetime
 import os
-from typing import Union, Optional
-from sqlmodel import SQLModel, Field, Session, create_engine
+from typing import ClassVar, Union, Optional
+from sqlmodel import SQLModel, Field, create_engine
+from sqlalchemy import Index
 import pydantic
+from bulk_load import format_report
+from fast_validate import bplan_values, format_rejects, load_bplan
 
 DB_CON_STRING = os.getenv("DB_CON_STRING", 'sqlite:///vstp.db')
 TLK_FILE = os.getenv("TLK_FILE", 'TLK')
@@ -16,6 +19,32 @@ class TimingLink(SQLModel, table=True):
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
+    # Field name -> position in the tab separated BPLAN record
+    BPLAN_LENGTH: ClassVar[int] = 15
+    BPLAN_FIELDS: ClassVar[dict] = {
+        'origin': 2,
+        'destination': 3,
+        'line_code': 4,
+        'traction_type': 5,
+        'trailing_load': 6,
+        'speed': 7,
+        'route_guage': 8,
+        'entry_speed': 9,
+        'exit_speed': 10,
+        'srt': 13
+    }
+    # The natural key, for applying BPLAN updates
+    BPLAN_KEY: ClassVar[tuple] = (
+        'origin', 'destination', 'line_code', 'traction_type', 'trailing_load',
+        'speed', 'route_guage', 'entry_speed', 'exit_speed'
+    )
+    __table_args__ = (
+        Index(
+            'ix_timinglink_origin_destination_line_code',
+            'origin', 'destination', 'line_code'
+        ),
+    )
+
     origin: str = pydantic.Field(
         title='Origin TIPLOC',
         max_length=7,
@@ -141,24 +170,9 @@ class TimingLink(SQLModel, table=True):
     @pydantic.validate_arguments
     def bplan_factory(cls, bplan_line: str) -> Union[object, None]:
         """Return a TimingLink object from a BPLAN TLK line entry"""
-        if not bplan_line.strip():
+        val_dict = bplan_values(cls, bplan_line)
+        if val_dict is None:
             return None
-        values = bplan_line.split('\t')
-        if not len(values) == 15:
-            return None
-
-        val_dict = {
-            'origin': values[2],
-            'destination': values[3],
-            'line_code': values[4],
-            'traction_type': values[5],
-            'trailing_load': values[6],
-            'speed': values[7],
-            'route_guage': values[8],
-            'entry_speed': values[9],
-            'exit_speed': values[10],
-            'srt': values[13]  
-        }
 
         obj =  cls(**val_dict)
 
@@ -171,14 +185,13 @@ class TimingLink(SQLModel, table=True):
 def main():
     """Entry point if running module"""
     engine = create_engine(DB_CON_STRING, echo=False)
-    session = Session(engine)
     SQLModel.metadata.create_all(engine)
 
-    with open(TLK_FILE, 'r', encoding='utf-8') as file:
-        for line in file.readlines():
-            session.add(TimingLink.bplan_factory(line))
+    report = load_bplan(engine, TimingLink, TLK_FILE)
 
-    session.commit()
+    print(format_report(report))
+    if report['rejected']:
+        print(format_rejects(report['rejected']))
 
 if __name__ == "__main__":
     main()
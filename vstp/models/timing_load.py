@@ -1,9 +1,12 @@
 """A representation of a Timing Load TLD BPLAN record"""
 
 import os
-from typing import Union, Optional
-from sqlmodel import SQLModel, Field, Session, create_engine
+from typing import ClassVar, Union, Optional
+from sqlmodel import SQLModel, Field, create_engine
+from sqlalchemy import Index
 import pydantic
+from bulk_load import format_report
+from fast_validate import bplan_values, format_rejects, load_bplan
 
 DB_CON_STRING = os.getenv("DB_CON_STRING", 'sqlite:///vstp.db')
 TLD_FILE = os.getenv("TLD_FILE", 'TLD')
@@ -13,6 +16,27 @@ class TimingLoad(SQLModel, table=True):
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
+    # Field name -> position in the tab separated BPLAN record
+    BPLAN_LENGTH: ClassVar[int] = 10
+    BPLAN_FIELDS: ClassVar[dict] = {
+        'traction_type': 2,
+        'trailing_load': 3,
+        'max_speed': 4,
+        'ra_guage': 5,
+        'description': 6,
+        'power_type': 7,
+        'load': 8,
+        'limiting_speed': 9
+    }
+    # The natural key, for applying BPLAN updates
+    BPLAN_KEY: ClassVar[tuple] = ('traction_type', 'trailing_load', 'max_speed', 'ra_guage')
+    __table_args__ = (
+        Index(
+            'ix_timingload_bplan_key',
+            'traction_type', 'trailing_load', 'max_speed', 'ra_guage'
+        ),
+    )
+
     traction_type: str = pydantic.Field(
         title='Traction Type',
         max_length=6,
@@ -102,22 +126,9 @@ class TimingLoad(SQLModel, table=True):
     @pydantic.validate_arguments
     def bplan_factory(cls, bplan_line: str) -> Union[object, None]:
         """Return a TimingLoad object from a BPLAN TLD line entry"""
-        if not bplan_line.strip():
+        val_dict = bplan_values(cls, bplan_line)
+        if val_dict is None:
             return None
-        values = bplan_line.split('\t')
-        if not len(values) == 10:
-            return None
-
-        val_dict= {
-            'traction_type': values[2],
-            'trailing_load': values[3],
-            'max_speed': values[4],
-            'ra_guage': values[5],
-            'description': values[6],
-            'power_type': values[7],
-            'load': values[8],
-            'limiting_speed': values[9]
-        }
 
         obj =  cls(**val_dict)
         # Need to do this because we are mixing pydantic with SQLModel!
@@ -130,14 +141,13 @@ class TimingLoad(SQLModel, table=True):
 def main():
     """Entry point if running module"""
     engine = create_engine(DB_CON_STRING, echo=False)
-    session = Session(engine)
     SQLModel.metadata.create_all(engine)
 
-    with open(TLD_FILE, 'r', encoding='utf-8') as file:
-        for line in file.readlines():
-            session.add(TimingLoad.bplan_factory(line))
+    report = load_bplan(engine, TimingLoad, TLD_FILE)
 
-    session.commit()
+    print(format_report(report))
+    if report['rejected']:
+        print(format_rejects(report['rejected']))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,402 @@
+"""A read-only, memory-mapped image of the network for worker processes
+
+The image holds the LOC, NWK and edge weight data as flat arrays and string
+tables in a single file. Any number of processes can map it without copying;
+the pages are shared through the OS page cache and no Python objects are held
+per TIPLOC or link, so a worker's memory does not grow with the network.
+Once attached, the Pathfinder, LocationRecord lookups and NetworkLink queries
+run directly against the image.
+"""
+
+import json
+import mmap
+import os
+import struct
+from typing import Iterator, Union
+
+import numpy as np
+
+from location_record import LocationRecord, EAST_L, EAST_U, NORTH_L, NORTH_U, PLANAR_SCALE
+from network_links import NetworkLink
+from edge_weights import EdgeWeight, PLANAR_RATIO_FLOOR, warn_outliers
+from snapshot import source_key
+from err import BadNetworkImage
+
+IMAGE_FILE = os.getenv("IMAGE_FILE", 'vstp.img')
+MAGIC = b'VSTPIMG\x00'
+VERSION = 2
+HEADER = struct.Struct('<8sII')  # magic, version, length of the array table
+ALIGN = 8
+
+LOC_FIELDS = (
+    'location_name', 'start_date', 'end_date', 'timing_point_type', 'zone',
+    'stanox_code', 'off_network_indicator', 'force_lpb'
+)
+
+
+def string_table(strings: list) -> tuple:
+    """Return the (offsets, blob) arrays holding a list of strings"""
+
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def build(f_name: str = IMAGE_FILE, sources: list = None) -> int:
+    """Write the currently loaded network to an image file; returns the
+    number of TIPLOCs written"""
+
+    if not EdgeWeight._instances:
+        EdgeWeight.build()
+
+    tiplocs = sorted(
+        set(LocationRecord._instances) |
+        set(NetworkLink._instances) |
+        {dest for dests in NetworkLink._instances.values() for dest in dests}
+    )
+    index = {tiploc: ind for ind, tiploc in enumerate(tiplocs)}
+    count = len(tiplocs)
+
+    bng = np.zeros((count, 2), dtype=np.int32)
+    wgs = np.full((count, 2), np.nan)
+    loc_strings = [''] * count
+    has_loc = np.zeros(count, dtype=np.bool_)
+
+    for tiploc, obj in LocationRecord._instances.items():
+        ind = index[tiploc]
+        has_loc[ind] = True
+        bng[ind] = (obj.os_easting, obj.os_northing)
+        if obj.wgs_coordinates:
+            wgs[ind] = obj.wgs_coordinates
+        loc_strings[ind] = '\t'.join(str(getattr(obj, field)) for field in LOC_FIELDS)
+
+    # Neighbours in CSR form, kept in NWK order as the search depends on it
+    first = np.zeros(count + 1, dtype=np.int64)
+    dests, weights, provenance, directions, lines, distances = [], [], [], [], [], []
+
+    for ind, tiploc in enumerate(tiplocs):
+        for dest, lnks in NetworkLink._instances.get(tiploc, {}).items():
+            edge = EdgeWeight._instances.get(tiploc, {}).get(dest, None)
+            dests.append(index[dest])
+            weights.append(edge.weight if edge else -1)
+            provenance.append(edge.provenance if edge else '')
+            directions.append(
+                (lnks[-1].initial_direction, lnks[-1].final_direction, lnks[-1].reversable)
+            )
+            lines.append('\t'.join(NetworkLink.line_codes(lnks)))
+            distances.append(NetworkLink.shortest_distance(lnks))
+        first[ind + 1] = len(dests)
+
+    loc_offsets, loc_blob = string_table(loc_strings)
+    line_offsets, line_blob = string_table(lines)
+    width = max([len(tiploc) for tiploc in tiplocs] + [1])
+
+    arrays = {
+        'tiplocs': np.array([tiploc.encode('utf-8') for tiploc in tiplocs], dtype=f'S{width}'),
+        'has_loc': has_loc,
+        'bng': bng,
+        'wgs': wgs,
+        'loc_offsets': loc_offsets,
+        'loc_blob': loc_blob,
+        'first': first,
+        'dests': np.array(dests, dtype=np.int32),
+        'weights': np.array(weights, dtype=np.int32),
+        'distances': np.array(distances, dtype=np.int32),
+        'provenances': np.array([value.encode('utf-8') for value in provenance], dtype='S8'),
+        'directions': np.array(
+            [[value.encode('utf-8') for value in row] for row in directions],
+            dtype='S1'
+        ).reshape(len(directions), 3),
+        'line_offsets': line_offsets,
+        'line_blob': line_blob
+    }
+
+    table = {'source': source_key(sources or []), 'arrays': {}}
+    offset = 0
+    for name, array in arrays.items():
+        table['arrays'][name] = [array.dtype.str, list(array.shape), offset]
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+
+    table_bytes = json.dumps(table).encode('utf-8')
+    start = -(-(HEADER.size + len(table_bytes)) // ALIGN) * ALIGN
+
+    temp_name = f'{f_name}.tmp'
+    with open(temp_name, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(table_bytes)))
+        file.write(table_bytes)
+        for name, array in arrays.items():
+            file.seek(start + table['arrays'][name][2])
+            file.write(np.ascontiguousarray(array).tobytes())
+        file.truncate(start + offset)
+
+    # Workers still mapping the old image keep it until they re-attach
+    os.replace(temp_name, f_name)
+
+    return count
+
+
+class NetworkImage:
+    """Read-only view of a network image file, mapped into memory"""
+
+    def __init__(self, f_name: str = IMAGE_FILE):
+        """Initialisation"""
+
+        self.f_name = f_name
+        self._planar_ratio = None  # Computed on first use
+
+        try:
+            with open(f_name, 'rb') as file:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, table_len = HEADER.unpack_from(self._map, 0)
+            table = json.loads(self._map[HEADER.size:HEADER.size + table_len])
+        except (OSError, ValueError, struct.error) as err:
+            raise BadNetworkImage(f_name) from err
+
+        if magic != MAGIC or version != VERSION:
+            raise BadNetworkImage(f_name)
+
+        self.source = table['source']
+        start = -(-(HEADER.size + table_len) // ALIGN) * ALIGN
+
+        for name, (dtype, shape, offset) in table['arrays'].items():
+            dtype = np.dtype(dtype)
+            array = np.frombuffer(
+                self._map,
+                dtype=dtype,
+                count=int(np.prod(shape)),
+                offset=start + offset
+            )
+            setattr(self, name, array.reshape(shape))
+
+    def __len__(self) -> int:
+        """Return the number of TIPLOCs in the image"""
+
+        return len(self.tiplocs)
+
+    def close(self) -> None:
+        """Release the arrays and unmap the file"""
+
+        for name in list(self.__dict__):
+            if isinstance(self.__dict__[name], np.ndarray):
+                delattr(self, name)
+        self._map.close()
+
+    def index(self, tiploc: str) -> Union[int, None]:
+        """Return the position of a TIPLOC in the image, or None"""
+
+        key = str(tiploc).encode('utf-8')
+        if not key or len(key) > self.tiplocs.dtype.itemsize:
+            return None
+
+        ind = int(np.searchsorted(self.tiplocs, key))
+        if ind < len(self.tiplocs) and self.tiplocs[ind] == key:
+            return ind
+
+        return None
+
+    def tiploc(self, ind: int) -> str:
+        """Return the TIPLOC at a position in the image"""
+
+        return self.tiplocs[ind].decode('utf-8')
+
+    @staticmethod
+    def string(offsets: np.ndarray, blob: np.ndarray, ind: int) -> str:
+        """Return a string from a string table"""
+
+        return blob[offsets[ind]:offsets[ind + 1]].tobytes().decode('utf-8')
+
+    def edge(self, tiploc_a: str, tiploc_b: str) -> Union[int, None]:
+        """Return the position of the link from tiploc A to tiploc B, or None"""
+
+        ind_a = self.index(tiploc_a)
+        ind_b = self.index(tiploc_b)
+        if ind_a is None or ind_b is None:
+            return None
+
+        start, end = self.first[ind_a], self.first[ind_a + 1]
+        found = np.flatnonzero(self.dests[start:end] == ind_b)
+        if not len(found):
+            return None
+
+        return int(start + found[0])
+
+    def is_valid_tiploc(self, tiploc: str) -> bool:
+        """Returns True if the TIPLOC has any links, otherwise False"""
+
+        ind = self.index(tiploc)
+        if ind is None:
+            return False
+
+        return bool(self.first[ind + 1] > self.first[ind])
+
+    def neighbours(self, tiploc: str) -> list:
+        """Return the TIPLOCs reachable from the TIPLOC, in NWK order"""
+
+        ind = self.index(tiploc)
+        if ind is None:
+            return []
+
+        return [
+            self.tiploc(dest)
+            for dest in self.dests[self.first[ind]:self.first[ind + 1]]
+        ]
+
+    def reversable_data(self, tiploc_a: str, tiploc_b: str) -> Union[dict, None]:
+        """Return the directions and reversable data for a TIPLOC pair"""
+
+        edge = self.edge(tiploc_a, tiploc_b)
+        if edge is None:
+            return None
+
+        initial_dir, final_dir, reversable = [
+            value.decode('utf-8') for value in self.directions[edge]
+        ]
+
+        return {
+            'inital_direction': initial_dir,
+            'final_direction': final_dir,
+            'reversable': reversable
+        }
+
+    def all_lines(self, tiploc_a: str, tiploc_b: str) -> list:
+        """Return the sorted line codes between a TIPLOC pair"""
+
+        edge = self.edge(tiploc_a, tiploc_b)
+        if edge is None:
+            return []
+
+        lines = self.string(self.line_offsets, self.line_blob, edge)
+        if not lines:
+            return []
+
+        return lines.split('\t')
+
+    def distance(self, tiploc_a: str, tiploc_b: str) -> Union[int, None]:
+        """Return the shortest NWK distance for a TIPLOC pair, as
+        NetworkLink.distance"""
+
+        edge = self.edge(tiploc_a, tiploc_b)
+        if edge is None:
+            return None
+
+        return int(self.distances[edge])
+
+    def weight(self, tiploc_a: str, tiploc_b: str) -> Union[int, None]:
+        """Return the edge weight (metres) for a TIPLOC pair"""
+
+        edge = self.edge(tiploc_a, tiploc_b)
+        if edge is None or self.weights[edge] < 0:
+            return None
+
+        return int(self.weights[edge])
+
+    def planar_ratio(self) -> float:
+        """Return the smallest ratio of weight to planar distance between the
+        ends of any edge, between PLANAR_RATIO_FLOOR and 1, skipping the
+        outliers below the floor, as EdgeWeight.planar_ratio"""
+
+        if self._planar_ratio is None:
+            origins = np.repeat(np.arange(len(self.tiplocs)), np.diff(self.first))
+            east, north = self.bng[:, 0], self.bng[:, 1]
+            valid = (
+                self.has_loc & (east >= EAST_L) & (east <= EAST_U)
+                & (north >= NORTH_L) & (north <= NORTH_U)
+            )
+
+            delta = (self.bng[origins] - self.bng[self.dests]).astype(np.float64)
+            distances = np.hypot(delta[:, 0], delta[:, 1]) * PLANAR_SCALE
+            known = valid[origins] & valid[self.dests] & (self.weights >= 0) & (distances > 0)
+
+            ratios = self.weights[known] / distances[known]
+            outliers = ratios < PLANAR_RATIO_FLOOR
+            warn_outliers(int(outliers.sum()))
+            self._planar_ratio = float(min(ratios[~outliers].min(initial=1.0), 1.0))
+
+        return self._planar_ratio
+
+    def provenance(self, tiploc_a: str, tiploc_b: str) -> Union[str, None]:
+        """Return where the edge weight for a TIPLOC pair came from"""
+
+        edge = self.edge(tiploc_a, tiploc_b)
+        if edge is None or not self.provenances[edge]:
+            return None
+
+        return self.provenances[edge].decode('utf-8')
+
+    def location(self, tiploc: str) -> Union[LocationRecord, None]:
+        """Return a LocationRecord for the TIPLOC, not added to the registry"""
+
+        ind = self.index(tiploc)
+        if ind is None or not self.has_loc[ind]:
+            return None
+
+        return self.location_at(ind)
+
+    def location_at(self, ind: int) -> LocationRecord:
+        """Return a LocationRecord for the TIPLOC at a position"""
+
+        obj = object.__new__(LocationRecord)
+        obj.location_code = self.tiploc(ind)
+        obj.__dict__.update(zip(
+            LOC_FIELDS,
+            self.string(self.loc_offsets, self.loc_blob, ind).split('\t')
+        ))
+        obj.os_easting = int(self.bng[ind][0])
+        obj.os_northing = int(self.bng[ind][1])
+
+        obj._wgs = None
+        if not np.isnan(self.wgs[ind][0]):
+            obj._wgs = (float(self.wgs[ind][0]), float(self.wgs[ind][1]))
+        obj._wgs_converted = True
+
+        return obj
+
+    def locations(self) -> Iterator[LocationRecord]:
+        """Yield a LocationRecord for each location in the image"""
+
+        for ind in np.flatnonzero(self.has_loc):
+            yield self.location_at(int(ind))
+
+
+def open_image(f_name: str = IMAGE_FILE, sources: list = None) -> Union[NetworkImage, None]:
+    """Return the image, or None if it is missing, unreadable or was built
+    from different source files"""
+
+    if not os.path.isfile(f_name):
+        return None
+
+    try:
+        image = NetworkImage(f_name)
+    except BadNetworkImage:
+        return None
+
+    if sources is not None and image.source != source_key(sources):
+        image.close()
+        return None
+
+    return image
+
+
+def attach(image: Union[NetworkImage, None]) -> None:
+    """Run the LOC, NWK and edge weight lookups against the image (or, given
+    None, against the registries again)"""
+
+    NetworkLink._image = image
+    LocationRecord._image = image
+    EdgeWeight._image = image
+    LocationRecord._search = None
+    NetworkLink.clear_cache()
+
+
+def detach() -> None:
+    """Run the lookups against the registries again"""
+
+    attach(None)
+
+
+def worker_init(f_name: str = IMAGE_FILE) -> None:
+    """Process pool initializer, maps and attaches the image in the worker"""
+
+    attach(NetworkImage(f_name))
@@ -6,11 +6,15 @@ import json
 import functools
 from typing import Union
 
+from err import NotInNetworkImage
+
 
 class NetworkLink:
     """A prepresentation of a NWK record from BPLAN"""
 
     _instances = {}
+    _origins = {}  # Destination TIPLOC -> the origin TIPLOCs linked to it
+    _image = None  # NetworkImage, when attached the queries run against it
 
     def __init__(self, *args):
         """Initialisation"""
@@ -38,6 +42,9 @@ class NetworkLink:
     def return_instance(cls, tiploc: str):
         """Return an instance matching the tiploc passed"""
 
+        if cls._image is not None:
+            raise NotInNetworkImage('NetworkLink.return_instance')
+
         return cls._instances.get(tiploc, None)
 
     @property
@@ -66,6 +73,15 @@ class NetworkLink:
 
         }
 
+    @property
+    def is_bus(self) -> bool:
+        """Return True for a bus link, these are not used for routing"""
+
+        rlc = str(self.running_line_code).upper()
+        rld = str(self.running_line_description).upper()
+
+        return 'BUS' in (rlc, rld)
+
     def __repr__(self) -> str:
         """Return a string representation of the object"""
 
@@ -93,19 +109,31 @@ class NetworkLink:
         else:
             self._instances[self.origin_location][self.destination_location].append(self)
 
+        self._origins.setdefault(self.destination_location, set()).add(self.origin_location)
+
     @classmethod
     @functools.lru_cache()
     def distance(cls, tiploc_a: str, tiploc_b: str) -> int:
         """Calculate the distance between tiploc A and tiploc B"""
 
+        if cls._image is not None:
+            return cls._image.distance(tiploc_a, tiploc_b)
+
         if tiploc_a not in cls._instances:
             return None
 
         if tiploc_b not in cls._instances[tiploc_a]:
             return None
 
+        return cls.shortest_distance(cls._instances[tiploc_a][tiploc_b])
+
+    @staticmethod
+    def shortest_distance(links: list) -> int:
+        """Return the shortest non-zero distance of a list of links between
+        2 tiplocs (999999 if none)"""
+
         _min = 999999
-        for entry in cls._instances[tiploc_a][tiploc_b]:
+        for entry in links:
             if str(entry.distance).strip() == '':
                 continue
             if int(entry.distance) != 0 and int(entry.distance) < _min:
@@ -118,6 +146,9 @@ class NetworkLink:
     def reversable_data(cls, tiploc_a, tiploc_b) -> dict:
         """Pass a TIPLOC pair, get the directions and reversable data"""
 
+        if cls._image is not None:
+            return cls._image.reversable_data(tiploc_a, tiploc_b)
+
         if tiploc_a not in cls._instances:
             return None
 
@@ -143,6 +174,10 @@ class NetworkLink:
     @functools.lru_cache()
     def get_link(cls, tiploc_a, tiploc_b) -> object:
         """return a specific link"""
+
+        if cls._image is not None:
+            raise NotInNetworkImage('NetworkLink.get_link')
+
         if tiploc_a not in cls._instances:
             return None
 
@@ -156,6 +191,11 @@ class NetworkLink:
     def get_neighbours(cls, tiploc: str, alt=False) -> Union[list, dict]:
         """Pass a tiploc, return a list of all reachable TIPLOCS"""
 
+        if cls._image is not None:
+            if alt:
+                raise NotInNetworkImage('NetworkLink.get_neighbours(alt=True)')
+            return cls._image.neighbours(tiploc)
+
         if tiploc not in cls._instances:
             return []
 
@@ -164,11 +204,26 @@ class NetworkLink:
 
         return list(cls._instances[tiploc].keys())
 
+    @classmethod
+    def get_origins(cls, tiploc: str) -> list:
+        """Pass a tiploc, return a list of all TIPLOCS linked to it"""
+
+        if cls._image is not None:
+            raise NotInNetworkImage('NetworkLink.get_origins')
+
+        return [
+            origin for origin in cls._origins.get(tiploc, ())
+            if tiploc in cls._instances.get(origin, {})
+        ]
+
     @classmethod
     @functools.lru_cache()
     def is_valid_tiploc(cls, tiploc: str) -> bool:
         """Returns True if TIPLOC is valid, otherwise False"""
 
+        if cls._image is not None:
+            return cls._image.is_valid_tiploc(tiploc)
+
         return tiploc in cls._instances
 
     @classmethod
@@ -176,7 +231,8 @@ class NetworkLink:
     def get_all_lines(cls, start_tiploc: str, end_tiploc: str) -> list:
         """ Return a list of all unique applicable paths between 2 tiplocs"""
 
-        lines = []
+        if cls._image is not None:
+            return cls._image.all_lines(start_tiploc, end_tiploc)
 
         target_link = cls._instances.get(start_tiploc, None)
         if not target_link:
@@ -186,7 +242,15 @@ class NetworkLink:
         if not end_link:
             return []
 
-        for entry in end_link:
+        return cls.line_codes(end_link)
+
+    @staticmethod
+    def line_codes(links: list) -> list:
+        """Return the sorted line codes of a list of links between 2 tiplocs"""
+
+        lines = []
+
+        for entry in links:
             if not entry.running_line_code.strip():
                 lines.append(
                     f'{entry.initial_direction}L'
@@ -195,4 +259,14 @@ class NetworkLink:
             lines.append(entry.running_line_code)
 
         return sorted(lines)
-        
\ No newline at end of file
+        
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        """Discard the cached query results, after the links have changed"""
+
+        for method in (
+                cls.return_instance, cls.distance, cls.reversable_data,
+                cls.get_link, cls.get_neighbours, cls.is_valid_tiploc,
+                cls.get_all_lines):
+            method.cache_clear()
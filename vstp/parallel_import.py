@@ -0,0 +1,316 @@
+"""Parallel import of BPLAN record types, in a process pool
+
+Each source file is split into byte ranges on line boundaries. The workers
+parse the record types wanted from their range and return the objects, and
+these are merged into the registries in file order, so the registries end up
+exactly as a sequential import would leave them.
+"""
+
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable
+
+from location_record import LocationRecord
+from network_links import NetworkLink
+from timing_links import TimingLink
+from line_platform import LinePlatform
+from activity_codes import ActivityCode
+from edge_weights import EdgeWeight
+from bplan_reader import open_bplan, GZIP_MAGIC, ZIP_MAGIC
+from import_metrics import ImportMetrics, REJECT_FILE, format_report as format_metrics
+from err import MissingPartFile
+
+CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 8 * 1024 * 1024))  # Bytes
+WORKERS = int(os.getenv("IMPORT_WORKERS", 0)) or None  # None, one per CPU
+
+
+def parse_nwk(record: list) -> NetworkLink:
+    """Return the network link for a NWK record, None for BUS links"""
+
+    lnk = NetworkLink(*record)
+    if lnk.is_bus:
+        return None
+
+    return lnk
+
+
+# Records with a different number of fields are rejected, where known
+FIELD_COUNTS = {'LOC': 13, 'NWK': 19, 'TLK': 15}
+
+# Why a record is rejected, where its parser returns None
+FILTERED = {'NWK': 'BUS link, not used for routing'}
+
+PACKED = {'LOC': LocationRecord, 'NWK': NetworkLink}  # Sent back as plain tuples
+
+PARSERS = {
+    'LOC': lambda record: LocationRecord(*record),
+    'NWK': parse_nwk,
+    'TLK': TimingLink.factory_from_TLK,
+    'PLT': lambda record: record,  # Merged by TIPLOC, in the parent
+    'ACT': ActivityCode.factory_from_bplan_entry
+}
+
+
+def is_compressed(f_name: str) -> bool:
+    """Return True for a gzip or zip file, these cannot be split"""
+
+    with open(f_name, 'rb') as file:
+        magic = file.read(4)
+
+    return magic.startswith(GZIP_MAGIC) or magic.startswith(ZIP_MAGIC)
+
+
+def chunk_ranges(f_name: str, chunk_size: int = CHUNK_SIZE) -> list:
+    """Return (start, end) byte ranges covering the file, each ending on a
+    line boundary"""
+
+    size = os.path.getsize(f_name)
+    ranges = []
+    start = 0
+
+    with open(f_name, 'rb') as file:
+        while start < size:
+            end = start + chunk_size
+            if end < size:
+                file.seek(end)
+                file.readline()
+                end = file.tell()
+            end = min(end, size)
+            ranges.append((start, end))
+            start = end
+
+    return ranges
+
+
+def parse_record(record_type: str, record: list) -> tuple:
+    """Parse a split record; returns the object, or None and the reason it
+    was rejected"""
+
+    expected = FIELD_COUNTS.get(record_type, None)
+    if expected and len(record) != expected:
+        return None, f'expected {expected} fields, found {len(record)}'
+
+    try:
+        obj = PARSERS[record_type](record)
+    except (IndexError, ValueError) as err:
+        return None, f'{type(err).__name__}: {err}'.splitlines()[0]
+
+    if obj is None:
+        return None, FILTERED.get(record_type, 'not parsed')
+
+    return obj, None
+
+
+def parse_counted(record_type: str, record: list, metrics: ImportMetrics) -> object:
+    """Parse a split record, counting it read and accepted, or rejected (with
+    the reason) in the metrics; returns the object, None where rejected"""
+
+    metrics.count_read(record_type)
+    obj, reason = parse_record(record_type, record)
+    if obj is None:
+        metrics.reject(record_type, reason, record)
+    else:
+        metrics.accept(record_type)
+
+    return obj
+
+
+def parse_lines(lines: Iterable, record_types: tuple) -> tuple:
+    """Parse the record types wanted from the lines; returns the objects and
+    the seconds spent, each by record type, and the import metrics"""
+
+    parsed = {record_type: [] for record_type in record_types}
+    timings = {record_type: 0.0 for record_type in record_types}
+    metrics = ImportMetrics()
+    chunk_started = time.perf_counter()
+    rows = 0
+
+    for line in lines:
+        record_type = line[:3]
+        if record_type not in parsed:
+            continue
+
+        started = time.perf_counter()
+        rows += 1
+
+        obj = parse_counted(record_type, line.split('\t'), metrics)
+        if obj is not None:
+            parsed[record_type].append(obj)
+        timings[record_type] += time.perf_counter() - started
+
+    if 'LOC' in parsed:
+        started = time.perf_counter()
+        LocationRecord.convert_coordinates(parsed['LOC'])
+        timings['LOC'] += time.perf_counter() - started
+
+    metrics.add_stage('parse', time.perf_counter() - chunk_started, rows)
+    metrics.sample_memory()
+
+    return parsed, timings, metrics
+
+
+def pack(objects: list) -> tuple:
+    """Return the attribute names and a tuple of values for each object, far
+    cheaper to pass between processes than the objects themselves"""
+
+    if not objects:
+        return (), []
+
+    return tuple(vars(objects[0])), [tuple(vars(obj).values()) for obj in objects]
+
+
+def unpack(cls: type, packed: tuple) -> list:
+    """Rebuild the objects from their attribute names and values"""
+
+    keys, rows = packed
+    objects = []
+    for row in rows:
+        obj = object.__new__(cls)
+        obj.__dict__.update(zip(keys, row))
+        objects.append(obj)
+
+    return objects
+
+
+def read_chunk(task: tuple) -> tuple:
+    """Parse the record types wanted from a byte range of a file"""
+
+    f_name, start, end, record_types = task
+
+    with open(f_name, 'rb') as file:
+        file.seek(start)
+        text = file.read(end - start).decode('utf-8', errors='replace')
+
+    return parse_lines(io.StringIO(text, newline=None), record_types)
+
+
+def parse_chunk(task: tuple) -> tuple:
+    """Worker, parse a byte range of a file and pack the results"""
+
+    parsed, timings, metrics = read_chunk(task)
+    for record_type in PACKED:
+        if record_type in parsed:
+            parsed[record_type] = pack(parsed[record_type])
+
+    return parsed, timings, metrics
+
+
+def worker_init() -> None:
+    """Start each worker with empty registries, whatever it inherited"""
+
+    LocationRecord._instances = {}
+    LocationRecord._search = None
+    NetworkLink._instances = {}
+    NetworkLink._origins = {}
+
+
+def merge(parsed: dict, tlks: list) -> None:
+    """Add the parsed objects to the registries"""
+
+    for obj in parsed.get('LOC', []):
+        obj.register()
+
+    for lnk in parsed.get('NWK', []):
+        lnk.append_to_instance()
+
+    tlks.extend(parsed.get('TLK', []))
+
+    for record in parsed.get('PLT', []):
+        LinePlatform.factory_from_bplan_entry(record)
+
+    ActivityCode.instances.extend(parsed.get('ACT', []))
+
+
+def import_parallel(
+        sources: list,
+        record_types: tuple,
+        workers: int = WORKERS,
+        chunk_size: int = CHUNK_SIZE,
+        reject_file: str = REJECT_FILE) -> dict:
+    """Import the record types wanted from the source files (a complete BPLAN
+    or part files), parsing chunks of them concurrently. Returns a report of
+    the records imported by type, the seconds spent in each stage and the
+    import metrics; the rejected records are written to reject_file, if given"""
+
+    started = time.perf_counter()
+
+    tasks = []
+    compressed = []
+    for f_name in sources:
+        if not os.path.isfile(f_name):
+            raise MissingPartFile(f_name)
+        if is_compressed(f_name):
+            compressed.append(f_name)
+            continue
+        for start, end in chunk_ranges(f_name, chunk_size):
+            tasks.append((f_name, start, end, record_types))
+
+    workers = workers or os.cpu_count() or 1
+    if len(tasks) > 1 and workers > 1:
+        with ProcessPoolExecutor(workers, initializer=worker_init) as pool:
+            results = list(pool.map(parse_chunk, tasks))
+        for parsed, _, _ in results:
+            for record_type, cls in PACKED.items():
+                if record_type in parsed:
+                    parsed[record_type] = unpack(cls, parsed[record_type])
+    else:
+        results = [read_chunk(task) for task in tasks]
+
+    for f_name in compressed:
+        with open_bplan(f_name) as file:
+            results.append(parse_lines(file, record_types))
+
+    timings = {'parse': time.perf_counter() - started}
+    parse_by_type = {record_type: 0.0 for record_type in record_types}
+    counts = {record_type: 0 for record_type in record_types}
+
+    metrics = ImportMetrics()
+    started = time.perf_counter()
+    tlks = []
+    for parsed, parse_timings, chunk_metrics in results:
+        merge(parsed, tlks)
+        metrics.merge(chunk_metrics)
+        for record_type in record_types:
+            counts[record_type] += len(parsed[record_type])
+            parse_by_type[record_type] += parse_timings[record_type]
+
+    if 'NWK' in record_types:
+        NetworkLink.clear_cache()
+    timings['merge'] = time.perf_counter() - started
+    metrics.add_stage('merge', timings['merge'], sum(counts.values()))
+
+    if 'LOC' in record_types and 'NWK' in record_types:
+        started = time.perf_counter()
+        EdgeWeight.build(tlks)
+        timings['edge_weights'] = time.perf_counter() - started
+        metrics.add_stage('edge_weights', timings['edge_weights'], counts['NWK'])
+
+    metrics.sample_memory()
+    if reject_file:
+        metrics.write_rejects(reject_file)
+
+    return {
+        'counts': counts,
+        'timings': timings,
+        'parse_by_type': parse_by_type,
+        'chunks': len(tasks) + len(compressed),
+        'timing_links': tlks,
+        'metrics': metrics.report()
+    }
+
+
+def format_report(report: dict) -> str:
+    """Return the import report as text, a line per stage"""
+
+    lines = [f"Parsed {report['chunks']} chunk(s)"]
+    for record_type, count in report['counts'].items():
+        seconds = report['parse_by_type'][record_type]
+        lines.append(f'\t{record_type}: {count} records, {seconds:.2f}s worker time')
+    for stage, seconds in report['timings'].items():
+        lines.append(f'\t{stage}: {seconds:.2f}s')
+    lines.append('Metrics')
+    lines.append(format_metrics(report['metrics']))
+
+    return '\n'.join(lines)
@@ -11,8 +11,13 @@
 
 from network_links import NetworkLink
 from location_record import LocationRecord
+from edge_weights import EdgeWeight
 from err import BadViaList, BadAvoidList, BadTiplocError
 
+HAVERSINE = 'haversine'  # Miles, as the crow flies, via WGS coordinates
+PLANAR = 'planar'  # Metres, straight line on the OS grid, scaled to stay admissible
+SUGGESTIONS = 10  # Maximum suggestions shown for an unknown TIPLOC
+
 class Node:
     """Pathfinder Node"""
 
@@ -41,13 +46,26 @@ class Node:
 class Pathfinder:
     """Class for finding the path between a TIPLOC pair"""
 
-    def __init__(self, start_tiploc: str, end_tiploc: str, via=None, avoid=None, legs=False):
+    def __init__(
+            self,
+            start_tiploc: str,
+            end_tiploc: str,
+            via=None,
+            avoid=None,
+            legs=False,
+            heuristic=HAVERSINE):
         """Initialisation"""
 
         Pathfinder.validate_tiploc(start_tiploc)
         Pathfinder.validate_tiploc(end_tiploc)
 
         self.as_legs = legs
+        self.planar = heuristic == PLANAR
+
+        # Weights can be shorter than the straight line, scale it down so the
+        # planar estimate does not exceed the weight of a path (but through
+        # the outliers below PLANAR_RATIO_FLOOR)
+        self.planar_ratio = EdgeWeight.planar_ratio() if self.planar else 1.0
 
         self.via = via  # Tiplocs where the service MUST run via
         if self.via and not isinstance(self.via, list):
@@ -87,32 +105,56 @@ class Pathfinder:
         # Enrich legs with info needed to process
         for leg in self.legs:
 
-            node_a_coord = LocationRecord.return_instance(
-                self.routing_leg_nodes[leg[0]].tiploc).wgs_coordinates
+            node_a_coord = self.coordinates(self.routing_leg_nodes[leg[0]].tiploc)
 
-            node_b_coord = LocationRecord.return_instance(
-                self.routing_leg_nodes[leg[1]].tiploc).wgs_coordinates
+            node_b_coord = self.coordinates(self.routing_leg_nodes[leg[1]].tiploc)
 
-            self.routing_leg_nodes[leg[0]].distance_to_go = LocationRecord.distance(
+            self.routing_leg_nodes[leg[0]].distance_to_go = self.estimate(
                 node_a_coord,
                 node_b_coord
             )
 
+            if self.planar and self.routing_leg_nodes[leg[0]].distance_to_go is None:
+                self.routing_leg_nodes[leg[0]].distance_to_go = 0
+
             self.routing_leg_nodes[leg[0]].heuristic = self.routing_leg_nodes[leg[0]].distance_to_go
 
             self.routing_leg_nodes[leg[1]].coords = node_b_coord
 
+    def coordinates(self, tiploc: str) -> tuple:
+        """Return the coordinates of a TIPLOC, as used by the heuristic"""
+
+        record = LocationRecord.return_instance(tiploc)
+        if not record:
+            return None
+
+        if self.planar:
+            return record.bng_coordinates
+
+        return record.wgs_coordinates
+
+    def estimate(self, coord_a: tuple, coord_b: tuple) -> float:
+        """Return the heuristic distance between two sets of coordinates"""
+
+        if self.planar:
+            distance = LocationRecord.planar_distance(coord_a, coord_b)
+            if distance is None:
+                return None
+            return distance * self.planar_ratio
+
+        return LocationRecord.distance(coord_a, coord_b)
+
     @staticmethod
     def validate_tiploc(tiploc: str):
         """Raises an appropriate exception if the TIPLOC passed is not valid"""
 
         if not NetworkLink.is_valid_tiploc(tiploc):
-            suggestions = LocationRecord.match_locations(tiploc)
+            suggestions = LocationRecord.match_locations(tiploc, limit=SUGGESTIONS)
             print(f'\n!! error, unknown TIPLOC: {tiploc} !!\n')
             print('Suggestions are (or try searching for more):\n')
             if suggestions:
                 for result in suggestions:
-                    print(f'\t{result.split(":")}')
+                    print(f'\t{result.location_code}: {result.location_name}')
             print()
             raise BadTiplocError(tiploc)
 
@@ -208,31 +250,33 @@ class Pathfinder:
 
                 new_node = Node(tpl, parent=cur_node)
 
-                # Path Cost (Distance to parent)
-                path_cost = NetworkLink.distance(
-                    new_node.parent.tiploc,
-                    tpl
-                )
+                # Path Cost (Distance to parent), resolved at load time
+                path_cost = EdgeWeight.weight_of(cur_tpl, tpl)
 
                 new_node.m_dist = path_cost
 
-                if int(path_cost) == 0 or int(path_cost) == 999999:
-                    path_cost = cur_path_cost
-
-                tpl_coord = LocationRecord.return_instance(tpl).wgs_coordinates
+                tpl_coord = self.coordinates(tpl)
 
                 # Distance to go (Distance ATCF to end TIPLOC)
-                distance_to_go = LocationRecord.distance(
+                distance_to_go = self.estimate(
                     tpl_coord,
                     end_node.coords
                 )
 
-                if not distance_to_go:
+                if self.planar:
+                    if distance_to_go is None:
+                        # Still admissible, by the triangle inequality
+                        distance_to_go = max(cur_distance_to_go - path_cost, 0)
+                elif not distance_to_go:
                     distance_to_go = cur_distance_to_go
 
                 if new_node in closedset:
                     continue
 
+                if self.planar:
+                    self.update_openset(openset, new_node, cur_path_cost + path_cost, distance_to_go)
+                    continue
+
                 if new_node in openset:
                     new_heuristic = cur_node.heuristic + path_cost
                     if new_node.heuristic > new_heuristic:
@@ -243,3 +287,21 @@ class Pathfinder:
                     new_node.distance_to_go = distance_to_go
                     new_node.parent = cur_node
                     openset.append(new_node)
+
+    @staticmethod
+    def update_openset(openset: list, new_node: Node, path_cost: int, distance_to_go: float):
+        """Add a node to the open set, or re-parent the queued node if this
+        path to it is shorter; ranks nodes by path cost plus distance to go"""
+
+        if new_node in openset:
+            queued = openset[openset.index(new_node)]
+            if path_cost < queued.path_cost:
+                queued.path_cost = path_cost
+                queued.heuristic = path_cost + queued.distance_to_go
+                queued.parent = new_node.parent
+            return
+
+        new_node.path_cost = path_cost
+        new_node.distance_to_go = distance_to_go
+        new_node.heuristic = path_cost + distance_to_go
+        openset.append(new_node)
@@ -0,0 +1,270 @@
+"""Reverse geocoding of WGS84 (lat, lon) points, with interchangeable backends
+
+'local' finds the nearest railway locations from the NaPTAN 9100 station
+coordinates and the LOC coordinates, through a SpatialIndex, with no network
+access. 'osm' runs the geocode command line tool against OpenStreetMap, a
+request per point, spaced to respect its usage policy.
+
+Either is wrapped in a persistent JSON cache, and points are resolved in
+batches: the cached ones are answered from the cache, the rest passed to the
+backend in one call, and the cache written once.
+"""
+
+import hashlib
+from abc import ABC, abstractmethod
+import json
+import os
+import subprocess
+import time
+from typing import Iterable, Union
+
+from bng_latlon import WGS84toOSGB36
+from location_record import LocationRecord
+from spatial_index import SpatialIndex
+
+GEOCODER = os.getenv("GEOCODER", 'local')  # local or osm
+GEOCODE_CACHE = os.getenv("GEOCODE_CACHE", 'geocode.json')
+NAPTAN_9100 = os.getenv("NAPTAN_9100", './reference_data/9100.csv')
+OSM_DELAY = float(os.getenv("OSM_DELAY", 0.5))  # Seconds between OSM requests
+NEAREST = 3  # Places returned by the local backend
+PRECISION = 5  # Decimal places of lat/lon in the cache key, about 1 metre
+
+
+class Geocoder(ABC):
+    """A reverse geocoding backend"""
+
+    name = ''
+
+    @abstractmethod
+    def reverse(self, point: tuple) -> Union[dict, None]:
+        """Return what is at a (lat, lon) point, None if not known"""
+
+    def reverse_many(self, points: Iterable) -> dict:
+        """Return what is at each (lat, lon) point, keyed on point"""
+
+        return {point: self.reverse(point) for point in points}
+
+
+class LocalGeocoder(Geocoder):
+    """The nearest railway locations, from the NaPTAN and LOC coordinates"""
+
+    def __init__(self, places: dict, k: int = NEAREST):
+        """Initialisation; places maps a TIPLOC to its (name, easting,
+        northing, source)"""
+
+        self.places = places
+        self.k = k
+        self.index = SpatialIndex()
+        for tiploc, (_, easting, northing, _) in places.items():
+            self.index.insert(tiploc, easting, northing)
+
+        digest = hashlib.blake2b(digest_size=8)
+        for tiploc in sorted(places):
+            digest.update(repr((tiploc, places[tiploc])).encode('utf-8'))
+        self.name = f'local:{digest.hexdigest()}'
+
+    @staticmethod
+    def read_naptan(f_name: str = NAPTAN_9100) -> dict:
+        """Return the NaPTAN station (easting, northing) of each TIPLOC"""
+
+        coordinates = {}
+        if not os.path.isfile(f_name):
+            return coordinates
+
+        with open(f_name, 'r', encoding='utf-8') as csv:
+            for line in csv:
+                values = [value.strip() for value in line.split(',')]
+                try:
+                    coordinates[values[0]] = (int(values[1]), int(values[2]))
+                except (IndexError, ValueError):
+                    continue
+
+        return coordinates
+
+    @classmethod
+    def from_sources(
+            cls,
+            locations: Iterable = None,
+            naptan_file: str = NAPTAN_9100,
+            k: int = NEAREST) -> object:
+        """Build from the NaPTAN file and locations, (tiploc, name, easting,
+        northing) tuples (by default the LOC records). NaPTAN coordinates are
+        preferred, LOC coordinates fill in the rest"""
+
+        if locations is None:
+            locations = (
+                (loc.location_code, loc.location_name, *(loc.bng_coordinates or (None, None)))
+                for loc in LocationRecord.locations()
+            )
+
+        places = {}
+        names = {}
+        for tiploc, name, easting, northing in locations:
+            names[tiploc] = name
+            try:
+                bng = (int(easting), int(northing))
+            except (TypeError, ValueError):
+                continue
+            if LocationRecord.valid_coord(bng[0], 'easting') and LocationRecord.valid_coord(bng[1], 'northing'):
+                places[tiploc] = (name, *bng, 'LOC')
+
+        for tiploc, bng in cls.read_naptan(naptan_file).items():
+            places[tiploc] = (names.get(tiploc, tiploc), *bng, 'NAPTAN')
+
+        return cls(places, k)
+
+    def reverse(self, point: tuple) -> Union[dict, None]:
+        """Return the nearest places to a (lat, lon) point"""
+
+        if not self.places:
+            return None
+
+        easting, northing = WGS84toOSGB36(*point)
+        nearest = self.index.nearest(easting, northing, k=self.k)
+
+        return {
+            'places': [
+                {
+                    'tiploc': tiploc,
+                    'name': self.places[tiploc][0],
+                    'distance': round(distance),
+                    'source': self.places[tiploc][3]
+                }
+                for distance, tiploc in nearest
+            ]
+        }
+
+
+class OSMGeocoder(Geocoder):
+    """OpenStreetMap, through the geocode command line tool"""
+
+    name = 'osm'
+
+    def __init__(self, delay: float = OSM_DELAY):
+        """Initialisation"""
+
+        self.delay = delay
+        self.last_request = None
+
+    @staticmethod
+    def load_json(stdout: Union[str, bytes]) -> Union[dict, None]:
+        """Loads a json object from a geocoder request"""
+
+        if isinstance(stdout, bytes):
+            stdout = stdout.decode('utf-8')
+        try:
+            return json.loads(stdout)
+        except ValueError:
+            return None
+
+    def reverse(self, point: tuple) -> Union[dict, None]:
+        """Sends a geocoder request and returns the results as dict"""
+
+        if self.last_request is not None:
+            wait = self.delay - (time.monotonic() - self.last_request)
+            if wait > 0:
+                time.sleep(wait)
+
+        args = f'"{point[0]}, {point[1]}"'
+        proc = subprocess.run(
+            ['geocode', '-m', 'reverse', '-p', 'osm', args],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False
+        )
+        self.last_request = time.monotonic()
+
+        return self.load_json(proc.stdout)
+
+
+BACKENDS = {
+    'local': LocalGeocoder.from_sources,
+    'osm': OSMGeocoder,
+}
+
+
+class CachedGeocoder(Geocoder):
+    """A backend, with its results kept in a JSON file"""
+
+    def __init__(self, backend: Geocoder, cache_file: str = GEOCODE_CACHE):
+        """Initialisation"""
+
+        self.backend = backend
+        self.name = backend.name
+        self.cache_file = cache_file
+        self.cache = {}
+        if cache_file and os.path.isfile(cache_file):
+            with open(cache_file, 'r', encoding='utf-8') as file:
+                try:
+                    self.cache = json.load(file)
+                except ValueError:
+                    self.cache = {}
+
+    def key(self, point: tuple) -> str:
+        """Return the cache key of a point"""
+
+        return f'{self.backend.name}:{point[0]:.{PRECISION}f},{point[1]:.{PRECISION}f}'
+
+    def save(self) -> None:
+        """Write the cache file"""
+
+        if not self.cache_file:
+            return
+
+        temp_name = f'{self.cache_file}.tmp'
+        with open(temp_name, 'w', encoding='utf-8') as file:
+            json.dump(self.cache, file)
+
+        os.replace(temp_name, self.cache_file)
+
+    def reverse(self, point: tuple) -> Union[dict, None]:
+        """Return what is at a (lat, lon) point"""
+
+        return self.reverse_many([point])[point]
+
+    def reverse_many(self, points: Iterable) -> dict:
+        """Return what is at each (lat, lon) point, keyed on point; only the
+        points not cached are passed to the backend"""
+
+        points = list(dict.fromkeys(points))
+        missing = [point for point in points if self.key(point) not in self.cache]
+
+        if missing:
+            for point, result in self.backend.reverse_many(missing).items():
+                if result is not None:
+                    self.cache[self.key(point)] = result
+            self.save()
+
+        return {point: self.cache.get(self.key(point)) for point in points}
+
+
+def get_geocoder(
+        name: str = GEOCODER,
+        cache_file: str = GEOCODE_CACHE,
+        locations: Iterable = None,
+        naptan_file: str = NAPTAN_9100) -> CachedGeocoder:
+    """Return the named backend, cached; locations and the NaPTAN file are
+    passed to the local backend"""
+
+    if name == 'local':
+        return CachedGeocoder(LocalGeocoder.from_sources(locations, naptan_file), cache_file)
+
+    return CachedGeocoder(BACKENDS[name](), cache_file)
+
+
+def describe(result: Union[dict, None]) -> str:
+    """Return a one line summary of a reverse geocoding result"""
+
+    if not result:
+        return 'unknown'
+
+    if 'places' in result:
+        return ', '.join(
+            f"{place['name']} ({place['tiploc']}) {place['distance']}m"
+            for place in result['places']
+        )
+
+    if 'postal' in result:
+        return str(result['postal'])
+
+    return json.dumps(result)
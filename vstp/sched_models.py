@@ -1,9 +1,10 @@
 """VSTP schedule models"""
 
-from typing import List, Union
+from typing import List
 import pydantic
-from network_links import NetworkLink
 from location_record import LocationRecord
+from edge_weights import EdgeWeight
+from elr_mileages import ELRIndex
 
 class ScheduleEntry(pydantic.BaseModel):
     """A representation of a VSTP schedule entry"""
@@ -12,6 +13,8 @@ class ScheduleEntry(pydantic.BaseModel):
     tiploc: str
     name: str
     mileage: str = pydantic.Field(default='0')
+    elr: str = pydantic.Field(default='')
+    elr_mileage: str = pydantic.Field(default='')
     path: str = pydantic.Field(default='')
     arr: str = pydantic.Field(default='')
     platform: str = pydantic.Field(default='')
@@ -60,11 +63,6 @@ class Schedule(pydantic.BaseModel):
     
     def update_mileages(self, func: object) -> None:
         """func represents the object to extrapolate the mileages"""
-        
-        def get_measured_link(links: list) -> Union[int, None]:
-            for ind, link in enumerate(links):
-                if link.distance.isnumeric():
-                    return ind
 
         previous_tiploc = None
         previous_mileage = 0
@@ -79,18 +77,23 @@ class Schedule(pydantic.BaseModel):
             if not float(row.mileage):
 
                 
-                links = NetworkLink.get_link(previous_tiploc, row.tiploc)
-                index = get_measured_link(links)
-                link = links[index]
-
-                if not int(link.distance) or int(link.distance) == 1:
-                    link.distance = self.get_geo_distance(previous_tiploc, row.tiploc)
-                distance = int(link.distance) + previous_mileage
+                weight = EdgeWeight.weight_of(previous_tiploc, row.tiploc)
+                if weight is None:
+                    weight = int(self.get_geo_distance(previous_tiploc, row.tiploc))
+                distance = weight + previous_mileage
                 previous_mileage = distance
                 conv = round((distance / 1000) * 0.621371, 2)
                 row.mileage = str(conv)
                 previous_tiploc = row.tiploc
-            
+
+    def update_elr_mileages(self, index: ELRIndex = None) -> int:
+        """Tag each row with its ELR and mileage (miles.chains); run after
+        update_mileages, so rows between known mileages can be interpolated"""
+
+        if index is None:
+            index = ELRIndex.default()
+
+        return index.annotate(self.rows)
  
     def extrapolate_lp(self) -> None:
         """ Extrapolate missing line/path from some values """
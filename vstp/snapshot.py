@@ -0,0 +1,167 @@
+"""A versioned binary snapshot of the loaded network, for fast startup
+
+The snapshot holds the LOC and NWK registries (TIPLOCs interned, links
+keyed on TIPLOC index, coordinates already converted) and the resolved
+edge weights. It is keyed on hashes of the source files it was built
+from, and is ignored once any of them change.
+"""
+
+import hashlib
+import json
+import marshal
+import os
+import struct
+import sys
+from typing import Union
+
+from location_record import LocationRecord
+from network_links import NetworkLink
+from edge_weights import EdgeWeight
+from spatial_index import SpatialIndex
+
+SNAPSHOT_FILE = os.getenv("SNAPSHOT_FILE", 'vstp.snap')
+MAGIC = b'VSTPSNAP'
+VERSION = 1
+HEADER = struct.Struct('<8sII')  # magic, version, length of the source key
+
+LOC_FIELDS = (
+    'location_name', 'start_date', 'end_date', 'os_easting', 'os_northing',
+    'timing_point_type', 'zone', 'stanox_code', 'off_network_indicator',
+    'force_lpb', '_wgs', '_wgs_converted'
+)
+
+NWK_FIELDS = (
+    'running_line_code', 'running_line_description', 'start_date',
+    'end_date', 'initial_direction', 'final_direction', 'distance', 'doo_p',
+    'doo_np', 'retb', 'zone', 'reversable', 'power', 'route_a', 'max_len'
+)
+
+
+def file_hash(f_name: str) -> str:
+    """Return a hash of the file content"""
+
+    digest = hashlib.blake2b()
+    with open(f_name, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def source_key(sources: list) -> str:
+    """Return the key identifying the content of the source files"""
+
+    return json.dumps(
+        {os.path.basename(f_name): file_hash(f_name) for f_name in sources},
+        sort_keys=True
+    )
+
+
+def save(f_name: str = SNAPSHOT_FILE, sources: list = None) -> None:
+    """Write the currently loaded network to a snapshot file"""
+
+    tiplocs = sorted(
+        set(LocationRecord._instances) |
+        set(NetworkLink._instances) |
+        {dest for dests in NetworkLink._instances.values() for dest in dests}
+    )
+    index = {tiploc: ind for ind, tiploc in enumerate(tiplocs)}
+
+    locations = [
+        (index[tiploc], *(getattr(obj, field) for field in LOC_FIELDS))
+        for tiploc, obj in LocationRecord._instances.items()
+    ]
+
+    links = [
+        (index[origin], index[dest], *(getattr(lnk, field) for field in NWK_FIELDS))
+        for origin, dests in NetworkLink._instances.items()
+        for dest, lnks in dests.items()
+        for lnk in lnks
+    ]
+
+    weights = [
+        (index[origin], index[dest], obj.weight, obj.provenance)
+        for origin, dests in EdgeWeight._instances.items()
+        for dest, obj in dests.items()
+    ]
+
+    key = source_key(sources or []).encode('utf-8')
+    payload = marshal.dumps((tiplocs, locations, links, weights))
+
+    temp_name = f'{f_name}.tmp'
+    with open(temp_name, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(key)))
+        file.write(key)
+        file.write(payload)
+
+    os.replace(temp_name, f_name)
+
+
+def read(f_name: str = SNAPSHOT_FILE, sources: list = None) -> Union[tuple, None]:
+    """Return the snapshot content, or None if missing, stale or unreadable"""
+
+    if not os.path.isfile(f_name):
+        return None
+
+    with open(f_name, 'rb') as file:
+        try:
+            magic, version, key_len = HEADER.unpack(file.read(HEADER.size))
+        except struct.error:
+            return None
+
+        if magic != MAGIC or version != VERSION:
+            return None
+
+        if file.read(key_len).decode('utf-8') != source_key(sources or []):
+            return None
+
+        try:
+            return marshal.loads(file.read())
+        except (EOFError, ValueError, TypeError):
+            return None
+
+
+def load(f_name: str = SNAPSHOT_FILE, sources: list = None) -> bool:
+    """Populate the LOC, NWK and edge weight registries from the snapshot;
+    returns False (loading nothing) if it is missing or stale"""
+
+    content = read(f_name, sources)
+    if content is None:
+        return False
+
+    tiplocs, locations, links, weights = content
+    tiplocs = [sys.intern(tiploc) for tiploc in tiplocs]
+
+    # Replace, rather than add to, anything already loaded
+    LocationRecord._instances.clear()
+    NetworkLink._instances.clear()
+    NetworkLink._origins.clear()
+    EdgeWeight._instances.clear()
+    NetworkLink.clear_cache()
+
+    for values in locations:
+        obj = object.__new__(LocationRecord)
+        obj.location_code = tiplocs[values[0]]
+        obj.__dict__.update(zip(LOC_FIELDS, values[1:]))
+        LocationRecord._instances[obj.location_code] = obj
+
+    for values in links:
+        lnk = object.__new__(NetworkLink)
+        lnk.origin_location = tiplocs[values[0]]
+        lnk.destination_location = tiplocs[values[1]]
+        lnk.__dict__.update(zip(NWK_FIELDS, values[2:]))
+        lnk.append_to_instance()
+
+    for origin, dest, weight, provenance in weights:
+        EdgeWeight._instances.setdefault(tiplocs[origin], {})[tiplocs[dest]] = EdgeWeight(
+            tiplocs[origin], tiplocs[dest], weight, provenance
+        )
+
+    # The locations changed wholesale, the indexes over them are rebuilt
+    LocationRecord._version += 1
+    LocationRecord._search = None
+    SpatialIndex.reset()
+    EdgeWeight._planar_ratio = None
+    NetworkLink.clear_cache()
+
+    return True
@@ -0,0 +1,200 @@
+"""A uniform grid spatial index over OS easting/northing coordinates"""
+
+import heapq
+from typing import Hashable, List, Tuple, Union
+
+from bng_latlon import WGS84toOSGB36
+from location_record import LocationRecord
+
+CELL_SIZE = 2000  # Metres
+
+
+class SpatialIndex:
+    """Uniform grid over OS grid coordinates, for nearest and area queries"""
+
+    _default = None
+
+    def __init__(self, cell_size: int = CELL_SIZE):
+        """Initialisation"""
+
+        self.cell_size = cell_size
+        self.cells = {}
+        self.points = {}
+        self.bounds = None  # Extent of occupied cells, (min_e, min_n, max_e, max_n)
+
+    def __len__(self) -> int:
+        """Return the number of points indexed"""
+
+        return len(self.points)
+
+    def cell(self, easting: float, northing: float) -> tuple:
+        """Return the grid cell containing the coordinates"""
+
+        return (int(easting // self.cell_size), int(northing // self.cell_size))
+
+    def insert(self, key: Hashable, easting: float, northing: float) -> None:
+        """Add (or move) a point in the index"""
+
+        if key in self.points:
+            self.remove(key)
+
+        cell = self.cell(easting, northing)
+        self.points[key] = (easting, northing)
+        self.cells.setdefault(cell, set()).add(key)
+
+        if not self.bounds:
+            self.bounds = cell + cell
+            return
+
+        self.bounds = (
+            min(self.bounds[0], cell[0]), min(self.bounds[1], cell[1]),
+            max(self.bounds[2], cell[0]), max(self.bounds[3], cell[1])
+        )
+
+    def remove(self, key: Hashable) -> None:
+        """Remove a point from the index, if present"""
+
+        point = self.points.pop(key, None)
+        if not point:
+            return
+
+        cell = self.cell(*point)
+        self.cells[cell].discard(key)
+        if not self.cells[cell]:
+            del self.cells[cell]
+
+    @classmethod
+    def from_locations(cls, locations: list = None, cell_size: int = CELL_SIZE) -> object:
+        """Build an index of TIPLOCs from LocationRecords with valid coordinates"""
+
+        if locations is None:
+            locations = LocationRecord.locations()
+
+        index = cls(cell_size)
+        for location in locations:
+            bng = location.bng_coordinates
+            if bng:
+                index.insert(location.location_code, *bng)
+
+        return index
+
+    @classmethod
+    def default(cls) -> object:
+        """Return the TIPLOC index, built once from the LOC records"""
+
+        if cls._default is None:
+            cls._default = cls.from_locations()
+
+        return cls._default
+
+    @classmethod
+    def reset(cls) -> None:
+        """Discard the TIPLOC index, it will be rebuilt when next needed"""
+
+        cls._default = None
+
+    def distance(self, key: Hashable, easting: float, northing: float) -> float:
+        """Return the distance in metres from an indexed point"""
+
+        point = self.points[key]
+        return ((point[0] - easting) ** 2 + (point[1] - northing) ** 2) ** 0.5
+
+    def ring(self, centre: tuple, radius: int) -> list:
+        """Return the occupied cells exactly radius cells away from the centre"""
+
+        cells = []
+        for d_east in range(-radius, radius + 1):
+            for d_north in (-radius, radius) if abs(d_east) < radius else range(-radius, radius + 1):
+                cell = (centre[0] + d_east, centre[1] + d_north)
+                if cell in self.cells:
+                    cells.append(cell)
+
+        return cells
+
+    def max_ring(self, centre: tuple) -> int:
+        """Return the furthest ring from the centre that could hold any cell"""
+
+        if not self.bounds:
+            return -1
+
+        return max(
+            centre[0] - self.bounds[0], self.bounds[2] - centre[0],
+            centre[1] - self.bounds[1], self.bounds[3] - centre[1]
+        )
+
+    def nearest(
+            self,
+            easting: float,
+            northing: float,
+            k: int = 1,
+            max_distance: float = None) -> List[Tuple[float, Hashable]]:
+        """Return up to k (distance, key) pairs nearest the point, closest first"""
+
+        centre = self.cell(easting, northing)
+        furthest = self.max_ring(centre)
+        best = []  # max heap of (-distance, key)
+
+        radius = 0
+        while radius <= furthest:
+            for cell in self.ring(centre, radius):
+                for key in self.cells[cell]:
+                    dist = self.distance(key, easting, northing)
+                    if max_distance is not None and dist > max_distance:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-dist, key))
+                    elif dist < -best[0][0]:
+                        heapq.heapreplace(best, (-dist, key))
+
+            # Anything in the next ring is at least this far away
+            bound = radius * self.cell_size
+            if len(best) == k and -best[0][0] <= bound:
+                break
+            if max_distance is not None and bound > max_distance:
+                break
+            radius += 1
+
+        return sorted((-dist, key) for dist, key in best)
+
+    def within_radius(self, easting: float, northing: float, radius: float) -> List[Tuple[float, Hashable]]:
+        """Return all (distance, key) pairs within radius metres, closest first"""
+
+        results = []
+        for key in self.within_bbox(
+                easting - radius, northing - radius,
+                easting + radius, northing + radius):
+            dist = self.distance(key, easting, northing)
+            if dist <= radius:
+                results.append((dist, key))
+
+        return sorted(results)
+
+    def within_bbox(self, min_e: float, min_n: float, max_e: float, max_n: float) -> list:
+        """Return all keys inside the bounding box"""
+
+        low = self.cell(min_e, min_n)
+        high = self.cell(max_e, max_n)
+
+        keys = []
+        for cell_e in range(low[0], high[0] + 1):
+            for cell_n in range(low[1], high[1] + 1):
+                for key in self.cells.get((cell_e, cell_n), ()):
+                    point = self.points[key]
+                    if min_e <= point[0] <= max_e and min_n <= point[1] <= max_n:
+                        keys.append(key)
+
+        return keys
+
+    @staticmethod
+    def parse_point(text: str) -> Union[tuple, None]:
+        """Parse "easting, northing" or "lat, lon", return easting/northing"""
+
+        try:
+            first, second = [float(value) for value in text.split(',')]
+        except ValueError:
+            return None
+
+        if abs(first) <= 90 and abs(second) <= 180:
+            return WGS84toOSGB36(first, second)
+
+        return (first, second)
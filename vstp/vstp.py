@@ -8,10 +8,11 @@ import os
 import argparse
 from enum import Enum
 from typing import List, Union
-from pathfinder import Pathfinder
+from pathfinder import Pathfinder, HAVERSINE, PLANAR
 from network_links import NetworkLink
 import bplan_import as f_import
 from location_record import LocationRecord
+from spatial_index import SpatialIndex
 from line_platform import LinePlatform
 from sched_models import Schedule
 from rich.console import Console
@@ -21,12 +22,6 @@ from rich.style import Style
 from rich.prompt import Confirm
 from jinja2 import Template
 
-# import the BPLAN files - needed only once
-f_import.import_location()
-f_import.import_network_links()
-f_import.import_line_platform()
-f_import.import_activity_codes()
-
 CONSOLE = Console()
 
 NO_ARGS = """
@@ -57,7 +52,7 @@ class FullTripTable(Table):
 
     HEADERS = [
         "#", "TIPLOC", "Name",
-        "Mileage", "Path", "Arrive",
+        "Mileage", "ELR", "ELR Mileage", "Path", "Arrive",
         "Platform", "Depart", "Line",
         "Activity", "Engineering",
         "Performance", "Pathing", "LPB?"
@@ -131,7 +126,7 @@ class RouteRequestTable():
 
 class TiplocTable():
     """ Table to display TIPLOC's and related information """
-    def __init__(self, results, lines=False):
+    def __init__(self, results, lines=False, distances=False):
 
         self.table = Table(show_header=True, header_style="bold magenta")
 
@@ -145,6 +140,9 @@ class TiplocTable():
         if lines:
             self.table.add_column('Lines')
 
+        if distances:
+            self.table.add_column('Distance (m)')
+
         for key, match in enumerate(results):
             row_fields = [
                 match.location_code,
@@ -155,6 +153,8 @@ class TiplocTable():
             ]
             if lines and hasattr(match, 'lines'):
                 row_fields.append(str(match.lines))
+            if distances and hasattr(match, 'distance_from'):
+                row_fields.append(str(int(match.distance_from)))
 
             self.table.add_row(str(key + 1), *row_fields)
 
@@ -349,6 +349,7 @@ class EditSchedule:
     @staticmethod
     def print_trip(con: Console, current_trip: List, sched: Schedule) -> None:
         """ Print the current trip with edit options """
+        f_import.ensure_loaded('PLT', 'ACT')
         con.clear()
         con.print(
             Markdown(
@@ -360,6 +361,7 @@ class EditSchedule:
 
         tab = FullTripTable()
         sched.update_mileages(None)
+        sched.update_elr_mileages()
         tab.populate_from_schedule(sched)
         con.print(tab)
         answer = CONSOLE.input(EDIT_SCHEDULE)
@@ -407,12 +409,33 @@ psr.add_argument(
     default=False,
     help='Show output as grouped legs between via TIPLOCS'
 )
+psr.add_argument(
+    '--planar',
+    action='store_true',
+    default=False,
+    help='Guide the search with OS grid distances (metres), not lat/lon'
+)
 psr.add_argument(
     '--from_loc',
     type=str,
     help='from <TIPLOC> show all linked locations'
 )
 psr.add_argument('--find', type=str, help='find TIPLOC')
+psr.add_argument(
+    '--near',
+    type=str,
+    help='"EASTING, NORTHING" or "LAT, LON" show the nearest TIPLOCs'
+)
+psr.add_argument(
+    '--count',
+    type=int,
+    help='The number of TIPLOCs to show for --near (default 10)'
+)
+psr.add_argument(
+    '--radius',
+    type=int,
+    help='Show all TIPLOCs within this many metres for --near'
+)
 psr.add_argument(
     '--build',
     type=str,
@@ -426,7 +449,9 @@ if not any(args.__dict__.values()):
     CONSOLE.print(Markdown(NO_ARGS))
     sys.exit()
 
+# Each option imports only the records it needs, on first use
 if args.find:
+    f_import.ensure_loaded('LOC')
     CONSOLE.print(Markdown(f"# TIPLOC search: ```{args.find}```"))
     results = LocationRecord.match_locations(args.find)
     table = TiplocTable(results)
@@ -437,13 +462,49 @@ if args.find:
         CONSOLE.print(table.table)
     sys.exit(0)
 
+if args.near:
+    point = SpatialIndex.parse_point(args.near)
+    if not point:
+        CONSOLE.print(Markdown(f"# ERROR, invalid coordinates: ```{args.near}```"))
+        sys.exit(1)
+
+    f_import.ensure_loaded('LOC')
+    index = SpatialIndex.default()
+    count = args.count or 10
+    if args.radius:
+        results = index.within_radius(*point, args.radius)
+    else:
+        results = index.nearest(*point, k=count)
+
+    if args.end and not args.start:
+        # Start the route from the nearest TIPLOC on the network
+        f_import.ensure_loaded('NWK')
+        for _, tiploc in index.nearest(*point, k=count):
+            if NetworkLink.is_valid_tiploc(tiploc):
+                args.start = tiploc
+                break
+
+    if not args.start:
+        CONSOLE.print(Markdown(f"# TIPLOCs near: ```{args.near}```"))
+        locs = []
+        for distance, tiploc in results:
+            rcd = LocationRecord.return_instance(tiploc)
+            rcd.distance_from = distance
+            locs.append(rcd)
+        table = TiplocTable(locs, distances=True)
+        CONSOLE.print(table.table)
+        sys.exit(0)
+
 if args.from_loc:
 
+    f_import.ensure_loaded('LOC', 'NWK')
     CONSOLE.print(Markdown(f"# Network Links: ```{args.from_loc}```"))
-    results = f_import.NetworkLink.get_neighbours(args.from_loc, alt=True)
+    results = f_import.NetworkLink.get_neighbours(args.from_loc)
     locs = []
     for result in results:
-        rcd = LocationRecord._instances[result]
+        rcd = LocationRecord.return_instance(result)
+        if not rcd:
+            continue
         rcd.lines = f_import.NetworkLink.get_all_lines(args.from_loc, result)
         locs.append(rcd)
     table = TiplocTable(locs, lines=True)
@@ -452,32 +513,42 @@ if args.from_loc:
 
 if args.build:
 
+    f_import.ensure_loaded('LOC', 'NWK')
     links = []
 
     def trip_table(cur_trip: list) -> str:
         """ Populate and return a trip table """
         locs = []
         for result in cur_trip:
-            rcd = LocationRecord._instances[result[1]]
+            rcd = LocationRecord.return_instance(result[1])
             locs.append(rcd)
         return TiplocTable(locs).table
 
-    def get_links(tiploc: str) -> str:
-        """ Get the NW links for the given tiploc """
+    def get_links(tiploc: str, search: str = '') -> str:
+        """ Get the NW links for the given tiploc, optionally filtered """
         results = f_import.NetworkLink.get_neighbours(tiploc)
+        if search:
+            matches = {
+                rcd.location_code
+                for rcd in LocationRecord.match_locations(search)
+            }
+            results = [result for result in results if result in matches]
         locs = []
-        for index, result in enumerate(results):
-            rcd = LocationRecord._instances[result]
-            locs.append([str(index + 1), rcd.location_code, rcd.location_name])
+        for result in results:
+            rcd = LocationRecord.return_instance(result)
+            if not rcd:
+                continue
+            locs.append([str(len(locs) + 1), rcd.location_code, rcd.location_name])
         return locs
 
     current_trip = []
+    search = ''
     if not LocationRecord.return_instance(args.build):
         CONSOLE.print(Markdown(f"# ERROR, invalid TIPLOC: ```{args.build}```"))
         sys.exit(1)
 
     # insert the origin point into the current trip
-    origin = LocationRecord._instances[args.build]
+    origin = LocationRecord.return_instance(args.build)
     current_trip.append(
         [len(current_trip), origin.location_code, origin.location_name]
     )
@@ -506,18 +577,31 @@ if args.build:
             )
         CONSOLE.print(Markdown('## Current Route'))
         CONSOLE.print(trip_table(current_trip))
-        links = get_links(current_trip[-1][1])
-        CONSOLE.print(Markdown('## Next Location Options'))
+        links = get_links(current_trip[-1][1], search)
+        if search:
+            CONSOLE.print(Markdown(f'## Next Location Options: ```{search}```'))
+        else:
+            CONSOLE.print(Markdown('## Next Location Options'))
         print()
         table = LinkSelectTable(links).table
         CONSOLE.print(table)
         print()
         answer = CONSOLE.input(
             Markdown(
-                "# [#] Add TIPLOC | [R]emove last entry | [F]ull Schedule | [X]it: "
+                "# [#] Add TIPLOC | [text] Filter | [R]emove last entry | [F]ull Schedule | [X]it: "
             )
         )
 
+        # The commands are accepted in either case, anything else filters
+        answer = answer.strip()
+        if answer.upper() in ("X", "R", "F"):
+            answer = answer.upper()
+
+        if answer not in ("X", "R", "F") and not answer.isnumeric():
+            # Filter the options; typing more narrows the last filter
+            search = answer
+            continue
+
         if answer == "X":
             CONSOLE.clear()
             if len(current_trip) > 1:
@@ -543,7 +627,7 @@ if args.build:
             answer = int(answer) - 1
 
             try:
-                next_loc = LocationRecord._instances[links[answer][1]]
+                next_loc = LocationRecord.return_instance(links[answer][1])
                 current_trip.append(
                     [
                         len(current_trip),
@@ -551,6 +635,7 @@ if args.build:
                         next_loc.location_name
                     ]
                 )
+                search = ''
             except IndexError:
                 continue
 
@@ -574,12 +659,21 @@ if args.via:
 if args.avoid:
     avoid = [tpl.strip() for tpl in args.avoid.split(',')]
 
+f_import.ensure_loaded('LOC', 'NWK')
+
 CONSOLE.print(Markdown("# VSTP query"))
 CONSOLE.print(
     RouteRequestTable(args.start, args.end, args.via, args.avoid).grid
 )
 
-path = Pathfinder(args.start, args.end, legs=args.legs, via=via, avoid=avoid)
+path = Pathfinder(
+    args.start,
+    args.end,
+    legs=args.legs,
+    via=via,
+    avoid=avoid,
+    heuristic=PLANAR if args.planar else HAVERSINE
+)
 path.search(std_out=False)
 
 CONSOLE.print(Markdown("# Results"))